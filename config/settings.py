@@ -25,12 +25,18 @@ class Settings:
     # Telegram 設定
     TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
     TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+    # Bot API 位址 (壓測時可指向本機假伺服器，例如 http://127.0.0.1:8081)
+    TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
 
     # --- 交易標的設定 ---
     # 商品代碼 (例如 'TMF') - 這裡只寫代碼，具體合約(如 TMF202603)由程式動態抓取或指定
     SYMBOL_CODE = "TMF" 
     EXCHANGE = "TAIFEX"
     TARGET_CONTRACT = os.getenv("TARGET_CONTRACT", "TMF202603")
+    # 同一個程序額外交易的合約 (逗號分隔，例如 "MXF202603,TMF202604")；空白 = 只做 TARGET_CONTRACT
+    EXTRA_CONTRACTS = [c.strip() for c in os.getenv("EXTRA_CONTRACTS", "").split(",") if c.strip()]
+    # 每點價值 (新台幣)
+    POINT_VALUES = {"TMF": 10.0, "MXF": 50.0, "TXF": 200.0}
 
     # --- 系統設定 ---
     LOG_LEVEL = "INFO"
@@ -38,6 +44,13 @@ class Settings:
 
     DRY_RUN=False
 
+    # --- Tick 錄影 (實戰時把每筆 Tick 存成二進位檔，供逐筆回測) ---
+    TICK_RECORD = os.getenv("TICK_RECORD", "1") == "1"
+    TICK_DIR = os.getenv("TICK_DIR", "data/ticks")
+
+    # --- 1 分 K 資料庫 (core/bar_store.py；壓力測試區間目錄 regimes.json 也放這裡) ---
+    BAR_DIR = os.getenv("BAR_DIR", "data/bars")
+
     # 檢查必要設定是否存在
     @classmethod
     def validate(cls):
@@ -0,0 +1,145 @@
+import numpy as np
+
+# ==========================================
+# 📈 績效分析 (NumPy 向量化)
+# 最佳化器 / stat_analyzer / 回測報告共用同一套算法，一次吃整排陣列，不再逐筆迴圈 + dict.get
+# 輸入一律是等長陣列:
+#   pnl       : float   每筆交易淨損益 (已扣手續費)
+#   direction : int8    +1 = 多單, -1 = 空單, 0 = 不明
+#   entry_ns  : int64   進場時間 (奈秒，NAT_NS = 沒有)
+#   exit_ns   : int64   出場時間
+# ==========================================
+NAT_NS = np.iinfo(np.int64).min
+_NS_PER_MIN = 60_000_000_000
+_NS_PER_YEAR = 365.25 * 24 * 60 * _NS_PER_MIN
+_DIRECTIONS = {"LONG": 1, "SHORT": -1}
+
+def to_ns_array(values) -> np.ndarray:
+    """datetime / pd.Timestamp / None 混雜的序列 -> int64 奈秒陣列 (None -> NAT_NS)"""
+    arr = np.array([np.datetime64("NaT") if v is None else v for v in values], dtype="datetime64[ns]")
+    return arr.view("<i8")
+
+def trades_to_arrays(trades):
+    """
+    交易紀錄 -> (pnl, direction, entry_ns, exit_ns)
+    欄位式帳本 (core/trade_journal.TradeJournal) 直接拿 numpy 視圖，不複製；舊式 list of dict / 純數字逐筆轉換
+    """
+    if hasattr(trades, "arrays"):
+        return trades.arrays()
+    n = len(trades)
+    pnl = np.zeros(n)
+    direction = np.zeros(n, dtype=np.int8)
+    entry, exit_ = [None] * n, [None] * n
+    for i, t in enumerate(trades):
+        if isinstance(t, dict):
+            pnl[i] = float(t.get('pnl', 0.0))
+            direction[i] = _DIRECTIONS.get(str(t.get('direction', '')), 0)
+            entry[i], exit_[i] = t.get('entry_time'), t.get('exit_time')
+        else:
+            pnl[i] = float(t) # 相容最舊的帳本 (只記數字)
+    return pnl, direction, to_ns_array(entry), to_ns_array(exit_)
+
+def max_drawdown(equity) -> float:
+    """權益曲線的最大回撤 (正數；曲線第一點就算高點，所以平倉曲線前面要補 0)"""
+    equity = np.asarray(equity, dtype=float)
+    if len(equity) == 0: return 0.0
+    return float(np.max(np.maximum.accumulate(equity) - equity))
+
+def periods_per_year(ts_ns) -> float:
+    """權益曲線每年有幾個點 (用實際時間跨度推算，抽樣過的曲線也適用)；給 Sharpe/Sortino 年化用"""
+    ts_ns = np.asarray(ts_ns, dtype=np.int64)
+    if len(ts_ns) < 2: return 0.0
+    span = float(ts_ns[-1] - ts_ns[0])
+    return (len(ts_ns) - 1) / (span / _NS_PER_YEAR) if span > 0 else 0.0
+
+def _ratio(returns, downside=False, periods_per_year=None):
+    if len(returns) < 2: return 0.0
+    mean = returns.mean()
+    if downside:
+        neg = np.minimum(returns, 0.0)
+        dev = np.sqrt(np.mean(neg * neg))
+    else:
+        dev = returns.std(ddof=1)
+    if dev == 0: return 0.0
+    scale = np.sqrt(periods_per_year) if periods_per_year else 1.0
+    return float(mean / dev * scale)
+
+def curve_metrics(equity, ts_ns=None) -> dict:
+    """
+    只看權益曲線的風險指標 (MDD / Sharpe / Sortino)；給了時間就依實際跨度年化
+    曲線不含起點 0 的話會自動補上 (開始交易前的資金也算高點)
+    """
+    equity = np.concatenate(([0.0], np.asarray(equity, dtype=float)))
+    returns = np.diff(equity)
+    ppy = periods_per_year(ts_ns) if ts_ns is not None else None
+    return {
+        "max_drawdown": max_drawdown(equity),
+        "sharpe": _ratio(returns, periods_per_year=ppy),
+        "sortino": _ratio(returns, downside=True, periods_per_year=ppy),
+    }
+
+def compute_metrics(pnl, direction=None, entry_ns=None, exit_ns=None, equity=None, periods_per_year=None) -> dict:
+    """
+    一次算完整份成績單
+    equity: 逐根 K 棒的權益曲線 (含未實現損益)；沒給就用「平倉累積損益」當曲線 (舊版 Trade-Close MDD)
+    periods_per_year: Sharpe/Sortino 年化用的每年期數 (給逐根權益曲線時才有意義；None = 不年化)
+    """
+    pnl = np.asarray(pnl, dtype=float)
+    n = len(pnl)
+    wins = pnl > 0
+    gross_win = float(pnl[wins].sum())
+    gross_loss = float(-pnl[~wins].sum())
+    win_count = int(wins.sum())
+
+    closed_curve = np.concatenate(([0.0], np.cumsum(pnl)))
+    curve = closed_curve if equity is None else np.asarray(equity, dtype=float)
+    mdd = max_drawdown(curve)
+    returns = np.diff(curve)
+
+    m = {
+        "net_pnl": float(pnl.sum()),
+        "trades": n,
+        "wins": win_count,
+        "losses": n - win_count,
+        "win_rate": win_count / n * 100 if n else 0.0,
+        "avg_win": gross_win / win_count if win_count else 0.0,
+        "avg_loss": -gross_loss / (n - win_count) if n - win_count else 0.0,
+        "profit_factor": gross_win / gross_loss if gross_loss > 0 else (float('inf') if gross_win > 0 else 0.0),
+        "max_drawdown": mdd,
+        "sharpe": _ratio(returns, periods_per_year=periods_per_year),
+        "sortino": _ratio(returns, downside=True, periods_per_year=periods_per_year),
+    }
+    m["payoff_ratio"] = abs(m["avg_win"] / m["avg_loss"]) if m["avg_loss"] else 0.0
+
+    if direction is not None:
+        direction = np.asarray(direction)
+        longs, shorts = direction > 0, direction < 0
+        m.update(long_pnl=float(pnl[longs].sum()), short_pnl=float(pnl[shorts].sum()),
+                 long_trades=int(longs.sum()), short_trades=int(shorts.sum()))
+
+    if entry_ns is not None and exit_ns is not None:
+        entry_ns = np.asarray(entry_ns, dtype=np.int64)
+        exit_ns = np.asarray(exit_ns, dtype=np.int64)
+        valid = (entry_ns != NAT_NS) & (exit_ns != NAT_NS)
+        minutes = (exit_ns[valid] - entry_ns[valid]) / _NS_PER_MIN
+        if len(minutes):
+            p50, p90 = np.percentile(minutes, [50, 90])
+            m.update(avg_holding_min=float(minutes.mean()), median_holding_min=float(p50),
+                     p90_holding_min=float(p90), max_holding_min=float(minutes.max()))
+        else:
+            m.update(avg_holding_min=0.0, median_holding_min=0.0, p90_holding_min=0.0, max_holding_min=0.0)
+    return m
+
+def holding_histogram(entry_ns, exit_ns, bins=(0, 15, 60, 240, 1440, 7200, np.inf)):
+    """持倉時間分佈 (分鐘區間 -> 筆數)，預設: 15分內 / 1小時 / 4小時 / 1天 / 5天 / 更久"""
+    entry_ns = np.asarray(entry_ns, dtype=np.int64)
+    exit_ns = np.asarray(exit_ns, dtype=np.int64)
+    valid = (entry_ns != NAT_NS) & (exit_ns != NAT_NS)
+    counts, _ = np.histogram((exit_ns[valid] - entry_ns[valid]) / _NS_PER_MIN, bins=np.asarray(bins, dtype=float))
+    return {f"{bins[i]:g}-{bins[i + 1]:g}m": int(c) for i, c in enumerate(counts)}
+
+def format_holding(minutes) -> str:
+    """分鐘 -> '3h 25m' / '42m' (最佳化排行榜用的格式)"""
+    if minutes > 60:
+        return f"{int(minutes // 60)}h {int(minutes % 60)}m"
+    return f"{int(minutes)}m"
@@ -0,0 +1,402 @@
+import os
+import json
+from datetime import datetime
+import numpy as np
+
+# ==========================================
+# 📦 1 分 K 二進位格式 (固定寬度，可直接 memmap；與 core/tick_store.py 同一套慣例)
+# ts     : int64   奈秒時間戳 (台灣本地時間當作 UTC 存)
+# open / high / low / close : float64
+# volume : int64   成交口數
+# 一根 48 bytes，30 萬根 1 分 K 只要 14 MB (CSV 要好幾倍，而且每次都要重新解析時間)
+# ==========================================
+BAR_DTYPE = np.dtype([
+    ("ts", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<i8"),
+])
+
+# 歷史 CSV 常見欄位名稱 -> 標準欄位 (與 CsvHistoryFeeder 的對照表相同)
+_RENAME = {
+    'time': 'datetime', 'date': 'datetime', 'ts': 'datetime',
+    'vol': 'volume',
+}
+
+def bars_from_dataframe(df, clean=True) -> np.ndarray:
+    """
+    DataFrame (datetime/Time + OHLCV，大小寫不拘) -> BAR_DTYPE 陣列
+    依時間排序，重複時間戳只留最後一筆 (與舊版 drop_duplicates(keep='last') 相同)
+    clean=False 保留原始順序與重複 (給 core/data_quality.py 檢查用)
+    """
+    cols = {c: _RENAME.get(c.strip().lower(), c.strip().lower()) for c in df.columns}
+    df = df.rename(columns=cols)
+    if 'datetime' not in df.columns:
+        raise ValueError("缺少時間欄位 (datetime / Time)")
+    import pandas as pd
+    ts = pd.to_datetime(df['datetime']).values.astype("datetime64[ns]").astype("<i8")
+    out = np.zeros(len(df), dtype=BAR_DTYPE)
+    out["ts"] = ts
+    for name in ("open", "high", "low", "close"):
+        if name in df.columns: out[name] = df[name].values
+    if "open" not in df.columns: out["open"] = out["close"]
+    if "high" not in df.columns: out["high"] = out["close"]
+    if "low" not in df.columns: out["low"] = out["close"]
+    if "volume" in df.columns: out["volume"] = df["volume"].fillna(0).values
+    return _sort_dedup(out) if clean else out
+
+def _sort_dedup(records) -> np.ndarray:
+    if len(records) < 2: return records
+    if np.any(records["ts"][1:] <= records["ts"][:-1]):
+        records = records[np.argsort(records["ts"], kind="stable")]
+        last = np.ones(len(records), dtype=bool)
+        last[:-1] = records["ts"][1:] != records["ts"][:-1]  # 同一時間留最後一筆
+        records = records[last]
+    return records
+
+def bars_from_kbars(kbars) -> np.ndarray:
+    """
+    Shioaji api.kbars 回傳值 (ts/Open/High/Low/Close/Volume) -> BAR_DTYPE 陣列
+    ts 本來就是奈秒整數，直接整欄塞進 numpy，不經過 DataFrame / pd.to_datetime
+    """
+    ts = np.asarray(kbars["ts"])
+    if len(ts) and ts.dtype.kind not in "iu": # 不是整數時間戳 (例如字串) 才走 DataFrame
+        import pandas as pd
+        return bars_from_dataframe(pd.DataFrame({**kbars}))
+    out = np.zeros(len(ts), dtype=BAR_DTYPE)
+    out["ts"] = ts
+    keys = set(kbars.keys())
+    for src, name in (("Open", "open"), ("High", "high"), ("Low", "low"), ("Close", "close"), ("Volume", "volume")):
+        if src in keys: out[name] = kbars[src]
+    return _sort_dedup(out)
+
+def bars_to_dataframe(records):
+    """BAR_DTYPE 陣列 -> DataFrame (欄位 datetime/open/high/low/close/volume，給 CsvHistoryFeeder 等舊介面)"""
+    import pandas as pd
+    return pd.DataFrame({
+        "datetime": np.asarray(records["ts"]).view("datetime64[ns]"),
+        "open": records["open"], "high": records["high"], "low": records["low"],
+        "close": records["close"], "volume": records["volume"],
+    })
+
+def _csv_tail(csv_path):
+    """CSV 最後一根 -> (奈秒時間戳, 那一行在檔案中的起始位置)：只讀檔頭一行 + 檔尾幾 KB (沒有資料回傳 (None, None))"""
+    if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0: return None, None
+    with open(csv_path, "rb") as f:
+        header_line = f.readline()
+        header = header_line.decode("utf-8-sig").strip().split(",")
+        size = f.seek(0, os.SEEK_END)
+        base = max(len(header_line), size - 4096)
+        f.seek(base)
+        tail = f.read().rstrip(b"\r\n")
+    names = [_RENAME.get(h.strip().lower(), h.strip().lower()) for h in header]
+    if "datetime" not in names or not tail.strip(): return None, None
+    start = tail.rfind(b"\n") + 1 # 沒找到 = 整塊就是最後一行 (-1 + 1 = 0)
+    last = tail[start:].decode("utf-8", "ignore").strip().split(",")
+    if last == header or len(last) != len(names): return None, None
+    ts = int(np.datetime64(last[names.index("datetime")].strip().replace(" ", "T"), "ns").astype("<i8"))
+    return ts, base + start
+
+def csv_last_ts(csv_path):
+    """CSV 最後一根的奈秒時間戳：只讀檔頭一行 + 檔尾幾 KB，不用把整份 CSV 讀進來 (沒有資料回傳 None)"""
+    return _csv_tail(csv_path)[0]
+
+def append_csv(csv_path, records) -> int:
+    """
+    把比 CSV 最後一根還新的 K 棒接到檔尾 (沿用原本的欄位順序)，回傳新增幾根
+    跟 BarStore.append 同一套規則：新資料裡有跟最後一根同時間的 K 棒，就把檔尾那一行截掉重寫
+    (第一次下載時那根可能還沒收完)，CSV 才不會跟資料庫分區對不起來
+    舊的 CSV 工具 / 開機暖機照樣讀得到，但每天更新不用再整檔讀進來、合併、重寫
+    """
+    last, offset = _csv_tail(csv_path)
+    replace = False
+    if last is not None:
+        replace = bool(np.any(records["ts"] == last))
+        records = records[records["ts"] >= last] if replace else records[records["ts"] > last]
+    if len(records) == 0: return 0
+    df = bars_to_dataframe(records)
+    new_file = not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+    if new_file and os.path.dirname(csv_path):
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    if not new_file:
+        with open(csv_path, encoding="utf-8-sig") as f:
+            header = f.readline().strip().split(",")
+        # 依舊檔的欄位名稱與順序輸出 (例如 Time,Open,...)
+        rename = {}
+        for h in header:
+            std = _RENAME.get(h.strip().lower(), h.strip().lower())
+            if std in df.columns: rename[std] = h
+        df = df.rename(columns=rename).reindex(columns=header)
+        with open(csv_path, "rb+") as f:
+            if replace:
+                f.truncate(offset) # 截掉舊的最後一根，下面連同新的尾巴一起寫回
+            else: # 檔尾沒有換行就補一個，免得新資料黏在最後一行
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n": f.write(b"\n")
+    df.to_csv(csv_path, mode="a", header=new_file, index=False)
+    return len(df) - int(replace)
+
+def to_ns_bound(value, end=False) -> int:
+    """
+    區間邊界 -> 奈秒時間戳
+    只給日期 ('2022-10-31') 當結束時間時，包含那一整天 (舊版切割器用字串比較，會漏掉最後一天)
+    """
+    if value is None: return None
+    if isinstance(value, (int, np.integer)): return int(value)
+    text = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    t = np.datetime64(text.replace(" ", "T"), "ns")
+    if end and len(text.strip()) <= 10:
+        t = t + np.timedelta64(1, "D") - np.timedelta64(1, "ns")
+    return int(t.astype("<i8"))
+
+class BarStore:
+    """
+    1 分 K 資料庫 (一個商品 / 合約一個檔案，依時間排序)
+    檔案: {root}/{symbol}.bar，內容就是連續的 BAR_DTYPE 紀錄，沒有檔頭
+    slice(symbol, start, end) 用二分搜尋在時間欄找到區間，回傳 memmap 的切片 (不複製、不解析)
+    開新的壓力測試區間 = 在 RegimeCatalog 多記一行起訖時間，不用再切一份幾百 MB 的 CSV
+    每日更新走 append()：只寫新的尾巴，成本跟新資料量成正比；manifest.json 記每個分區 (合約) 的筆數與起訖
+    """
+    EXT = ".bar"
+    MANIFEST = "manifest.json"
+
+    def __init__(self, root="data/bars"):
+        self.root = root
+        self._cache = {}  # path -> (檔案大小, mtime, memmap)
+
+    def path_for(self, symbol: str) -> str:
+        return os.path.join(self.root, f"{symbol}{self.EXT}")
+
+    def symbols(self) -> list:
+        if not os.path.isdir(self.root): return []
+        return sorted(n[:-len(self.EXT)] for n in os.listdir(self.root) if n.endswith(self.EXT))
+
+    def exists(self, symbol: str) -> bool:
+        return os.path.exists(self.path_for(symbol))
+
+    def write(self, symbol: str, records: np.ndarray) -> str:
+        """整檔寫入 (先寫暫存檔再換名，寫到一半當機也不會毀掉舊檔)"""
+        path = self.path_for(symbol)
+        os.makedirs(self.root, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(np.ascontiguousarray(records, dtype=BAR_DTYPE).tobytes())
+        os.replace(tmp, path)
+        self._cache.pop(path, None)
+        self._update_manifest(symbol, records)
+        return path
+
+    def write_blocks(self, symbol: str, blocks) -> int:
+        """整檔寫入，但資料是一塊一塊來的 (產生器)；記憶體只放得下一塊也能寫整個商品。回傳總筆數"""
+        path = self.path_for(symbol)
+        os.makedirs(self.root, exist_ok=True)
+        tmp = path + ".tmp"
+        rows = 0
+        with open(tmp, "wb") as f:
+            for block in blocks:
+                f.write(np.ascontiguousarray(block, dtype=BAR_DTYPE).tobytes())
+                rows += len(block)
+        os.replace(tmp, path)
+        self._cache.pop(path, None)
+        self._update_manifest(symbol)
+        return rows
+
+    def append(self, symbol: str, records: np.ndarray) -> int:
+        """
+        只把新的尾巴接到檔案後面 (不讀舊資料、不重寫整檔)，回傳實際新增幾根
+        1. 用檔案最後一根的時間去重：比它舊的一律丟掉 (重疊區間以資料庫為準)
+        2. 跟最後一根同一分鐘的那根 (下載當下可能還沒收完) 用新的覆蓋，原地改寫那 48 bytes
+        3. 上次寫到一半就當機留下的不完整尾巴先切掉，不然後面每一筆都會錯位
+        """
+        records = _sort_dedup(np.ascontiguousarray(records, dtype=BAR_DTYPE))
+        if len(records) == 0: return 0
+        path = self.path_for(symbol)
+        os.makedirs(self.root, exist_ok=True)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size % BAR_DTYPE.itemsize:
+            size -= size % BAR_DTYPE.itemsize
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+        last_ts = self.last_ts(symbol) if size else None
+        replaced = 0
+        if last_ts is not None:
+            records = records[records["ts"] >= last_ts]
+            if len(records) and records["ts"][0] == last_ts:
+                with open(path, "r+b") as f:
+                    f.seek(size - BAR_DTYPE.itemsize)
+                    f.write(records[:1].tobytes())
+                records = records[1:]
+                replaced = 1
+        if len(records):
+            with open(path, "ab") as f:
+                f.write(records.tobytes())
+        if len(records) or replaced:
+            self._cache.pop(path, None)
+            self._update_manifest(symbol)
+        return len(records)
+
+    def last_ts(self, symbol: str):
+        """最後一根的奈秒時間戳 (只讀檔尾 48 bytes；沒有資料回傳 None)"""
+        path = self.path_for(symbol)
+        if not os.path.exists(path): return None
+        size = os.path.getsize(path)
+        size -= size % BAR_DTYPE.itemsize
+        if size == 0: return None
+        with open(path, "rb") as f:
+            f.seek(size - BAR_DTYPE.itemsize)
+            return int(np.frombuffer(f.read(BAR_DTYPE.itemsize), dtype=BAR_DTYPE)["ts"][0])
+
+    # --- 分區清單 (manifest.json：每個商品/合約的筆數與起訖時間，不用打開資料檔就知道有什麼) ---
+    def manifest(self) -> dict:
+        path = os.path.join(self.root, self.MANIFEST)
+        if not os.path.exists(path): return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _update_manifest(self, symbol, records=None):
+        data = self.load(symbol) if records is None else records
+        entry = {"rows": int(len(data)), "first": None, "last": None,
+                 "updated": datetime.now().isoformat(sep=" ", timespec="seconds")}
+        if len(data):
+            entry["first"] = str(np.datetime64(int(data["ts"][0]), "ns"))
+            entry["last"] = str(np.datetime64(int(data["ts"][-1]), "ns"))
+        manifest = self.manifest()
+        manifest[symbol] = entry
+        path = os.path.join(self.root, self.MANIFEST)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def import_csv(self, symbol: str, csv_path: str) -> int:
+        """把歷史 CSV 轉進資料庫 (只在第一次或 CSV 比較新時需要)；回傳 K 棒數"""
+        import pandas as pd
+        records = bars_from_dataframe(pd.read_csv(csv_path))
+        self.write(symbol, records)
+        print(f"📦 [BarStore] {csv_path} -> {self.path_for(symbol)} ({len(records):,} 根)")
+        return len(records)
+
+    def ensure_csv(self, csv_path: str, symbol: str = None) -> str:
+        """CSV 還沒轉過 (或之後又更新過) 就轉一次；回傳資料庫裡的商品名稱 (預設用檔名)"""
+        symbol = symbol or os.path.splitext(os.path.basename(csv_path))[0]
+        path = self.path_for(symbol)
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(csv_path):
+            self.import_csv(symbol, csv_path)
+        return symbol
+
+    def load(self, symbol: str) -> np.ndarray:
+        """唯讀 memmap 開啟整個商品 (檔案沒變就重用同一個 memmap)"""
+        path = self.path_for(symbol)
+        if not os.path.exists(path): return np.zeros(0, dtype=BAR_DTYPE)
+        st = os.stat(path)
+        cached = self._cache.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime:
+            return cached[2]
+        n = st.st_size // BAR_DTYPE.itemsize
+        data = np.memmap(path, dtype=BAR_DTYPE, mode="r", shape=(n,)) if n else np.zeros(0, dtype=BAR_DTYPE)
+        self._cache[path] = (st.st_size, st.st_mtime, data)
+        return data
+
+    def locate(self, symbol: str, start=None, end=None):
+        """區間在檔案裡的 [起, 迄) 筆數 (二分搜尋，O(log n))；end 含當下那一根"""
+        ts = self.load(symbol)["ts"]
+        lo = 0 if start is None else int(np.searchsorted(ts, to_ns_bound(start), side="left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, to_ns_bound(end, end=True), side="right"))
+        return lo, max(lo, hi)
+
+    def slice(self, symbol: str, start=None, end=None) -> np.ndarray:
+        """時間區間的 K 棒 (memmap 切片，不複製)"""
+        lo, hi = self.locate(symbol, start, end)
+        return self.load(symbol)[lo:hi]
+
+    def frame(self, symbol: str, start=None, end=None):
+        """時間區間 -> DataFrame (只複製這個區間，給吃 DataFrame 的舊工具)"""
+        return bars_to_dataframe(self.slice(symbol, start, end))
+
+# ==========================================
+# 🌍 歷史修羅場目錄 (名稱 -> 商品 + 起訖時間)
+# 預設三個壓力測試區間 (原本 data_slicer 各切一份 CSV 的那三個)
+# ==========================================
+DEFAULT_REGIMES = {
+    "MTX_2022_Bear": {"symbol": "MTX", "start": "2022-01-01", "end": "2022-10-31", "note": "2022年 暴力升息緩跌熊市 (測試空單能不能抱住波段)"},
+    "MTX_2023_Chop": {"symbol": "MTX", "start": "2023-01-01", "end": "2023-05-31", "note": "2023年 盤整洗盤區 (測試防護網夠不夠堅固)"},
+    "MTX_2020_Crash": {"symbol": "MTX", "start": "2020-02-01", "end": "2020-05-31", "note": "2020年 疫情 V 轉極端市 (壓力測試)"},
+}
+
+class RegimeCatalog:
+    """
+    命名區間目錄：存在 {root}/regimes.json，一個名稱對應 (商品, 起, 訖, 備註)
+    新增一個壓力測試區間只是多寫一行 JSON，資料本身只有 BarStore 裡那一份
+    """
+    FILE = "regimes.json"
+
+    def __init__(self, store: BarStore):
+        self.store = store
+        self.path = os.path.join(store.root, self.FILE)
+        self.regimes = dict(DEFAULT_REGIMES)
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.regimes.update(json.load(f))
+
+    def save(self):
+        os.makedirs(self.store.root, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.regimes, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def add(self, name, symbol, start=None, end=None, note="", save=True) -> dict:
+        self.regimes[name] = {"symbol": symbol, "start": _fmt(start), "end": _fmt(end), "note": note}
+        if save: self.save()
+        return self.regimes[name]
+
+    def names(self) -> list:
+        return sorted(self.regimes)
+
+    def get(self, name) -> dict:
+        if name not in self.regimes:
+            raise KeyError(f"找不到區間 '{name}' (目前有: {', '.join(self.names())})")
+        return self.regimes[name]
+
+    def slice(self, name) -> np.ndarray:
+        r = self.get(name)
+        return self.store.slice(r["symbol"], r.get("start"), r.get("end"))
+
+def _fmt(value):
+    if value is None: return None
+    return value.isoformat(sep=" ") if hasattr(value, 'isoformat') else str(value)
+
+# ==========================================
+# 🔗 資料來源字串 (最佳化器 / 回測的 history_file 除了 CSV 路徑，也可以直接指到資料庫)
+#   "regime:MTX_2022_Bear"                    -> 目錄裡的命名區間
+#   "bars:MTX"                                -> 整個商品
+#   "bars:MTX|2022-01-01|2022-06-30 13:45"    -> 指定起訖 (任一邊可留空)
+# ==========================================
+SOURCE_PREFIXES = ("regime:", "bars:")
+
+def is_store_source(spec) -> bool:
+    return isinstance(spec, str) and spec.startswith(SOURCE_PREFIXES)
+
+def bars_spec(symbol, start=None, end=None) -> str:
+    return f"bars:{symbol}|{_fmt(start) or ''}|{_fmt(end) or ''}"
+
+def resolve_source(spec: str, store: BarStore):
+    """資料來源字串 -> (商品, 起, 訖)"""
+    if spec.startswith("regime:"):
+        r = RegimeCatalog(store).get(spec[len("regime:"):])
+        return r["symbol"], r.get("start"), r.get("end")
+    parts = spec[len("bars:"):].split("|")
+    start = parts[1] if len(parts) > 1 and parts[1] else None
+    end = parts[2] if len(parts) > 2 and parts[2] else None
+    return parts[0], start, end
+
+def open_source(spec: str, root="data/bars") -> np.ndarray:
+    """資料來源字串 -> K 棒陣列 (memmap 切片，不複製)"""
+    store = BarStore(root)
+    symbol, start, end = resolve_source(spec, store)
+    if not store.exists(symbol):
+        raise FileNotFoundError(f"資料庫裡沒有 {symbol} ({store.path_for(symbol)})")
+    return store.slice(symbol, start, end)
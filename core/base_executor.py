@@ -1,4 +1,9 @@
+import threading
+from collections import deque
+from datetime import datetime
 from core.event import SignalEvent, SignalType
+from core.equity_curve import EquityCurve
+from core.trade_journal import TradeJournal
 
 class BaseExecutor:
     """
@@ -12,18 +17,51 @@ class BaseExecutor:
         self.avg_price = 0.0
         self.entry_time = None
 
-        # 交易紀錄 (影子帳本)
-        self.trades = []
+        # 交易紀錄 (影子帳本；欄位式 numpy 帳本，逐筆取出仍是原本的 dict)
+        self.trades = TradeJournal()
         self.total_pnl = 0.0
         self.win_count = 0
         self.loss_count = 0
+        self.equity_curve = EquityCurve() # 逐根 K 棒盯市的權益曲線 (含未實現，抓得到持倉中的回撤)
         
         # TMF 規格 (微台)
         self.POINT_VALUE = 10.0
         self.FEE = 22.0
 
+        # ⚡ 成交驅動帳本 (fill_driven=True 時，部位/均價/損益只由 on_fill 的真實成交回報記帳)
+        # 回測/模擬維持 False：下單當下就以回傳價格記帳 (原行為)
+        self.fill_driven = False
+        self.pending_orders = {}      # order_id -> 尚未成交的帶號口數 (買正賣負)
+        self._order_meta = {}         # order_id -> (訊號價, 訊號原因)，成交時用來算滑價、寫進交易履歷
+        self._pending_net = 0         # pending_orders 的加總 (O(1) 維護)
+        self._deferred = deque()      # 在途委託還沒結束時進來的訊號 [(訊號, 價格)]，等在途清空再依序處理
+        self._open_trade_pnl = 0.0    # 目前這趟交易已實現的損益 (部分平倉累積，全平時記一筆)
+        self._open_trade_fee = 0.0    # 這趟已扣的平倉手續費 / 已平口數 / 平倉成交金額 (算出場均價)
+        self._open_trade_qty = 0
+        self._open_trade_exit_val = 0.0
+        self._entry_slip = 0.0        # 這趟進場 (含加碼) 累積的滑價 (點數 x 口數)
+        self._open_trade_slip = 0.0   # 成交驅動：這趟平倉腳累積的滑價 / 最後一張平倉單的原因
+        self._open_trade_reason = ""
+        self.position_listener = None # 成交/撤單改變部位時通知 (Engine 用來同步策略部位)
+        self.trade_listener = None    # 成交驅動：一趟交易平倉成交時通知 (Engine 用來寫 trade_log.csv)，參數是該筆交易履歷
+        self.entry_listener = None    # 成交驅動：開倉/加碼成交時通知 (Engine 寫進場紀錄)，參數是 {direction, qty, price, time, reason}
+        self.parallel_reversal = True # 反手兩腳同時送；False = 等平倉腳成交才送開倉腳
+        self._ledger_lock = threading.RLock() # 成交回報在券商執行緒上記帳，跟送單互斥
+
+    @property
+    def expected_position(self):
+        """成交部位 + 在途委託 = 委託全部成交後的部位 (策略應該看這個，才不會重複下單)"""
+        return self.current_position + self._pending_net
+
     def execute_signal(self, signal: SignalEvent, price: float) -> str:
         if not signal: return ""
+        if self.fill_driven:
+            with self._ledger_lock:
+                if self.pending_orders or self._deferred:
+                    # 還有委託沒結束：不拿「可能不會成交」的在途口數來算口數，排隊等成交/刪單回報再送
+                    self._deferred.append((signal, price))
+                    return f"⏳ 尚有 {len(self.pending_orders)} 張委託未結束，訊號排隊等候 ({len(self._deferred)})"
+                return self._submit_signal(signal, price)
 
         sig_type = signal.signal_type.value if hasattr(signal.signal_type, 'value') else str(signal.signal_type)
         is_manual = "Manual" in str(signal.reason)
@@ -49,7 +87,10 @@ class BaseExecutor:
                 final_pnl = pnl - fee_total
                 
                 # 🚀 呼叫升級版記帳函數
-                self._record_trade(final_pnl, direction=trade_dir, entry_time=self.entry_time, exit_time=signal_time)
+                self._record_trade(final_pnl, direction=trade_dir, entry_time=self.entry_time, exit_time=signal_time,
+                                   qty=close_qty, entry_price=self.avg_price, exit_price=fill_price, fee=fee_total,
+                                   slippage=self._entry_slip + self._slip(direction, close_qty, price, fill_price),
+                                   reason=signal.reason)
                 trade_action = f"📉 全平倉 (獲利: ${final_pnl:.0f})"
                 
                 self.current_position = 0
@@ -75,6 +116,7 @@ class BaseExecutor:
                 self.avg_price = (old_val + new_val) / total_qty
                 self.current_position += (action_dir * qty)
                 self.total_pnl -= (self.FEE * qty) 
+                self._entry_slip += self._slip(direction_str, qty, price, fill_price)
                 # 加碼不改 entry_time，以第一口為準
                 trade_action = f"{'🔴' if action_dir==1 else '🟢'} 加碼 {qty} 口 (均價: {self.avg_price:.0f})"
 
@@ -84,20 +126,23 @@ class BaseExecutor:
             cover_qty = abs(self.current_position)
             
             close_dir = "SELL" if self.current_position > 0 else "BUY"
-            success1, fill_price1, msg1 = self._execute_impl(close_dir, cover_qty, price)
-            pnl = self._calculate_pnl(self.current_position, fill_price1, cover_qty)
-            
             target_qty = qty if is_manual else 1
-            success2, fill_price2, msg2 = self._execute_impl(direction_str, target_qty, price)
+            (success1, fill_price1, msg1), (success2, fill_price2, msg2) = \
+                self._execute_reversal_impl(close_dir, cover_qty, direction_str, target_qty, price)
+            pnl = self._calculate_pnl(self.current_position, fill_price1, cover_qty)
             
             fee_total = (self.FEE * cover_qty) + (self.FEE * target_qty)
             final_pnl = pnl - fee_total
             
             # 🚀 呼叫升級版記帳函數 (記錄舊單平倉)
-            self._record_trade(final_pnl, direction=trade_dir, entry_time=self.entry_time, exit_time=signal_time)
+            self._record_trade(final_pnl, direction=trade_dir, entry_time=self.entry_time, exit_time=signal_time,
+                               qty=cover_qty, entry_price=self.avg_price, exit_price=fill_price1, fee=fee_total,
+                               slippage=self._entry_slip + self._slip(close_dir, cover_qty, price, fill_price1),
+                               reason=signal.reason)
             
             self.current_position = action_dir * target_qty
             self.avg_price = fill_price2
+            self._entry_slip = self._slip(direction_str, target_qty, price, fill_price2)
             self.entry_time = signal_time # 👈 反手新單，重新開始計時！
             trade_action = f"📉 平倉損益 ${pnl:.0f} -> {'🔴' if action_dir==1 else '🟢'} 反手開倉"
 
@@ -108,32 +153,289 @@ class BaseExecutor:
                 self.current_position = action_dir * qty
                 self.avg_price = fill_price
                 self.total_pnl -= (self.FEE * qty)
+                self._entry_slip = self._slip(direction_str, qty, price, fill_price)
                 self.entry_time = signal_time # 👈 新單進場，開始計時！
                 trade_action = f"{'🔴' if action_dir==1 else '🟢'} 新倉 {qty} 口 @ {fill_price}"
 
         return trade_action
 
+    # ==========================================
+    # ⚡ 成交驅動模式：下單只登記在途委託，記帳交給 on_fill
+    # ==========================================
+    def _submit_signal(self, signal: SignalEvent, price: float) -> str:
+        """依成交部位決定要送哪些單 (只在沒有在途委託時呼叫，expected_position 就是真實部位)"""
+        sig_type = signal.signal_type.value if hasattr(signal.signal_type, 'value') else str(signal.signal_type)
+        is_manual = "Manual" in str(signal.reason)
+        qty = int(signal.strength) if signal.strength else 1
+        expected = self.expected_position
+
+        if sig_type in ["FLATTEN", "FLATTEN_LONG", "FLATTEN_SHORT"]:
+            if expected == 0: return "" # 已經平了 (或平倉單在路上)，不重複送
+            direction = "SELL" if expected > 0 else "BUY"
+            ok, _, msg = self._submit_order(direction, abs(expected), price, reason=signal.reason)
+            return f"📉 全平倉委託已送出 ({abs(expected)} 口)" if ok else f"❌ 平倉失敗: {msg}"
+
+        action_dir = 1 if sig_type == "LONG" else (-1 if sig_type == "SHORT" else 0)
+        if action_dir == 0: return ""
+        direction_str = "BUY" if action_dir == 1 else "SELL"
+
+        if expected * action_dir > 0:
+            # 同向加碼：只有手動指令才加
+            if not is_manual: return ""
+            ok, _, msg = self._submit_order(direction_str, qty, price, reason=signal.reason)
+            return f"{'🔴' if action_dir==1 else '🟢'} 加碼委託 {qty} 口" if ok else f"❌ 加碼失敗: {msg}"
+
+        if expected != 0:
+            # 反手：平倉腳 + 開倉腳
+            close_dir = "SELL" if expected > 0 else "BUY"
+            target_qty = qty if is_manual else 1
+            (ok1, _, msg1), (ok2, _, msg2) = self._submit_reversal(close_dir, abs(expected), direction_str, target_qty, price,
+                                                                  reason=signal.reason)
+            if not ok1: return f"❌ 反手平倉腳失敗: {msg1}"
+            return f"🔁 反手委託已送出 ({'🔴' if action_dir==1 else '🟢'} {target_qty} 口)" + ("" if ok2 else f" ⚠️ 開倉腳失敗: {msg2}")
+
+        ok, _, msg = self._submit_order(direction_str, qty, price, reason=signal.reason)
+        return f"{'🔴' if action_dir==1 else '🟢'} 新倉委託 {qty} 口 @ {price}" if ok else f"❌ 開倉失敗: {msg}"
+
+    def _submit_order(self, direction, qty, price, after=None, reason=""):
+        """送出一張委託並登記為在途 (連同訊號價與原因，成交時算滑價)；回傳 (success, order_id, msg)"""
+        with self._ledger_lock:
+            success, order_id, msg = self._submit_impl(direction, qty, price, after=after)
+            if success:
+                self._order_meta[order_id] = (price, reason)
+                self._add_pending(order_id, qty if direction == "BUY" else -qty)
+        return success, order_id, msg
+
+    def _submit_reversal(self, close_dir, close_qty, open_dir, open_qty, price, reason=""):
+        """反手兩腳：預設同時送；parallel_reversal=False 時開倉腳等平倉腳成交才送"""
+        close_leg = self._submit_order(close_dir, close_qty, price, reason=reason)
+        if not close_leg[0]:
+            return close_leg, (False, None, "平倉腳失敗，開倉腳未送出")
+        after = None if self.parallel_reversal else close_leg[1]
+        return close_leg, self._submit_order(open_dir, open_qty, price, after=after, reason=reason)
+
+    def _submit_impl(self, direction, qty, price, after=None):
+        """
+        [抽象方法] 成交驅動模式的送單 (不等成交)
+        after: 要等哪張委託 (order_id) 完全成交才送出 (None = 馬上送)
+        回傳: (success: bool, order_id, msg: str)
+        """
+        raise NotImplementedError
+
+    def _add_pending(self, order_id, signed_qty):
+        self.pending_orders[order_id] = self.pending_orders.get(order_id, 0) + signed_qty
+        self._pending_net += signed_qty
+
+    def _release_deferred(self):
+        """在途委託全部結束 -> 依序送出排隊中的訊號 (送出新委託就停，等它結束再送下一個)"""
+        with self._ledger_lock:
+            while self._deferred and not self.pending_orders:
+                signal, price = self._deferred.popleft()
+                msg = self._submit_signal(signal, price)
+                if msg: print(f"⏳ [Executor] 補送排隊訊號 ({signal.reason}): {msg}")
+
+    def cancel_pending(self):
+        """
+        放棄所有在途委託與排隊訊號 (/sync 以券商部位為準時呼叫)：請券商刪單，在途口數直接歸零
+        刪單前已經成交的口數之後照常由 on_fill 記帳 (對帳員會再用券商部位確認)；回傳送出刪單的張數
+        """
+        with self._ledger_lock:
+            order_ids = list(self.pending_orders)
+            self._deferred.clear()
+            for order_id in order_ids:
+                self._cancel_impl(order_id)
+            self.pending_orders.clear()
+            self._order_meta.clear()
+            self._pending_net = 0
+        if order_ids:
+            self._notify_position()
+        return len(order_ids)
+
+    def _cancel_impl(self, order_id):
+        """[可覆寫] 成交驅動模式的刪單 (不等回報)；預設沒有委託可刪"""
+        pass
+
+    def on_order_done(self, order_id):
+        """委託結束 (拒單/刪單/IOC 沒成交完)：剩下沒成交的口數不再算在途"""
+        with self._ledger_lock:
+            remaining = self.pending_orders.pop(order_id, 0)
+            self._order_meta.pop(order_id, None)
+            self._pending_net -= remaining
+            self._release_deferred()
+        if remaining:
+            self._notify_position()
+
+    def on_fill(self, direction, qty, price, order_id=None, fill_time=None):
+        """
+        ⚡ 真實成交回報記帳 (每筆 O(1)，支援分批成交)
+        1. 同向: 加權更新均價
+        2. 反向: 先平掉舊倉 (實現損益 + 平倉手續費)，剩下的口數以成交價開新倉
+        3. 部位歸零 (或翻轉) 時，把這趟累積的損益記成一筆交易
+        """
+        qty = int(qty)
+        if qty <= 0: return
+        signed = qty if direction == "BUY" else -qty
+        fill_time = fill_time or datetime.now()
+        closed = None
+        opened = 0 # 這筆成交裡開倉 (或翻轉後新倉) 的口數
+
+        with self._ledger_lock:
+            # 這張委託的訊號價與原因 (手動補單 / 對不上的回報沒有 -> 滑價當 0)
+            signal_price, reason = self._order_meta.get(order_id, (0.0, ""))
+            if order_id is not None and order_id in self.pending_orders:
+                left = self.pending_orders[order_id] - signed
+                self._pending_net -= signed
+                if left == 0:
+                    del self.pending_orders[order_id]
+                    self._order_meta.pop(order_id, None)
+                else: self.pending_orders[order_id] = left
+            slip_per_lot = self._slip(direction, 1, signal_price, price)
+
+            pos = self.current_position
+            if pos == 0 or (pos > 0) == (signed > 0):
+                # 開倉 / 同向加碼
+                if pos == 0:
+                    self.entry_time = fill_time
+                    self._reset_open_trade()
+                    self._entry_slip = 0.0
+                self.avg_price = (abs(pos) * self.avg_price + qty * price) / (abs(pos) + qty)
+                self.current_position = pos + signed
+                self.total_pnl -= self.FEE * qty
+                self._entry_slip += slip_per_lot * qty
+                opened = qty
+            else:
+                # 平倉 (可能部分平倉，也可能一次翻轉)
+                close_qty = min(abs(pos), qty)
+                realized = self._calculate_pnl(pos, price, close_qty) - self.FEE * close_qty
+                self._open_trade_pnl += realized
+                self._open_trade_fee += self.FEE * close_qty
+                self._open_trade_qty += close_qty
+                self._open_trade_exit_val += price * close_qty
+                self._open_trade_slip += slip_per_lot * close_qty
+                if reason: self._open_trade_reason = reason
+                self.total_pnl += realized
+                new_pos = pos + signed
+
+                if new_pos == 0 or (new_pos > 0) != (pos > 0):
+                    trade_dir = "LONG" if pos > 0 else "SHORT"
+                    self._record_trade(self._open_trade_pnl, direction=trade_dir, entry_time=self.entry_time,
+                                       exit_time=fill_time, add_to_total=False, qty=self._open_trade_qty,
+                                       entry_price=self.avg_price, fee=self._open_trade_fee,
+                                       exit_price=self._open_trade_exit_val / self._open_trade_qty,
+                                       slippage=self._entry_slip + self._open_trade_slip, reason=self._open_trade_reason)
+                    closed = self.trades[-1]
+                    self._reset_open_trade()
+                    self._entry_slip = 0.0
+                    self.avg_price = 0.0
+                    self.entry_time = None
+
+                if new_pos != 0 and (new_pos > 0) != (pos > 0):
+                    # 翻轉：多出來的口數以成交價開新倉
+                    open_qty = abs(new_pos)
+                    self.avg_price = price
+                    self.entry_time = fill_time
+                    self.total_pnl -= self.FEE * open_qty
+                    self._entry_slip = slip_per_lot * open_qty
+                    opened = open_qty
+                self.current_position = new_pos
+
+        if closed is not None and self.trade_listener:
+            try:
+                self.trade_listener(closed)
+            except Exception as e:
+                print(f"⚠️ [Executor] 交易通知失敗: {e}")
+        if opened and self.entry_listener:
+            try:
+                self.entry_listener({"direction": "LONG" if signed > 0 else "SHORT", "qty": opened,
+                                     "price": price, "time": fill_time, "reason": reason})
+            except Exception as e:
+                print(f"⚠️ [Executor] 進場通知失敗: {e}")
+        self._release_deferred()
+        self._notify_position()
+
+    def resync_position(self, position, cost=0.0, fallback=0.0, when=None):
+        """
+        以券商部位強制覆蓋影子帳本 (對帳員校正用)
+        均價 / 進場時間 / 這趟累積的損益一起重設，不然未實現損益與下一次平倉都會用舊的基準去算
+        cost    : 券商給的平均成本 (優先)
+        fallback: 查不到成本時的代替價 (例如最新報價)；同方向部位則沿用原本的均價
+        回傳均價的來源說明 (None = 成本未知，均價歸零)
+        """
+        with self._ledger_lock:
+            old = self.current_position
+            same_side = old != 0 and position != 0 and (old > 0) == (position > 0)
+            self.current_position = position
+            if not same_side:
+                # 空手 / 方向變了 (或從空手變有單)：當成一趟新的交易
+                self._reset_open_trade()
+                self._entry_slip = 0.0
+                self.avg_price = 0.0
+                self.entry_time = (when or datetime.now()) if position else None
+
+            if position == 0: source = "空手"
+            elif cost > 0: self.avg_price, source = float(cost), "券商成本"
+            elif same_side: source = "沿用原均價"
+            elif fallback > 0: self.avg_price, source = float(fallback), "最新報價 (成本待確認)"
+            else: source = None
+        self._notify_position()
+        return source
+
+    def on_market_data(self, price, volume=0, bid=None, ask=None, ts=None):
+        """每筆行情 (Tick 或無 Tick 時的 K 棒收盤) 都會呼叫；模擬撮合用 (預設不做事)"""
+        pass
+
+    def mark_to_market(self, price, ts=None):
+        """K 棒收盤盯市：已實現損益 + 以 price 計算的未實現損益記進權益曲線 (每根 O(1))"""
+        equity = self.total_pnl
+        pos = self.current_position
+        if pos:
+            equity += self._calculate_pnl(pos, price, abs(pos))
+        self.equity_curve.append(ts, equity)
+        return equity
+
+    def flush(self):
+        """把還在路上的模擬委託撮合完 (回測期末結算用；預設不做事)"""
+        pass
+
+    def _notify_position(self):
+        if self.position_listener:
+            try:
+                self.position_listener()
+            except Exception as e:
+                print(f"⚠️ [Executor] 部位通知失敗: {e}")
+
     def _calculate_pnl(self, position, current_price, qty):
         """計算價差損益"""
         if position > 0: diff = current_price - self.avg_price
         else: diff = self.avg_price - current_price
         return diff * qty * self.POINT_VALUE
 
-    # 🚀 升級版記帳函數：從只記數字，變成記下完整的「交易履歷表」
-    def _record_trade(self, pnl, direction="UNKNOWN", entry_time=None, exit_time=None):
-        self.total_pnl += pnl
+    # 🚀 升級版記帳函數：記下完整的「交易履歷表」(寫進欄位式帳本，不再一筆一個 dict)
+    def _record_trade(self, pnl, direction="UNKNOWN", entry_time=None, exit_time=None, add_to_total=True,
+                      qty=0, entry_price=0.0, exit_price=0.0, fee=0.0, slippage=0.0, reason=""):
+        if add_to_total: self.total_pnl += pnl # 成交驅動模式平倉時已逐筆加過
         
-        trade_record = {
-            'pnl': pnl,
-            'direction': direction,
-            'entry_time': entry_time,
-            'exit_time': exit_time
-        }
-        self.trades.append(trade_record) # 現在帳本裡存的是字典了！
+        self.trades.append(pnl, direction, entry_time, exit_time, qty=qty, entry_price=entry_price,
+                           exit_price=exit_price, fee=fee, slippage=slippage, reason=reason)
         
         if pnl > 0: self.win_count += 1
         else: self.loss_count += 1
 
+    def _reset_open_trade(self):
+        self._open_trade_pnl = 0.0
+        self._open_trade_fee = 0.0
+        self._open_trade_qty = 0
+        self._open_trade_exit_val = 0.0
+        self._open_trade_slip = 0.0
+        self._open_trade_reason = ""
+
+    @staticmethod
+    def _slip(direction, qty, requested, fill_price):
+        """滑價 (點數 x 口數)：買貴了 / 賣便宜了為正；沒有訊號價就當 0"""
+        if not requested or not fill_price: return 0.0
+        diff = fill_price - requested if direction == "BUY" else requested - fill_price
+        return diff * qty
+
     def _execute_impl(self, direction, qty, price):
         """
         [抽象方法] 唯一的不同點
@@ -142,8 +444,23 @@ class BaseExecutor:
         """
         raise NotImplementedError
     
+    def _execute_reversal_impl(self, close_dir, close_qty, open_dir, open_qty, price):
+        """
+        反手 = 平倉腳 + 開倉腳。預設依序各送一次 _execute_impl (回測/模擬維持原行為)；
+        可以非同步送單的子類別 (RealExecutor) 可覆寫成兩腳同時送出。
+        回傳: ((success, fill_price, msg), (success, fill_price, msg))
+        """
+        close_leg = self._execute_impl(close_dir, close_qty, price)
+        open_leg = self._execute_impl(open_dir, open_qty, price)
+        return close_leg, open_leg
+
     # 維持你的報告功能
     def print_report(self):
         total_trades = len(self.trades)
         win_rate = (self.win_count / total_trades * 100) if total_trades > 0 else 0
-        print(f"💰 總損益: ${self.total_pnl:,.0f} | 勝率: {win_rate:.1f}%")
\ No newline at end of file
+        print(f"💰 總損益: ${self.total_pnl:,.0f} | 勝率: {win_rate:.1f}%")
+        if total_trades:
+            from core.analytics import compute_metrics, trades_to_arrays, format_holding
+            m = compute_metrics(*trades_to_arrays(self.trades))
+            print(f"📉 MDD: ${m['max_drawdown']:,.0f} | PF: {m['profit_factor']:.2f} | "
+                  f"多 ${m['long_pnl']:,.0f} / 空 ${m['short_pnl']:,.0f} | 平均持倉 {format_holding(m['avg_holding_min'])}")
\ No newline at end of file
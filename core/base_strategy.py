@@ -13,6 +13,10 @@ class BaseStrategy(ABC):
         self.position = 0         # 策略建議的倉位
         self.entry_price = 0.0    # 進場價
         self.raw_bars = []        # K棒紀錄
+        # 📐 共用指標登記處 (引擎/最佳化器用 bind_indicators 綁上；沒綁就第一次用到時自己開一份)
+        self.indicator_registry = None
+        self.indicator_keys = {}
+        self._ind_frame = None
 
     def get_state_file_path(self):
         """📂 動態生成專屬的記憶卡檔名，避免策略打架"""
@@ -61,11 +65,47 @@ class BaseStrategy(ABC):
         """
         pass
 
+    def on_tick(self, tick) -> 'SignalEvent':
+        """
+        (選用) 盤中逐筆風控：每筆 Tick 都會呼叫，用來做停損/移動停利等不想等 K 棒收盤的檢查
+        回傳 SignalEvent 會立刻以 Tick 價格送單；預設不做事 (引擎偵測到沒覆寫就不會呼叫)
+        注意: Tick 物件可能被餵食器重複使用，不要保存它
+        """
+        return None
+
+    def bind_indicators(self, registry):
+        """同一條行情的策略綁同一個 IndicatorRegistry，相同 (時間級別, 種類, 參數) 的指標只算一次"""
+        self.indicator_registry = registry
+        self._ind_frame = None
+
+    def indicator_frame(self, resample):
+        """取得這個時間級別的共用指標框架；第一次拿到 (或換了登記處) 時向它宣告要用的指標"""
+        if self.indicator_registry is None:
+            from core.indicators import IndicatorRegistry
+            self.indicator_registry = IndicatorRegistry()
+        frame = self.indicator_registry.frame(resample)
+        if frame is not self._ind_frame:
+            self._ind_frame = frame
+            self.indicator_keys = self.declare_indicators(frame)
+        return frame
+
+    def declare_indicators(self, frame) -> dict:
+        """(選用) 用 frame.require(種類, 欄位, 參數) 宣告指標，回傳 {名稱: key}，之後用 frame.value(key, n) 取值"""
+        return {}
+
     def load_history_bars(self, bars):
-        """通用功能：載入歷史 K 棒"""
-        self.raw_bars = bars
+        """通用功能：載入歷史 K 棒 (接在現有紀錄後面；開機暖機時紀錄是空的，等同整份載入；API 回補的溫數據也走這裡)"""
+        self.raw_bars.extend(bars)
         print(f"[{self.name}] 已載入 {len(bars)} 根歷史數據")
 
+    def last_bar_time(self):
+        """已經消化到哪一根 K 棒的時間 (raw_bars 最後一根；不存 raw_bars 的策略看指標框架)；都沒有回傳 None"""
+        if self.raw_bars:
+            last = self.raw_bars[-1]
+            return last['datetime'] if isinstance(last, dict) else last.timestamp
+        frame = self._ind_frame
+        return frame.last_ts if frame is not None else None
+
     def set_position(self, pos):
         """通用功能：更新倉位"""
         self.position = pos
\ No newline at end of file
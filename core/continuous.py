@@ -0,0 +1,151 @@
+import heapq
+import itertools
+from datetime import date
+import numpy as np
+from core.bar_store import BarStore
+
+# ==========================================
+# 🔗 連續月合約 (各月份分區 -> 一條換月 + 價差調整過的連續序列)
+# 交易日: 夜盤 15:00 起算下一個交易日 -> (ts + 9 小時) 取整天；日盤 08:45~13:45 仍是當天
+# 換月規則:
+#   "volume"   : 前一個交易日成交量被下一個月份超過就換月 (只往後換，不會換回舊月份)
+#   "calendar" : 結算日 (當月第三個星期三) 前 roll_days 天換月
+# 價差調整 (讓換月那一刻價格不跳空，回測的點數損益才是真的):
+#   "difference" : 換月前的 K 棒全部加上 (新月份價 - 舊月份價)
+#   "ratio"      : 換月前的 K 棒全部乘上 (新月份價 / 舊月份價)
+#   "none"       : 不調整 (保留原始報價，換月時會跳空)
+# ==========================================
+_NS_PER_DAY = 86_400_000_000_000
+_SESSION_SHIFT = 9 * 3_600_000_000_000
+ROLL_METHODS = ("volume", "calendar")
+ADJUST_METHODS = ("difference", "ratio", "none")
+
+def trading_days(ts) -> np.ndarray:
+    """奈秒時間戳 -> 交易日序號 (1970-01-01 起算的天數；夜盤算下一個交易日)"""
+    return (np.asarray(ts, dtype=np.int64) + _SESSION_SHIFT) // _NS_PER_DAY
+
+def day_bounds(first_day, last_day):
+    """交易日區間 -> 奈秒 [起, 迄)"""
+    return first_day * _NS_PER_DAY - _SESSION_SHIFT, (last_day + 1) * _NS_PER_DAY - _SESSION_SHIFT
+
+def contract_expiry(code) -> int:
+    """合約代碼 (TMF202603 / MXF202412，結尾 YYYYMM) -> 結算日 (當月第三個星期三) 的交易日序號"""
+    year, month = int(code[-6:-2]), int(code[-2:])
+    first = date(year, month, 1)
+    wed = 1 + (2 - first.weekday()) % 7 + 14
+    return (date(year, month, wed) - date(1970, 1, 1)).days
+
+def daily_volume(records):
+    """K 棒 -> (交易日序號, 當日總量)，一次向量化加總"""
+    if len(records) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    days = trading_days(records["ts"])
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    return days[starts], np.add.reduceat(np.asarray(records["volume"], dtype=np.int64), starts)
+
+class ContinuousBuilder:
+    """
+    連續月合約建構器
+    1. 第一輪只看「每個合約每天的總量」：各合約的日量序列用 heapq k 路合併依交易日走一遍，決定每天的近月 (換月表)
+       記憶體只跟合約數 x 交易日數有關，不會把所有月份的 1 分 K 疊成一個 DataFrame
+    2. 每個換月點用二分搜尋量新舊月份的價差 (舊月份最後一根收盤 vs 新月份同一時間的收盤)
+    3. 第二輪依時間順序一段一段 (每段 = 一個合約的一段期間) 從 memmap 讀 block_size 根、套調整、往下游送
+    """
+    def __init__(self, store: BarStore, contracts, roll="volume", adjust="difference", roll_days=1, block_size=65536):
+        if roll not in ROLL_METHODS: raise ValueError(f"roll 必須是 {ROLL_METHODS} 之一")
+        if adjust not in ADJUST_METHODS: raise ValueError(f"adjust 必須是 {ADJUST_METHODS} 之一")
+        self.store = store
+        self.contracts = sorted(contracts, key=lambda c: c[-6:]) # 依到期月份排序
+        self.roll = roll
+        self.adjust = adjust
+        self.roll_days = roll_days
+        self.block_size = block_size
+        self.segments = []  # [(合約, 起 ts, 迄 ts)]，迄不含
+        self.rolls = []     # [(換月時間 ts, 舊合約, 新合約, 舊價, 新價)]
+
+    def schedule(self) -> list:
+        """依換月規則排出 [(合約, 第一個交易日, 最後一個交易日), ...]"""
+        streams, last_day = [], []
+        for i, code in enumerate(self.contracts):
+            days, vols = daily_volume(self.store.load(code))
+            streams.append(zip(days.tolist(), itertools.repeat(i), vols.tolist()))
+            last_day.append(int(days[-1]) if len(days) else -1)
+        expiry = [contract_expiry(c) - self.roll_days for c in self.contracts]
+
+        schedule = []
+        front = None
+        prev_vol = {}
+        # k 路合併：依 (交易日, 合約) 順序吐出每個合約每天的總量
+        for day, group in itertools.groupby(heapq.merge(*streams), key=lambda x: x[0]):
+            vol = {i: v for _, i, v in group}
+            if front is None:
+                front = min(vol)
+            if self.roll == "calendar":
+                while front < len(self.contracts) - 1 and day >= expiry[front]:
+                    front += 1
+            else:
+                # 前一個交易日有更後面的月份量比較大 -> 換過去 (用昨天的量決定今天，不偷看)
+                best = max((i for i in prev_vol if i > front), key=prev_vol.get, default=None)
+                if best is not None and prev_vol[best] > prev_vol.get(front, 0):
+                    front = best
+            # 近月已經沒資料 (下市) -> 換到下一個有資料的月份
+            if front not in vol and last_day[front] < day:
+                later = [i for i in vol if i > front]
+                if later: front = min(later)
+            if schedule and schedule[-1][0] == front:
+                schedule[-1][2] = day
+            else:
+                schedule.append([front, day, day])
+            prev_vol = vol
+        return [(self.contracts[i], first, last) for i, first, last in schedule]
+
+    def plan(self):
+        """換月表 -> 每段的時間區間 + 每個換月點的價差；回傳每段的 (加數, 乘數)"""
+        self.segments = []
+        for code, first, last in self.schedule():
+            lo, hi = day_bounds(first, last)
+            self.segments.append((code, lo, hi))
+
+        self.rolls = []
+        gaps = []
+        for (old, _, hi), (new, lo, _) in zip(self.segments, self.segments[1:]):
+            old_bars, new_bars = self.store.load(old), self.store.load(new)
+            k = int(np.searchsorted(old_bars["ts"], hi, side="left")) - 1 # 舊月份在這段最後一根
+            if k < 0:
+                gaps.append((0.0, 1.0)); continue
+            roll_ts = int(old_bars["ts"][k])
+            old_px = float(old_bars["close"][k])
+            j = int(np.searchsorted(new_bars["ts"], roll_ts, side="right")) - 1 # 新月份在同一時間 (或之前最近) 的收盤
+            if j < 0: j = int(np.searchsorted(new_bars["ts"], lo, side="left"))
+            new_px = float(new_bars["close"][j]) if j < len(new_bars) else old_px
+            self.rolls.append((roll_ts, old, new, old_px, new_px))
+            gaps.append((new_px - old_px, new_px / old_px if old_px else 1.0))
+
+        # 每段的調整 = 它之後所有換月價差的累積 (最後一段 = 最新月份，不調整)
+        adjust = [(0.0, 1.0)] * len(self.segments)
+        offset, factor = 0.0, 1.0
+        for k in range(len(self.segments) - 2, -1, -1):
+            offset += gaps[k][0]
+            factor *= gaps[k][1]
+            adjust[k] = (offset, factor)
+        return adjust
+
+    def blocks(self):
+        """(產生器) 依時間順序吐出調整後的 K 棒，每塊最多 block_size 根"""
+        adjust = self.plan()
+        for (code, lo, hi), (offset, factor) in zip(self.segments, adjust):
+            bars = self.store.load(code)
+            a, b = np.searchsorted(bars["ts"], [lo, hi], side="left")
+            for s in range(int(a), int(b), self.block_size):
+                block = np.array(bars[s:min(s + self.block_size, int(b))])
+                for name in ("open", "high", "low", "close"):
+                    if self.adjust == "difference": block[name] += offset
+                    elif self.adjust == "ratio": block[name] *= factor
+                yield block
+
+    def build(self, symbol) -> int:
+        """整條連續序列寫進資料庫 (串流寫入)；回傳總根數"""
+        rows = self.store.write_blocks(symbol, self.blocks())
+        for roll_ts, old, new, old_px, new_px in self.rolls:
+            print(f"   🔁 {np.datetime64(roll_ts, 'ns').astype('datetime64[m]')} {old} -> {new} (價差 {new_px - old_px:+g})")
+        return rows
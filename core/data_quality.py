@@ -0,0 +1,237 @@
+import os
+import json
+from datetime import datetime
+import numpy as np
+from core.bar_store import BarStore, bars_from_dataframe, to_ns_bound
+from core.continuous import trading_days
+
+# ==========================================
+# 🩺 歷史資料健檢 (NumPy 向量化，30 萬根 1 分 K 幾十毫秒)
+# 每次更新歷史資料後掃一次，報告存成 JSON 放在資料旁邊:
+#   CSV     : data/history/TMF_History.csv -> data/history/TMF_History.quality.json
+#   BarStore: data/bars/MTX.bar            -> data/bars/MTX.quality.json
+# 報告記著資料檔的大小與修改時間 (fingerprint)，引擎暖機 / 回測開檔時直接讀報告，資料沒變就不重掃
+# 完整的缺口索引 (起 / 迄 ns + 缺幾根) 另存成 .gaps.npy，JSON 只放最新的 MAX_ITEMS 筆明細給人看
+# 盤別 (1 分 K 標籤用開盤或收盤分鐘都算):
+#   日盤 08:45 ~ 13:45，一盤 300 根
+#   夜盤 15:00 ~ 隔日 05:00，一盤 840 根 (算下一個交易日)
+# ==========================================
+_NS_PER_MIN = 60_000_000_000
+_DAY_SESSION = (8 * 60 + 45, 13 * 60 + 45)
+_NIGHT_SESSION = (15 * 60, 5 * 60)
+SESSION_BARS = {"day": 300, "night": 840}
+MAX_ITEMS = 2000 # 每一類明細最多記幾筆，保留最新的 (摘要的數字永遠是完整的)
+GAP_DTYPE = np.dtype([("start", "<i8"), ("end", "<i8"), ("missing", "<i4")])
+
+def _iso(ns) -> str:
+    return str(np.datetime64(int(ns), "ns").astype("datetime64[s]")).replace("T", " ")
+
+def _runs(mask):
+    """布林陣列中連續 True 的 (起, 迄) 索引 (迄不含)"""
+    edges = np.diff(np.r_[0, mask.astype(np.int8), 0])
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def session_keys(ts):
+    """每根 K 棒 -> (盤別代碼, 是否在交易時段內)；代碼 = 交易日 x 2 (+1 = 日盤)，同一盤同一個代碼"""
+    ts = np.asarray(ts, dtype=np.int64)
+    minute = (ts // _NS_PER_MIN) % 1440
+    is_day = (minute >= _DAY_SESSION[0]) & (minute <= _DAY_SESSION[1])
+    is_night = (minute >= _NIGHT_SESSION[0]) | (minute <= _NIGHT_SESSION[1])
+    return trading_days(ts) * 2 + is_day, is_day | is_night
+
+def scan_bars(records, spike_k=20.0, spike_min_points=50.0, min_zero_run=5) -> dict:
+    """
+    整份 K 棒一次體檢，回傳報告 dict
+    gaps             : 同一盤內兩根 K 棒之間缺了幾分鐘 [前一根, 後一根, 缺幾根] (完整索引在 report["gap_index"])
+    short_sessions   : 整盤根數不足 (含開盤/收盤附近整段缺漏) [盤別起點, 日/夜, 實際, 應有]
+    zero_volume_runs : 連續 min_zero_run 根以上沒有成交量 [起, 迄, 根數]
+    bad_ohlc         : high < low、開收盤超出高低、價格 <= 0 或 NaN
+    spikes           : 同一盤內一分鐘跳動超過 max(spike_min_points, spike_k x 中位數跳動) [時間, 跳動點數]
+    duplicates / unsorted / off_session : 重複時間戳 / 時間倒退 / 不在交易時段內的 K 棒
+    """
+    ts = np.asarray(records["ts"], dtype=np.int64)
+    n = len(ts)
+    report = {"rows": int(n), "first": _iso(ts[0]) if n else None, "last": _iso(ts[-1]) if n else None}
+    details = {"gaps": [], "short_sessions": [], "zero_volume_runs": [], "bad_ohlc": [], "spikes": []}
+    summary = {"gaps": 0, "missing_minutes": 0, "short_sessions": 0, "zero_volume_runs": 0,
+               "bad_ohlc": 0, "spikes": 0, "duplicates": 0, "unsorted": 0, "off_session": 0}
+    report["summary"] = summary
+    report["gap_index"] = np.zeros(0, dtype=GAP_DTYPE)
+    report.update(details)
+    if n == 0: return report
+
+    o, h, l, c = (np.asarray(records[k], dtype=float) for k in ("open", "high", "low", "close"))
+    vol = np.asarray(records["volume"])
+    step = np.diff(ts)
+    summary["duplicates"] = int(np.sum(step == 0))
+    summary["unsorted"] = int(np.sum(step < 0))
+
+    # 後面的檢查都在「排序 + 去重」之後的序列上做
+    if summary["duplicates"] or summary["unsorted"]:
+        order = np.argsort(ts, kind="stable")
+        keep = np.r_[np.diff(ts[order]) != 0, True]
+        idx = order[keep]
+        ts, o, h, l, c, vol = ts[idx], o[idx], h[idx], l[idx], c[idx], vol[idx]
+        step = np.diff(ts)
+
+    key, in_session = session_keys(ts)
+    summary["off_session"] = int(np.sum(~in_session))
+
+    # 1. 盤中缺口
+    same = (key[1:] == key[:-1]) & in_session[1:] & in_session[:-1]
+    hole = same & (step > _NS_PER_MIN)
+    at = np.flatnonzero(hole)
+    missing = step[at] // _NS_PER_MIN - 1
+    summary["gaps"] = int(len(at))
+    summary["missing_minutes"] = int(missing.sum())
+    gap_index = np.zeros(len(at), dtype=GAP_DTYPE)
+    gap_index["start"], gap_index["end"], gap_index["missing"] = ts[at], ts[at + 1], missing
+    report["gap_index"] = gap_index
+    details["gaps"] = _gap_rows(gap_index[-MAX_ITEMS:])
+
+    # 2. 整盤根數 (只看交易時段內的 K 棒)
+    sk = key[in_session]
+    if len(sk):
+        starts = np.flatnonzero(np.r_[True, sk[1:] != sk[:-1]])
+        counts = np.diff(np.r_[starts, len(sk)])
+        first_ts = ts[in_session][starts]
+        is_day = (sk[starts] % 2) == 1
+        expected = np.where(is_day, SESSION_BARS["day"], SESSION_BARS["night"])
+        short = np.flatnonzero(counts < expected)
+        summary["short_sessions"] = int(len(short))
+        details["short_sessions"] = [[_iso(first_ts[i]), "day" if is_day[i] else "night", int(counts[i]), int(expected[i])]
+                                     for i in short[-MAX_ITEMS:]]
+
+    # 3. 連續零成交量
+    lo, hi = _runs(vol == 0)
+    long_runs = (hi - lo) >= min_zero_run
+    lo, hi = lo[long_runs], hi[long_runs]
+    summary["zero_volume_runs"] = int(len(lo))
+    details["zero_volume_runs"] = [[_iso(ts[a]), _iso(ts[b - 1]), int(b - a)] for a, b in zip(lo[-MAX_ITEMS:], hi[-MAX_ITEMS:])]
+
+    # 4. 不合理的 OHLC
+    bad = (h < l) | (o > h) | (o < l) | (c > h) | (c < l) | (np.minimum.reduce([o, h, l, c]) <= 0) \
+          | np.isnan(o) | np.isnan(h) | np.isnan(l) | np.isnan(c)
+    bad_at = np.flatnonzero(bad)
+    summary["bad_ohlc"] = int(len(bad_at))
+    details["bad_ohlc"] = [_iso(ts[i]) for i in bad_at[-MAX_ITEMS:]]
+
+    # 5. 跳價 (換盤的開盤跳空不算)
+    jump = np.abs(np.diff(c))
+    inner = jump[same]
+    if len(inner):
+        limit = max(spike_min_points, spike_k * float(np.median(inner)))
+        spike_at = np.flatnonzero(same & (jump > limit))
+        summary["spikes"] = int(len(spike_at))
+        details["spikes"] = [[_iso(ts[i + 1]), float(c[i + 1] - c[i])] for i in spike_at[-MAX_ITEMS:]]
+
+    report.update(details)
+    return report
+
+def _gap_rows(gap_index) -> list:
+    return [[_iso(a), _iso(b), int(m)] for a, b, m in zip(gap_index["start"], gap_index["end"], gap_index["missing"])]
+
+def gaps_between(report, start=None, end=None) -> list:
+    """報告裡落在 [start, end] 之間的盤中缺口 [前一根, 後一根, 缺幾根] (時間可以是字串 / datetime / pd.Timestamp)"""
+    index = report.get("gap_index")
+    if index is None:
+        # 舊報告沒有完整索引：只能從 JSON 明細裡找 (明細有上限，可能不完整)
+        lo = _iso(to_ns_bound(start)) if start is not None else ""
+        hi = _iso(to_ns_bound(end, end=True)) if end is not None else "~"
+        return [g for g in report.get("gaps", []) if lo <= g[0] and g[1] <= hi]
+    # 缺口依時間排序 -> 兩次二分搜尋切出區間
+    a = int(np.searchsorted(index["start"], to_ns_bound(start), side="left")) if start is not None else 0
+    b = int(np.searchsorted(index["end"], to_ns_bound(end, end=True), side="right")) if end is not None else len(index)
+    return _gap_rows(index[a:max(a, b)])
+
+_LABELS = {"gaps": "盤中缺口", "missing_minutes": "缺漏分鐘", "short_sessions": "根數不足的盤",
+           "zero_volume_runs": "連續零量", "bad_ohlc": "OHLC 異常", "spikes": "跳價",
+           "duplicates": "重複時間", "unsorted": "時間倒退", "off_session": "非交易時段"}
+
+def summarize(report) -> str:
+    """報告摘要一行字 (例如 '盤中缺口 3、缺漏分鐘 12')"""
+    s = report.get("summary", {})
+    issues = [f"{label} {s[name]}" for name, label in _LABELS.items() if s.get(name)]
+    return "、".join(issues) if issues else "沒有發現問題"
+
+# --- 報告存檔 (跟資料放在一起，資料檔沒變就直接讀) ---
+def report_path(data_path) -> str:
+    return os.path.splitext(data_path)[0] + ".quality.json"
+
+def gap_index_path(data_path) -> str:
+    return os.path.splitext(data_path)[0] + ".gaps.npy"
+
+def _fingerprint(data_path) -> dict:
+    st = os.stat(data_path)
+    return {"path": os.path.basename(data_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def load_report(data_path):
+    """讀已存的報告；資料檔之後又改過 (大小或修改時間不同) 就當作沒有 -> None"""
+    path = report_path(data_path)
+    if not os.path.exists(path) or not os.path.exists(data_path): return None
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    if report.get("fingerprint") != _fingerprint(data_path): return None
+    if os.path.exists(gap_index_path(data_path)):
+        report["gap_index"] = np.load(gap_index_path(data_path))
+    return report
+
+def save_report(data_path, report) -> str:
+    report["fingerprint"] = _fingerprint(data_path)
+    report["scanned"] = datetime.now().isoformat(sep=" ", timespec="seconds")
+    # 完整缺口索引先落地 (二進位，一筆 20 bytes)，JSON 最後寫：JSON 在就代表兩份都是新的
+    index = report.get("gap_index")
+    if index is not None:
+        tmp = gap_index_path(data_path) + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(index, dtype=GAP_DTYPE))
+        os.replace(tmp, gap_index_path(data_path))
+    path = report_path(data_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({k: v for k, v in report.items() if k != "gap_index"}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return path
+
+def csv_report(csv_path, rescan=False):
+    """CSV 的健檢報告：有存好而且資料沒變就直接讀，否則掃一次並存檔 (檔案不存在回傳 None)"""
+    if not os.path.exists(csv_path): return None
+    report = None if rescan else load_report(csv_path)
+    if report is None:
+        import pandas as pd
+        report = scan_bars(bars_from_dataframe(pd.read_csv(csv_path), clean=False))
+        save_report(csv_path, report)
+        print(f"🩺 [Quality] {csv_path}: {summarize(report)} (報告: {report_path(csv_path)})")
+    return report
+
+def store_report(store: BarStore, symbol, rescan=False):
+    """資料庫分區的健檢報告 (規則同 csv_report)"""
+    data_path = store.path_for(symbol)
+    if not os.path.exists(data_path): return None
+    report = None if rescan else load_report(data_path)
+    if report is None:
+        report = scan_bars(store.load(symbol))
+        save_report(data_path, report)
+        print(f"🩺 [Quality] {symbol}: {summarize(report)} (報告: {report_path(data_path)})")
+    return report
+
+def source_report(source, root="data/bars"):
+    """
+    回測資料來源 (CSV 路徑或 regime:/bars: 字串) -> (報告, 起, 迄)
+    資料庫來源回傳整個商品的報告 + 區間起訖，用 gaps_between 只看這段
+    """
+    from core.bar_store import is_store_source, resolve_source
+    if is_store_source(source):
+        store = BarStore(root)
+        symbol, start, end = resolve_source(source, store)
+        return store_report(store, symbol), start, end
+    return csv_report(source), None, None
+
+def describe(report, start=None, end=None) -> str:
+    """給開檔 / 暖機印的一行字：整份的摘要 + 這個區間內有幾個盤中缺口"""
+    if report is None: return "沒有健檢報告"
+    text = summarize(report)
+    if start is not None or end is not None:
+        window = gaps_between(report, start, end)
+        text += f" | 區間內盤中缺口 {len(window)} (缺 {sum(g[2] for g in window)} 分鐘)"
+    return text
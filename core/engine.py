@@ -2,12 +2,18 @@ import time
 import sys
 import datetime
 from config.settings import Settings
-from core.loader import load_history_data
+from core.loader import load_history_data, records_to_bars
+from core.tick_store import from_ns
+from core.data_quality import csv_report, describe, gaps_between
 from core.aggregator import BarAggregator
 from core.event import BarEvent, SignalEvent, SignalType, EventType
+from core.symbol_router import SymbolRouter, SymbolSlot
+from core.portfolio import Portfolio
 #from modules.ma_strategy import MAStrategy
 from modules.commander import TelegramCommander
 from core.recorder import TradeRecorder
+from core.snapshot import EngineSnapshot
+import numpy as np
 import pandas as pd
 
 class BotEngine:
@@ -16,7 +22,7 @@ class BotEngine:
     修正: /balance 與 /status 會依據 Executor 類型，
     自動切換顯示「真實 API 數據」或「模擬帳本數據」。
     """
-    def __init__(self, strategy, feeder, executor, symbol="TMF", enable_telegram=True):
+    def __init__(self, strategy, feeder, executor, symbol="TMF", enable_telegram=True, recorder=None):
         self.strategy = strategy
         self.feeder = feeder
         self.executor = executor
@@ -30,12 +36,35 @@ class BotEngine:
             
         #self.strategy = MAStrategy()
         self.aggregator = BarAggregator(symbol)
-        self.recorder = TradeRecorder()
+        self.recorder = recorder if recorder is not None else TradeRecorder() # 壓測可以指到暫存資料夾
         
         # 2. 全域狀態
         self.system_running = True
         self.auto_trading_active = True
+
+        # 📸 儀表板快照 (只有掛上 DashboardUI 時才開啟，回測/最佳化不花這筆錢)
+        self.publish_snapshots = False
+        self.snapshot_version = 0
+        self.snapshot = EngineSnapshot()
+
+        # 🔄 對帳員 (實戰/模擬由 main 掛上 PositionReconciler，同步部位後要重設它的基準)
+        self.reconciler = None
+        # 🏦 券商帳務快取 (實戰由 main_live 掛上 AccountSnapshotService；沒掛就照舊直接查 API)
+        self.account_service = None
         
+        # ⚡ 成交驅動帳本：成交/撤單回報改變部位時，把策略部位對齊「成交 + 在途」
+        self.executor.position_listener = self._on_executor_position_change
+
+        # 🔀 商品路由：主商品 = 第一個 slot (self.strategy / self.executor / self.aggregator 照舊指向它)
+        # 其他商品/合約用 add_symbol 掛上來，共用同一個 Feeder、指揮官與儀表板
+        self.router = SymbolRouter()
+        self.primary = self.router.add(SymbolSlot(symbol, strategy, executor, self.aggregator))
+        # 📝 成交驅動帳本：下單當下還沒有成交價與損益，trade_log.csv 改由成交回報來寫 (進場 + 平倉)
+        self.executor.trade_listener = lambda trade: self._on_executor_trade(self.primary, trade)
+        self.executor.entry_listener = lambda fill: self._on_executor_entry(self.primary, fill)
+        # 🧪 紙上策略組合：同一條行情再分給 N 個只記影子帳的策略 (add_paper_strategy 掛上)
+        self.portfolio = Portfolio(self.router)
+
         # 3. 綁定內部邏輯
         self._setup_callbacks()
         self._bind_events()
@@ -56,6 +85,15 @@ class BotEngine:
             else:
                 return "🔥 真槍實彈 (Live Trading)", True
 
+        def _fmt_age(acct) -> str:
+            """帳務快照的新鮮度說明 (給 /status、/balance 用)"""
+            if acct.fetched_at is None:
+                return "尚未取得"
+            note = f"{acct.age():.0f} 秒前"
+            if acct.error:
+                note += f", 最近刷新失敗: {acct.error}"
+            return note
+
         def _handle_setcost(new_cost: float) -> str:
             """處理指揮官強制覆寫成本的指令"""
             if not self.auto_trading_active:
@@ -87,11 +125,17 @@ class BotEngine:
 
             if is_real:
                 try:
-                    real_pos = self.executor.get_position()
+                    if self.account_service:
+                        acct = self.account_service.get()
+                        real_pos = acct.position
+                        real_src = f"Real, {_fmt_age(acct)}"
+                    else:
+                        real_pos = self.executor.get_position()
+                        real_src = "Real"
                     real_pos_text = "⚪️ 0"
                     if real_pos > 0: real_pos_text = f"🔴 +{real_pos}"
                     elif real_pos < 0: real_pos_text = f"🟢 {real_pos}"
-                    report += f"🏦 券商持倉: {real_pos_text} (Real)\n"
+                    report += f"🏦 券商持倉: {real_pos_text} ({real_src})\n"
                 except Exception as e:
                     report += f"❌ API 查詢失敗: {e}\n"
 
@@ -129,8 +173,14 @@ class BotEngine:
             # 2. 如果是實戰，優先顯示 API 數據
             if is_real:
                 try:
-                    real_equity = self.executor.get_balance() # 呼叫 RealExecutor 的 API 查詢
-                    report += f"🏦 **券商權益**: ${real_equity:,}\n"
+                    if self.account_service:
+                        # 讀背景快取，不在指令當下打券商 API
+                        acct = self.account_service.get()
+                        report += f"🏦 **券商權益**: ${acct.equity:,.0f} ({_fmt_age(acct)})\n"
+                        report += f"📈 **未實現損益**: ${acct.unrealized_pnl:,.0f}\n"
+                    else:
+                        real_equity = self.executor.get_balance() # 呼叫 RealExecutor 的 API 查詢
+                        report += f"🏦 **券商權益**: ${real_equity:,}\n"
                     
                     # 簡單計算今日概略損益 (假設初始資金是啟動時的權益，這裡比較難算準，先不顯示)
                     # 或者顯示 API 回傳的未實現損益? (目前 RealExecutor 沒實作 query pnl，先跳過)
@@ -153,6 +203,7 @@ class BotEngine:
             self.auto_trading_active = enable
             state = "啟動" if enable else "暫停"
             print(f"⚙️ [Engine] 自動交易已{state}")
+            self.publish_snapshot()
 
         def manual_trade(action: str, qty: int):
             """處理 /buy, /sell 指令 (無限制市價盲狙 + 完整記帳版)"""
@@ -203,15 +254,15 @@ class BotEngine:
                 realized_pnl = pnl_after - pnl_before
                 
                 # 5. 🚀 恢復你的完美記帳邏輯：更新策略倉位與停損基準價
-                self.strategy.set_position(self.executor.current_position)
+                self.strategy.set_position(self.executor.expected_position)
                 
                 if self.strategy.position != 0:
                     self.strategy.entry_price = current_price 
                 else:
                     self.strategy.entry_price = 0.0
 
-                # 6. 🚀 恢復你的 CSV 歷史交易紀錄寫入
-                if msg: 
+                # 6. 🚀 恢復你的 CSV 歷史交易紀錄寫入 (成交驅動帳本改由平倉成交回報寫)
+                if msg and not self.executor.fill_driven:
                     self.recorder.write_trade(
                         timestamp=current_time,
                         symbol=self.symbol,
@@ -223,8 +274,9 @@ class BotEngine:
                         msg=f"Telegram User Command ({action})"
                     )
 
+                self.publish_snapshot()
                 print(f"✅ [Manual] 執行官處理完畢！")
-                self.commander.send_message(f"✅ **手動成交**\n{msg}\n修正後倉位: {self.strategy.position}")
+                self.commander.send_message(f"✅ **手動成交**\n{msg}\n修正後倉位: {self.strategy.position}", priority=True)
 
             except Exception as e:
                 import traceback
@@ -274,11 +326,11 @@ class BotEngine:
                 realized_pnl = pnl_after - pnl_before
 
                 # 4. 🚀 恢復策略清空與停損重置
-                self.strategy.set_position(self.executor.current_position)
+                self.strategy.set_position(self.executor.expected_position)
                 self.strategy.entry_price = 0.0
 
-                # 5. 🚀 恢復 CSV 紀錄
-                if msg:
+                # 5. 🚀 恢復 CSV 紀錄 (成交驅動帳本改由平倉成交回報寫)
+                if msg and not self.executor.fill_driven:
                     self.recorder.write_trade(
                         timestamp=current_time,
                         symbol=self.symbol,
@@ -290,8 +342,10 @@ class BotEngine:
                         msg="Telegram User Command (/flat)"
                     )
 
+                self.publish_snapshot()
                 print(f"✅ [Manual] 平倉訊號已送出！")
-                self.commander.send_message(f"✅ **已全數平倉**\n{msg}\n實現損益: ${realized_pnl:,.0f}\n目前倉位: {self.strategy.position}")
+                pnl_line = "" if self.executor.fill_driven else f"\n實現損益: ${realized_pnl:,.0f}" # 成交驅動：損益等成交回報再通知
+                self.commander.send_message(f"✅ **已全數平倉**\n{msg}{pnl_line}\n目前倉位: {self.strategy.position}", priority=True)
 
             except Exception as e:
                 import traceback
@@ -315,31 +369,28 @@ class BotEngine:
                     return
 
             old_pos = self.strategy.position
-            
-            # 強制覆蓋 Engine 和 Executor 的影子帳本
+
+            # 強制覆蓋 Engine 和 Executor 的影子帳本：走跟對帳員一樣的 resync_position
+            # 券商部位為準 -> 在途委託全部刪單、排隊中的訊號作廢，不然之後的成交/撤單回報又會把部位帶走
+            cancelled = self.executor.cancel_pending()
+            if cancelled:
+                self.commander.send_message(f"🗑️ [Sync] 已刪除 {cancelled} 張在途委託")
+
+            # 🚀 致命重點防護：修復「失憶症」，優先向 Executor 討要真實成本，拿不到才用當下市價
+            real_cost = getattr(self.executor, 'get_real_cost', lambda: 0.0)() if real_pos else 0.0
+            latest_price = getattr(self.strategy, 'latest_price', 0.0) or 0.0
+            cost_source_msg = self.executor.resync_position(real_pos, cost=real_cost, fallback=latest_price)
             self.strategy.set_position(real_pos)
-            self.executor.current_position = real_pos
-            
-            # 🚀 致命重點防護：修復「失憶症」，如果發現有單但沒成本價，用現在市價當成本！
-            if real_pos != 0 and getattr(self.strategy, 'entry_price', 0.0) == 0.0:
-                
-                # 1. 優先向 Executor 討要真實成本
-                real_cost = getattr(self.executor, 'get_real_cost', lambda: 0.0)()
-                
-                if real_cost > 0:
-                    current_price = real_cost
-                    cost_source_msg = "API 真實成本"
-                else:
-                    # 2. 備案：如果 Executor 拿不到，才用當下市價盲猜
-                    current_price = getattr(self.strategy, 'latest_price', 0.0)
-                    cost_source_msg = "當前市價 (備案)"
+            if self.reconciler:
+                self.reconciler.reset(real_pos)
+            if self.account_service:
+                self.account_service.request_refresh()
 
+            if real_pos != 0 and getattr(self.strategy, 'entry_price', 0.0) == 0.0:
+                current_price = self.executor.avg_price
                 if current_price > 0:
                     self.strategy.entry_price = current_price
 
-                    # 🚀 新增這行：把新成本價也同步給會計師，避免損益計算錯誤！
-                    self.executor.avg_price = current_price
-
                     # 移動停利的基準點也要一起重置 (如果該策略有這些屬性的話)
                     if hasattr(self.strategy, 'highest_price'): self.strategy.highest_price = current_price
                     if hasattr(self.strategy, 'lowest_price'): self.strategy.lowest_price = current_price
@@ -348,9 +399,8 @@ class BotEngine:
                     msg = f"⚠️ [Sync] 已接管未結算部位！成本基準價重新錨定為【{cost_source_msg}】: {current_price}"
                     print(msg)
                     self.commander.send_message(msg)
-            else:
-                # 歸零均價
-                self.executor.avg_price = 0.0 
+
+            self.publish_snapshot()
             
             self.commander.send_message(
                 f"✅ **同步完成**\n"
@@ -364,7 +414,7 @@ class BotEngine:
         def shutdown():
             print("\n💀 指揮官下達關機指令...")
             self.commander.send_message("💀 **系統正在關機 (System Shutdown)**")
-            time.sleep(1)
+            self.commander.stop(timeout=5) # 讓郵差把最後幾則送完再關門
             self.system_running = False
             self.feeder.stop()
             sys.exit(0)
@@ -378,7 +428,8 @@ class BotEngine:
             manual_trade_cb=manual_trade,
             sync_position_cb=sync_position,
             flatten_cb=flatten_position,
-            setcost_cb=_handle_setcost
+            setcost_cb=_handle_setcost,
+            paper_cb=self.portfolio.report
         )
 
     def _bind_events(self):
@@ -386,6 +437,8 @@ class BotEngine:
         
         # 🚀 裝甲升級：替 Tick 接收器穿上防彈衣，並加上「第一滴血」偵測
         self._first_tick_received = False
+        slots = self.router.slots
+        portfolio = self.portfolio
         
         def safe_on_tick(tick):
             try:
@@ -415,14 +468,27 @@ class BotEngine:
                     # 為了防呆，順便把 datetime 也綁上去，以防其他地方用到
                     t_obj.datetime = t_obj.timestamp 
                     
-                    # 將轉接好的物件交給合成器
-                    self.aggregator.on_tick(t_obj)
+                    # 將轉接好的物件依商品代碼交給對應的合成器
+                    slot = slots.get(t_obj.symbol)
+                    if slot is None: return
+                    slot.executor.on_market_data(t_obj.price, t_obj.volume, tick.get('bid'), tick.get('ask'), t_obj.timestamp)
+                    slot.aggregator.on_tick(t_obj)
+                    if slot.tick_hook: self._check_tick_risk(t_obj, slot)
+                    if portfolio.books: portfolio.on_tick(slot.symbol, t_obj, tick.get('bid'), tick.get('ask'))
                 else:
                     # 如果本來就是物件 (例如回測時)，就直接放行
                     # 但為了安全，如果沒有 symbol 也強制幫它貼上
                     if not hasattr(tick, 'symbol'):
                         tick.symbol = self.symbol
-                    self.aggregator.on_tick(tick)
+                    slot = slots.get(tick.symbol)
+                    if slot is None: return
+                    # 🎯 先給執行器撮合 (模擬成交模型要用買賣價)，再合成 K 棒
+                    slot.executor.on_market_data(tick.price, getattr(tick, 'volume', 0), getattr(tick, 'bid_price', None),
+                                                 getattr(tick, 'ask_price', None), getattr(tick, 'timestamp', None))
+                    slot.aggregator.on_tick(tick)
+                    if slot.tick_hook: self._check_tick_risk(tick, slot)
+                    if portfolio.books:
+                        portfolio.on_tick(slot.symbol, tick, getattr(tick, 'bid_price', None), getattr(tick, 'ask_price', None))
                 
             except Exception as e:
                 import traceback
@@ -442,92 +508,234 @@ class BotEngine:
         # Aggregator 產生的 Bar 也要綁定
         self.aggregator.set_on_bar(self.on_bar_generated)
 
+    def add_symbol(self, symbol, strategy, executor, reconciler=None):
+        """
+        掛上另一個商品/合約 (例如 MXF202603，或轉倉期間的次月 TMF)
+        各自有 K 線合成器、策略與帳本，共用同一個 Feeder (同一條行情連線) 與指揮官
+        """
+        slot = self.router.add(SymbolSlot(symbol, strategy, executor, reconciler=reconciler))
+        slot.aggregator.set_on_bar(self.on_bar_generated)
+        executor.position_listener = lambda: self._on_executor_position_change(slot)
+        executor.trade_listener = lambda trade: self._on_executor_trade(slot, trade)
+        executor.entry_listener = lambda fill: self._on_executor_entry(slot, fill)
+        if hasattr(self.feeder, 'add_contract'):
+            self.feeder.add_contract(symbol) # 讓 Feeder 一併訂閱這個合約的行情
+        print(f"🔀 [Engine] 新增交易商品: {symbol} ({strategy.name})")
+        return slot
+
+    def add_paper_strategy(self, strategy, symbol=None, executor=None):
+        """
+        掛一個紙上策略 (預設跟主商品同一條行情)：吃同樣的 K 棒/Tick，自己一本模擬帳，不會送任何單到券商
+        executor 不給就用 MockExecutor；要比較成交品質可以傳掛了 fill_model 的 MockExecutor
+        """
+        symbol = symbol or self.symbol
+        if symbol not in self.router.slots:
+            raise ValueError(f"商品 {symbol} 尚未加入引擎 (請先 add_symbol)")
+        book = self.portfolio.add(symbol, strategy, executor)
+        print(f"🧪 [Engine] 新增紙上策略: {book.name} [{symbol}]")
+        return book
+
+    def _check_tick_risk(self, tick, slot):
+        """盤中逐筆風控 (在 K 棒合成之後呼叫，收盤訊號會先處理完)：策略回傳訊號就以這筆 Tick 的價格送單"""
+        signal = slot.strategy.on_tick(tick)
+        if not signal: return
+        price = tick.price
+        # 借一根「只有這筆價格」的 K 棒走正規下單管線 (記帳/寫 Log/通知都與收盤訊號一致)
+        bar = BarEvent(symbol=tick.symbol, open=price, high=price, low=price, close=price, volume=0,
+                       timestamp=tick.timestamp)
+        self._handle_signal(signal, bar, slot)
+        self.publish_snapshot()
+
     def load_warmup_data(self, csv_path="data/history/TMF_History.csv"):
         history_bars = load_history_data(csv_path, tail_count=25000)
         if history_bars:
             self.strategy.load_history_bars(history_bars)
-            self.commander.send_message(f"✅ **暖機完成**\n已載入 {len(history_bars)} 根歷史 K 棒")
+            self.portfolio.load_history_bars(self.symbol, history_bars) # 同一份解析結果，紙上策略不再重讀 CSV
+            msg = f"✅ **暖機完成**\n已載入 {len(history_bars)} 根歷史 K 棒"
+            # 🩺 讀更新資料時存好的健檢報告 (不重新檢查)；暖機區間內有盤中缺口就提醒，缺口會讓 60 分 K 重採樣失真
+            report = csv_report(csv_path)
+            if report is not None:
+                start, end = history_bars[0]['datetime'], history_bars[-1]['datetime']
+                print(f"🩺 [Engine] 歷史資料健檢: {describe(report, start, end)}")
+                window = gaps_between(report, start, end)
+                if window:
+                    worst = max(window, key=lambda g: g[2])
+                    msg += f"\n⚠️ 暖機區間有 {len(window)} 個盤中缺口 (最大: {worst[0]} 後缺 {worst[2]} 分鐘)"
+            self.commander.send_message(msg)
         else:
             print("⚠️ 無歷史資料，策略將從 0 開始累積")
 
     def on_bar_generated(self, bar: BarEvent):
+        # 依 K 棒的商品找到對應的策略/帳本 (單商品或對不上時一律走主商品，與舊行為相同)
+        slot = self.router.slots.get(bar.symbol, self.primary)
         if self.enable_telegram:
             icon = "▶️" if self.auto_trading_active else "⏸"
+            tag = "" if slot is self.primary else f"[{slot.symbol}] "
             
             # 🚀 移除 end='\r'，強制換行，確保每一根 K 棒都能穩穩寫入 Log 攔截器！
-            print(f"📊 {bar.timestamp.strftime('%H:%M')} C:{int(bar.close)} {icon}")
-            
-        signal = self.strategy.on_bar(bar)
+            print(f"📊 {tag}{bar.timestamp.strftime('%H:%M')} C:{int(bar.close)} {icon}")
+
+        # 🎯 只有 K 棒、沒有 Tick 的資料源 (回測)：以 K 棒收盤當作一筆行情推進模擬撮合
+        if not self._first_tick_received:
+            slot.executor.on_market_data(bar.close, bar.volume, ts=bar.timestamp)
+
+        signal = slot.strategy.on_bar(bar)
         
         if signal:
-            # ==========================================
-            # 🛡️ 觀望模式 (半自動駕駛)：只廣播，不下單
-            # ==========================================
-            if not self.auto_trading_active:
-                print(f"\n🔔 [觀望模式] 偵測到訊號，但不執行下單: {signal.signal_type.name} | {signal.reason}")
+            self._handle_signal(signal, bar, slot)
+        slot.executor.mark_to_market(bar.close, bar.timestamp) # 📈 權益曲線 (含未實現)
+
+        # 🧪 同一根 K 棒分給紙上策略 (合成器只跑一次)
+        if self.portfolio.books:
+            self.portfolio.on_bar(slot.symbol, bar, advance_market=not self._first_tick_received)
+
+        # 📸 K 棒收盤 = 狀態改變，發布新快照給儀表板
+        self.publish_snapshot()
+
+    def _handle_signal(self, signal: SignalEvent, bar: BarEvent, slot=None):
+        """處理策略訊號：觀望模式只廣播，自動模式交給執行官下單並記帳 (slot = 哪個商品，預設主商品)"""
+        slot = slot or self.primary
+        # ==========================================
+        # 🛡️ 觀望模式 (半自動駕駛)：只廣播，不下單
+        # ==========================================
+        if not self.auto_trading_active:
+            print(f"\n🔔 [觀望模式] 偵測到訊號，但不執行下單: {signal.signal_type.name} | {signal.reason}")
+            
+            if self.enable_telegram and hasattr(self, 'commander') and self.commander:
+                # 判斷一下建議的手動指令
+                suggest_cmd = "/buy" if signal.signal_type == SignalType.LONG else ("/sell" if signal.signal_type == SignalType.SHORT else "/flat")
                 
-                if self.enable_telegram and hasattr(self, 'commander') and self.commander:
-                    # 判斷一下建議的手動指令
-                    suggest_cmd = "/buy" if signal.signal_type == SignalType.LONG else ("/sell" if signal.signal_type == SignalType.SHORT else "/flat")
-                    
-                    self.commander.send_message(
-                        f"🔔 **[觀望模式] 訊號觸發 (未下單)**\n"
-                        f"🎯 動作: {signal.signal_type.name}\n"
-                        f"📊 標的: {self.symbol} @ {bar.close}\n"
-                        f"📝 原因: {signal.reason}\n"
-                        f"------------------\n"
-                        f"💡 若要手動跟單，請輸入 `{suggest_cmd}`\n"
-                        f"▶️ 若要交還兵權恢復自動，請輸入 `/start`"
-                    )
-                return # 🚀 結束函數，絕對不會呼叫 Executor 下單！
+                self.commander.send_message(
+                    f"🔔 **[觀望模式] 訊號觸發 (未下單)**\n"
+                    f"🎯 動作: {signal.signal_type.name}\n"
+                    f"📊 標的: {slot.symbol} @ {bar.close}\n"
+                    f"📝 原因: {signal.reason}\n"
+                    f"------------------\n"
+                    f"💡 若要手動跟單，請輸入 `{suggest_cmd}`\n"
+                    f"▶️ 若要交還兵權恢復自動，請輸入 `/start`"
+                )
+            return # 🚀 結束函數，絕對不會呼叫 Executor 下單！
 
-            print(f"\n⚡️ [訊號觸發] {signal.signal_type} | {signal.reason}")
-            
-            pnl_before = self.executor.total_pnl
-            trade_msg = self.executor.execute_signal(signal, bar.close)
-            pnl_after = self.executor.total_pnl
-            realized_pnl = pnl_after - pnl_before
-            
-            self.strategy.set_position(self.executor.current_position)
-            
-            if trade_msg:
-                action = signal.signal_type.name
+        print(f"\n⚡️ [訊號觸發] {signal.signal_type} | {signal.reason}")
+        
+        pnl_before = slot.executor.total_pnl
+        trade_msg = slot.executor.execute_signal(signal, bar.close)
+        pnl_after = slot.executor.total_pnl
+        realized_pnl = pnl_after - pnl_before
+        
+        slot.strategy.set_position(slot.executor.expected_position)
+        
+        if trade_msg:
+            action = signal.signal_type.name
+            if not slot.executor.fill_driven: # 成交驅動帳本：這裡只送出委託，交易紀錄等成交回報再寫
                 self.recorder.write_trade(
                     timestamp=bar.timestamp,
-                    symbol=self.symbol,
+                    symbol=slot.symbol,
                     action=action,
                     price=bar.close,
                     qty=1,
-                    strategy_name=self.strategy.name,
+                    strategy_name=slot.strategy.name,
                     pnl=realized_pnl,
                     msg=signal.reason
                 )
-                self.commander.send_message(f"⚡️ **自動成交**\n{trade_msg}\n原因: {signal.reason}")
+            tag = f" [{slot.symbol}]" if len(self.router) > 1 else ""
+            self.commander.send_message(f"⚡️ **自動成交**{tag}\n{trade_msg}\n原因: {signal.reason}", priority=True)
+
+    def _on_executor_entry(self, slot, fill):
+        """(券商回報執行緒) 開倉/加碼成交：用真實成交價寫一筆 LONG / SHORT 進場紀錄"""
+        self.recorder.write_trade(
+            timestamp=fill['time'] or datetime.datetime.now(),
+            symbol=slot.symbol,
+            action=fill['direction'],
+            price=fill['price'],
+            qty=fill['qty'],
+            strategy_name=slot.strategy.name,
+            pnl=0.0,
+            msg=fill['reason']
+        )
+
+    def _on_executor_trade(self, slot, trade):
+        """(券商回報執行緒) 一趟交易平倉成交：用真實成交價與損益寫 trade_log.csv (FLATTEN_LONG / FLATTEN_SHORT)，並通知 Telegram"""
+        close_action = "SELL" if trade['direction'] == "LONG" else "BUY"
+        exit_time = trade['exit_time'] or datetime.datetime.now()
+        self.recorder.write_trade(
+            timestamp=exit_time,
+            symbol=slot.symbol,
+            action=f"FLATTEN_{trade['direction']}",
+            price=trade['exit_price'],
+            qty=trade['qty'],
+            strategy_name=slot.strategy.name,
+            pnl=round(trade['pnl'], 2),
+            msg=trade['reason']
+        )
+        tag = f" [{slot.symbol}]" if len(self.router) > 1 else ""
+        self.commander.send_message(
+            f"💰 **平倉成交**{tag}\n{close_action} {trade['qty']} 口 @ {trade['exit_price']:.0f}\n"
+            f"實現損益: ${trade['pnl']:,.0f}", priority=True)
+
+    def _on_executor_position_change(self, slot=None):
+        """(券商回報執行緒) 成交或撤單改變了部位 (slot = 哪個商品，預設主商品)"""
+        slot = slot or self.primary
+        slot.strategy.set_position(slot.executor.expected_position)
+        self.publish_snapshot()
+
+    def publish_snapshot(self):
+        """
+        📸 發布引擎狀態快照 (唯讀)
+        只在狀態改變時呼叫 (K 棒收盤、成交、指令)，儀表板依 version 判斷要不要重畫。
+        """
+        if not self.publish_snapshots:
+            return
+
+        st = self.strategy
+        ex = self.executor
+        # 優先讀取 Executor 的真實部位，如果拿不到，才去讀策略的影子部位
+        pos = getattr(ex, 'current_position', getattr(st, 'position', 0))
+
+        if hasattr(st, 'get_ui_dict'):
+            try:
+                metrics = tuple((str(k), str(v)) for k, v in st.get_ui_dict().items())
+            except Exception as e:
+                metrics = (("⚠️ 指標錯誤", str(e)),)
+        else:
+            metrics = (("提示", "本策略尚未提供監控指標"),)
+
+        self.snapshot_version += 1
+        # 整份換掉 (參照賦值是原子操作)，UI 執行緒永遠只會看到完整的一份
+        self.snapshot = EngineSnapshot(
+            version=self.snapshot_version,
+            symbol=self.symbol,
+            strategy_name=getattr(st, 'name', 'Unknown Strategy'),
+            position=pos,
+            auto_trading=self.auto_trading_active,
+            metrics=metrics,
+            total_pnl=getattr(ex, 'total_pnl', 0.0),
+            trade_count=len(getattr(ex, 'trades', [])),
+            account=self.account_service.get() if self.account_service else None,
+        )
 
     def sync_warmup_data_from_api(self):
         """
         [雙軌數據核心]
         檢查策略目前的資料進度，並從 API 抓取缺少的「溫數據 (Warm Data)」。
+        多商品時每個商品各回補一次 (共用同一個 API 連線)。
         """
         # 1. 只有 ShioajiFeeder 才有能力抓 API，MockFeeder 做不到
         if not hasattr(self.feeder, 'fetch_kbars'):
             print("⚠️ [Engine]目前的 Feeder 不支援 API 回補，跳過。")
             return
 
-        # 2. 決定要從哪一天開始抓
-        start_date = datetime.datetime.now().strftime("%Y-%m-%d") # 預設抓今天
-        
-        # 如果策略已經有載入 CSV 歷史資料，我們就從「最後一筆資料的日期」開始抓
-        if self.strategy.raw_bars:
-            last_bar = self.strategy.raw_bars[-1]
-            
-            # 判斷是 dict 還是物件 (相容性處理)
-            if isinstance(last_bar, dict):
-                last_dt = pd.to_datetime(last_bar['datetime'])
-            else:
-                last_dt = pd.to_datetime(last_bar.timestamp)
-                
-            start_date = last_dt.strftime("%Y-%m-%d")
+        for slot in self.router:
+            self._sync_warmup_slot(slot)
+
+    def _sync_warmup_slot(self, slot):
+        strategy = slot.strategy
+
+        # 2. 決定要從哪一天開始抓：策略已經消化到的最後一根 (CSV 暖機或指標框架)
+        last_time = strategy.last_bar_time()
+        last_ns = pd.Timestamp(last_time).value if last_time is not None else None
+        if last_ns is not None:
+            start_date = pd.Timestamp(last_ns).strftime("%Y-%m-%d")
             print(f"📅 [Engine] 偵測到歷史資料，將從 {start_date} 開始回補...")
         else:
             # 如果完全沒資料，預設抓最近 3 天
@@ -535,150 +743,71 @@ class BotEngine:
             start_dt = datetime.datetime.now() - datetime.timedelta(days=3)
             start_date = start_dt.strftime("%Y-%m-%d")
 
-        # 3. 執行回補
+        # 3. 執行回補 (feeder 回傳 BAR_DTYPE 紀錄陣列，依時間排序)
         print("🚀 [Engine] 啟動雙軌數據對接 (API Backfill)...")
-        recent_bars = self.feeder.fetch_kbars(start_date)
-        
-        if recent_bars:
-            # 4. 將資料倒進策略 (策略會自己處理重複資料)
-            # 注意: 這裡假設 strategy.load_history_bars 已經支援 append 模式
-            # 如果它是覆蓋模式，我們可能需要先合併。
-            # 但我們目前的 BaseStrategy.load_history_bars 是 append 嗎？
-            # 檢查後發現 BaseStrategy 是 self.raw_bars = bars (覆蓋)
-            # 所以我們要先拿出舊的，合併後再塞回去，或者直接呼叫策略的 update
-            
-            # 這裡我們用比較安全的方式：直接呼叫 load_history_bars，讓策略自己處理
-            # 但為了避免 CSV 資料被洗掉，我們應該把新資料 append 進去
-            
-            # 修正策略：我們直接把新資料 append 到 strategy.raw_bars
-            # (因為 BaseStrategy/MAStrategy 的 raw_bars 是 deque 或 list)
-            
-            count = 0
-            # 取得目前策略最後的時間，用來過濾重複
-            last_strategy_time = None
-            if self.strategy.raw_bars:
-                 last_item = self.strategy.raw_bars[-1]
-                 # 確保轉成 pandas timestamp 以便比對
-                 if isinstance(last_item, dict):
-                     last_strategy_time = pd.to_datetime(last_item['datetime'])
-                 else:
-                     last_strategy_time = pd.to_datetime(last_item.timestamp)
-
-            print(f"🧐 [Debug] CSV 最後時間: {last_strategy_time}")
-            if recent_bars:
-                first_api_time = pd.to_datetime(recent_bars[0]['datetime'])
-                last_api_time = pd.to_datetime(recent_bars[-1]['datetime'])
-                print(f"🧐 [Debug] API 資料範圍: {first_api_time} ~ {last_api_time}")
-
-            # --- 開始比對與接合 ---
-            new_warmup_bars = [] # 🚀 準備一個盤子裝新資料
-
-            for bar in recent_bars:
-                bar_time = pd.to_datetime(bar['datetime']) # 確保也是 Timestamp
-                
-                # 嚴格過濾：必須比 CSV 最後時間「大」才收
-                if last_strategy_time and bar_time <= last_strategy_time:
-                    continue
-                
-                # 轉成策略需要的格式 (dict) 並 append
-                self.strategy.raw_bars.append({
-                    'datetime': bar['datetime'],
-                    'close': bar['close'],
-                    # 視需要補上 open/high/low/volume
-                    'open': bar['open'],
-                    'high': bar['high'],
-                    'low': bar['low'],
-                    'volume': bar['volume']
-                })
-                count += 1
-            
-            # 🚀 關鍵修復：把這盤 API 溫數據，正式交給大腦的消化系統！
-            if new_warmup_bars:
-                print(f"🧠 [Engine] 準備將 {count} 根 API 溫數據餵給大腦消化...")
-                self.strategy.load_history_bars(new_warmup_bars)
-
-            print(f"🔗 [Engine] 雙軌對接完成！成功接合 {count} 根 K 棒。")
-        #     # --- 🛡️ 資料連續性檢查 (Gap Detection) ---
-        #     if count > 0 and last_strategy_time:
-        #         # 取得剛接上的第一根新資料時間
-        #         # 注意：這裡要從 recent_bars 裡找第一根被 accept 的
-        #         # 為了簡化，我們直接比較 CSV最後一根 vs API第一根(如果它比CSV新的話)
-                
-        #         # 比較簡單的做法：檢查 CSV 最後時間 與 當下時間 的差距
-        #         # 如果補完資料後，最新的資料時間距離現在超過 X 分鐘，代表有問題
-                
-        #         new_last_bar = self.strategy.raw_bars[-1]
-        #         new_last_time = pd.to_datetime(new_last_bar['datetime'] if isinstance(new_last_bar, dict) else new_last_bar.timestamp)
-        #         now = datetime.datetime.now()
-                
-        #         # 計算落後多久
-        #         lag = now - new_last_time
-                
-        #         # 如果是盤中 (08:45~13:45)，且落後超過 5 分鐘
-        #         is_trading_hours = (8 <= now.hour <= 13) 
-        #         if is_trading_hours and lag.total_seconds() > 300: # 5分鐘
-        #             warning_msg = f"⚠️ [嚴重警告] 資料可能有斷層！\n最新資料時間: {new_last_time}\n目前系統時間: {now}\n落後: {lag}"
-        #             print(warning_msg)
-        #             self.commander.send_message(warning_msg)
-        #         else:
-        #             print(f"✅ [Engine] 資料連續性檢查通過 (Lag: {lag})")
-
-        #     self.commander.send_message(f"🔗 **數據對接完成**\n補回 {count} 根 K 棒 (Warm Data)")
-        # else:
-        #     print("⚠️ [Engine] 無新資料需回補 (可能已是最新)")
+        records = self.feeder.fetch_kbars(start_date, symbol=slot.symbol)
+        if len(records) == 0:
+            print("⚠️ [Engine] 無新資料需回補 (可能已是最新)")
+            return
 
-            # ==========================================
-            # 🛡️ 新增：資料新鮮度防呆檢查 (Data Freshness Check)
-            # ==========================================
-            if self.strategy.raw_bars:
-                # 1. 取得目前策略記憶體中「最新」的那根 K 棒時間
-                last_bar = self.strategy.raw_bars[-1]
-                
-                # 兼容性處理 (dict vs object)
-                if isinstance(last_bar, dict):
-                    last_bar_time = pd.to_datetime(last_bar['datetime'])
-                else:
-                    last_bar_time = pd.to_datetime(last_bar.timestamp)
-                
-                # 2. 計算落後時間 (Lag)
-                now = datetime.datetime.now()
-                lag = now - last_bar_time
-                
-                # 3. 判斷嚴重程度
-                # 假設: 如果落後超過 24 小時，通常代表是假日，或者資料嚴重脫節
-                msg_header = ""
-                should_warn = False
-                
-                # 情況 A: 盤中 (08:45 ~ 13:45) 且落後超過 10 分鐘 -> 紅色警報
-                is_day_trading = (8 <= now.hour <= 13)
-                if is_day_trading and lag.total_seconds() > 600: # 10分鐘
-                    msg_header = "🔴 **[嚴重警報] 資料嚴重滯後！**"
-                    should_warn = True
-                
-                # 情況 B: 非盤中，但落後超過 5 天 (可能忘記跑 Downloader) -> 黃色警報
-                elif lag.days > 5:
-                    msg_header = "🟡 **[提醒] 歷史資料過舊**"
-                    should_warn = True
-
-                # 4. 發送警告
-                if should_warn:
-                    warning_msg = (
-                        f"{msg_header}\n"
-                        f"------------------\n"
-                        f"最後資料: {last_bar_time.strftime('%Y-%m-%d %H:%M')}\n"
-                        f"系統時間: {now.strftime('%Y-%m-%d %H:%M')}\n"
-                        f"資料落後: {lag}\n"
-                        f"------------------\n"
-                        f"💡 建議: 請檢查是否為休市期間，或執行 universal_downloader 更新 CSV。"
-                    )
-                    print(warning_msg)
-                    if self.enable_telegram:
-                        self.commander.send_message(warning_msg)
-                else:
-                    print(f"✅ [Engine] 資料新鮮度檢查通過 (Lag: {lag})")
-            
-            else:
-                 print("⚠️ [Engine] 策略內無任何 K 棒資料！")
+        # 4. 一次 searchsorted 切掉已經有的部分 (必須比最後時間「大」才收)，不再逐根 pd.to_datetime 比對
+        first = 0 if last_ns is None else int(np.searchsorted(records["ts"], last_ns, side="right"))
+        fresh = records[first:]
+        print(f"🧐 [Engine] 最後已知時間: {last_time} | API 資料範圍: {from_ns(records['ts'][0])} ~ {from_ns(records['ts'][-1])} | 新的 {len(fresh)} 根")
+
+        # 5. 溫數據走策略的整批暖機路徑 (指標會一起更新，不是只塞進 raw_bars)，紙上策略吃同一份
+        if len(fresh):
+            warm_bars = records_to_bars(fresh)
+            print(f"🧠 [Engine] 準備將 {len(warm_bars)} 根 API 溫數據餵給大腦消化...")
+            strategy.load_history_bars(warm_bars)
+            self.portfolio.load_history_bars(slot.symbol, warm_bars)
+        print(f"🔗 [Engine] 雙軌對接完成！成功接合 {len(fresh)} 根 K 棒。")
+
+        # ==========================================
+        # 🛡️ 資料新鮮度防呆檢查 (Data Freshness Check)
+        # ==========================================
+        last_time = strategy.last_bar_time()
+        if last_time is None:
+            print("⚠️ [Engine] 策略內無任何 K 棒資料！")
+            return
+
+        # 1. 策略「最新」的那根 K 棒時間 -> 計算落後時間 (Lag)
+        last_bar_time = pd.Timestamp(last_time)
+        now = datetime.datetime.now()
+        lag = now - last_bar_time
+
+        # 2. 判斷嚴重程度
+        # 假設: 如果落後超過 24 小時，通常代表是假日，或者資料嚴重脫節
+        msg_header = ""
+        should_warn = False
+
+        # 情況 A: 盤中 (08:45 ~ 13:45) 且落後超過 10 分鐘 -> 紅色警報
+        is_day_trading = (8 <= now.hour <= 13)
+        if is_day_trading and lag.total_seconds() > 600: # 10分鐘
+            msg_header = "🔴 **[嚴重警報] 資料嚴重滯後！**"
+            should_warn = True
+
+        # 情況 B: 非盤中，但落後超過 5 天 (可能忘記跑 Downloader) -> 黃色警報
+        elif lag.days > 5:
+            msg_header = "🟡 **[提醒] 歷史資料過舊**"
+            should_warn = True
+
+        # 3. 發送警告
+        if should_warn:
+            warning_msg = (
+                f"{msg_header}\n"
+                f"------------------\n"
+                f"最後資料: {last_bar_time.strftime('%Y-%m-%d %H:%M')}\n"
+                f"系統時間: {now.strftime('%Y-%m-%d %H:%M')}\n"
+                f"資料落後: {lag}\n"
+                f"------------------\n"
+                f"💡 建議: 請檢查是否為休市期間，或執行 universal_downloader 更新 CSV。"
+            )
+            print(warning_msg)
+            if self.enable_telegram:
+                self.commander.send_message(warning_msg)
+        else:
+            print(f"✅ [Engine] 資料新鮮度檢查通過 (Lag: {lag})")
 
     def start(self,block=True):
         print(f"🚀 Engine Started: {self.symbol}")
@@ -774,13 +903,14 @@ class BotEngine:
                 self.executor.process_signal(signal, last_price)
             except AttributeError:
                 self.executor.execute_signal(signal, last_price)
+            self.executor.flush() # 模擬成交模型：期末平倉單沒有下一筆行情了，直接撮合完
                 
         # 計算這筆結算產生的實現損益
         pnl_after = getattr(self.executor, 'total_pnl', pnl_before)
         realized_pnl = pnl_after - pnl_before
 
-        # 4. 走正規管線：叫書記官 (Recorder) 寫 CSV
-        if self.recorder:
+        # 4. 走正規管線：叫書記官 (Recorder) 寫 CSV (成交驅動帳本已由平倉成交回報寫過)
+        if self.recorder and not getattr(self.executor, 'fill_driven', False):
             self.recorder.write_trade(
                 timestamp=last_time,
                 symbol=self.symbol,
@@ -0,0 +1,80 @@
+import numpy as np
+
+def _to_ns(ts) -> int:
+    """pd.Timestamp 直接拿 .value (快)，其他 datetime 走 numpy 轉換；None -> 0"""
+    if ts is None: return 0
+    value = getattr(ts, 'value', None)
+    return value if isinstance(value, int) else int(np.datetime64(ts, 'ns').astype(np.int64))
+
+class EquityCurve:
+    """
+    逐根 K 棒的權益曲線 (已實現 + 未實現，K 棒收盤價盯市)
+    1. 預先配置 numpy 陣列，append 一次 O(1) (不夠就加倍，攤銷後仍是 O(1))
+    2. 點數到 max_points 上限時兩兩抽一 (stride 加倍)，之後每 stride 根才記一點 -> 記憶體有上限，長回測也不會爆
+    3. 高點 / 最大回撤每一根都即時更新，不受抽樣影響 (抽樣只影響畫圖與 Sharpe 的解析度)
+    """
+    def __init__(self, max_points=20000, capacity=1024):
+        self.max_points = max(2, int(max_points))
+        cap = min(capacity, self.max_points)
+        self._ts = np.empty(cap, dtype=np.int64)      # 奈秒
+        self._eq = np.empty(cap, dtype=np.float64)
+        self.size = 0
+        self.stride = 1          # 目前每幾根記一點
+        self._skip = 0           # 距離上次記點過了幾根
+        self.bars = 0            # 總共盯市過幾根 (不含被抽掉的也算)
+        self.last_ts = None
+        self.last = 0.0
+        self.peak = 0.0          # 起點 0 也算高點 (與平倉曲線的算法一致)
+        self.max_drawdown = 0.0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, ts, equity):
+        equity = float(equity)
+        if equity > self.peak: self.peak = equity
+        dd = self.peak - equity
+        if dd > self.max_drawdown: self.max_drawdown = dd
+        self.last, self.last_ts = equity, ts
+        self.bars += 1
+
+        self._skip += 1
+        if self._skip < self.stride: return
+        self._skip = 0
+        if self.size == len(self._eq):
+            if self.size >= self.max_points:
+                self._decimate()
+            else:
+                self._grow()
+        self._ts[self.size] = _to_ns(ts)
+        self._eq[self.size] = equity
+        self.size += 1
+
+    def _grow(self):
+        cap = min(len(self._eq) * 2, self.max_points)
+        for name in ("_ts", "_eq"):
+            old = getattr(self, name)
+            new = np.empty(cap, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _decimate(self):
+        keep = self.size // 2
+        self._ts[:keep] = self._ts[1:self.size:2]
+        self._eq[:keep] = self._eq[1:self.size:2]
+        self.size = keep
+        self.stride *= 2
+
+    def arrays(self):
+        """(時間 int64 奈秒, 權益) 唯讀視圖 (不複製)；最後一根還沒被抽樣記到的話補在尾巴"""
+        ts, eq = self._ts[:self.size], self._eq[:self.size]
+        if self._skip and self.last_ts is not None:
+            ts = np.append(ts, _to_ns(self.last_ts))
+            eq = np.append(eq, self.last)
+        return ts, eq
+
+    def to_series(self):
+        """轉成 pandas Series (時間索引)，畫圖 / 存檔用"""
+        import pandas as pd
+        ts, eq = self.arrays()
+        return pd.Series(eq, index=pd.to_datetime(ts), name="equity")
@@ -53,6 +53,19 @@ class OrderDirection(Enum):
     BUY = "BUY"
     SELL = "SELL"
 
+class OrderStatus(Enum):
+    PENDING = "PENDING"                   # 已排入送單佇列，還沒送出
+    SUBMITTED = "SUBMITTED"               # place_order 已送出，等交易所回報
+    ACKED = "ACKED"                       # 交易所已確認委託
+    PARTIALLY_FILLED = "PARTIALLY_FILLED" # 部分成交
+    FILLED = "FILLED"                     # 完全成交
+    REJECTED = "REJECTED"                 # 送單失敗 / 交易所拒單
+    CANCELLED = "CANCELLED"               # 已刪單 (或前一腳失敗而取消)
+
+    @property
+    def is_done(self):
+        return self in (OrderStatus.FILLED, OrderStatus.REJECTED, OrderStatus.CANCELLED)
+
 # --- 訊號與交易事件 ---
 @dataclass
 class SignalEvent(Event):
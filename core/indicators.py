@@ -0,0 +1,230 @@
+import math
+from bisect import bisect_left
+import numpy as np
+
+NAN = float('nan')
+
+def bucket_start(ts, resample):
+    """1 分 K 時間 -> 所屬大顆粒 K 棒的起始時間 (與各策略原本的壓縮規則完全相同)"""
+    return ts.replace(minute=(ts.minute // resample) * resample, second=0, microsecond=0)
+
+class _Ema:
+    """EMA (等同 pandas ewm(span, adjust=False)：第一筆當起點，NaN 不更新但權重照樣衰減)"""
+    def __init__(self, frame, source, span):
+        self.values = []
+        self.src = getattr(frame, source) if source else None
+        self.alpha = 2.0 / (span + 1.0)
+        self.last = NAN
+        self.skipped = 0   # 連續 NaN 幾筆 (pandas ignore_na=False 的衰減規則)
+
+    def push(self, x):
+        if math.isnan(x):
+            if not math.isnan(self.last): self.skipped += 1
+        elif math.isnan(self.last):
+            self.last = x
+        else:
+            old_wt = (1.0 - self.alpha) ** (self.skipped + 1)
+            self.last = (old_wt * self.last + self.alpha * x) / (old_wt + self.alpha)
+            self.skipped = 0
+        self.values.append(self.last)
+
+    def update(self, i):
+        self.push(self.src[i])
+
+class _Sma:
+    """SMA (等同 pandas rolling(window).mean()，湊不滿 window 筆是 NaN)；用累加和，一根 O(1)"""
+    def __init__(self, frame, source, window):
+        self.values = []
+        self.src = getattr(frame, source)
+        self.window = window
+        self._cumsum = [0.0]
+
+    def update(self, i):
+        cs = self._cumsum
+        cs.append(cs[-1] + self.src[i])
+        n = len(cs) - 1
+        self.values.append((cs[n] - cs[n - self.window]) / self.window if n >= self.window else NAN)
+
+class _Adx:
+    """ADX (與策略原本的 pandas 算法逐步等價：TR / ±DM / DI 都用 EMA(span=period))"""
+    def __init__(self, frame, source, period):
+        self.values = []
+        self.frame = frame
+        self.atr = _Ema(frame, None, period)   # 內部序列，一律手動 push
+        self.plus = _Ema(frame, None, period)
+        self.minus = _Ema(frame, None, period)
+        self.adx = _Ema(frame, None, period)
+
+    def update(self, i):
+        f = self.frame
+        h, l = f.high[i], f.low[i]
+        if i > 0:
+            pc, ph, pl = f.close[i - 1], f.high[i - 1], f.low[i - 1]
+            tr = max(h - l, abs(h - pc), abs(l - pc))
+            up, down = h - ph, pl - l
+            plus_dm = up if (up > down and up > 0) else 0.0
+            minus_dm = down if (down > up and down > 0) else 0.0
+        else:
+            tr, plus_dm, minus_dm = h - l, 0.0, 0.0
+        self.atr.push(tr)
+        self.plus.push(plus_dm)
+        self.minus.push(minus_dm)
+        atr = self.atr.last
+        plus_di = 100 * self.plus.last / atr if atr else NAN
+        minus_di = 100 * self.minus.last / atr if atr else NAN
+        di_sum = plus_di + minus_di
+        dx = 100 * abs(plus_di - minus_di) / di_sum if di_sum else NAN
+        self.adx.push(dx)
+        self.values.append(self.adx.last)
+
+_KINDS = {"ema": _Ema, "sma": _Sma, "adx": _Adx}
+
+def ma_kind(ma_type) -> str:
+    """策略參數的均線類型 ("EMA"/"SMA") -> 登記處的指標種類 (不是 EMA 一律當 SMA，與原本的判斷相同)"""
+    return "ema" if str(ma_type).upper() == "EMA" else "sma"
+
+class IndicatorFrame:
+    """
+    一個時間級別 (resample 分鐘) 的共用大顆粒 K 棒 + 指標序列
+    1. update(bar): 吃 1 分 K；同一根 K 棒被好幾個策略餵進來，只有第一次會處理 (時間沒往前就跳過)
+    2. require(kind, source, param): 策略宣告要用的指標，同一組 (種類, 欄位, 參數) 全部訂閱者共用一條序列
+    3. 每收完一根大 K，每條序列只往後算一格 (O(1))，不再每根都重建 DataFrame 從頭算
+    4. count_at(ts) / value(key, n): 用 1 分 K 時間查「當下已收完幾根大 K」與第 n 根的指標值
+       序列保留完整歷史，所以最佳化器一組一組依序回測時，後面的組合直接查表，不用重算
+    """
+    def __init__(self, resample):
+        self.resample = resample
+        self.times = []     # 已收完的大 K 起始時間
+        self.high = []
+        self.low = []
+        self.close = []
+        self.volume = []
+        self.series = {}    # (kind, source, param) -> 指標物件
+        self.last_ts = None
+        self._cur = None    # 正在累積中的大 K [起始時間, high, low, close, volume]
+        self.frozen = False
+
+    def require(self, kind, source, param):
+        key = (kind, source, param)
+        if key not in self.series:
+            ind = _KINDS[kind](self, source, param)
+            # 晚加入的指標：把已收完的大 K 補算一遍
+            for i in range(len(self.close)):
+                ind.update(i)
+            self.series[key] = ind
+        return key
+
+    def update(self, bar):
+        ts = bar.timestamp
+        if self.last_ts is not None and ts <= self.last_ts:
+            return # 別的策略已經餵過這根了
+        if self.frozen:
+            raise RuntimeError(f"指標框架 ({self.resample}m) 已凍結，不能再接 {ts} 之後的新 K 棒")
+        self.last_ts = ts
+        start = bucket_start(ts, self.resample)
+        cur = self._cur
+        if cur is None or cur[0] != start:
+            if cur is not None:
+                self._close_bucket(cur)
+            self._cur = [start, bar.high, bar.low, bar.close, bar.volume]
+        else:
+            if bar.high > cur[1]: cur[1] = bar.high
+            if bar.low < cur[2]: cur[2] = bar.low
+            cur[3] = bar.close
+            cur[4] += bar.volume
+
+    def _close_bucket(self, cur):
+        self.times.append(cur[0])
+        self.high.append(cur[1])
+        self.low.append(cur[2])
+        self.close.append(cur[3])
+        self.volume.append(cur[4])
+        i = len(self.close) - 1
+        for ind in self.series.values():
+            ind.update(i)
+
+    def load(self, times, high, low, close, volume):
+        """
+        一次灌入整段 1 分 K (numpy 陣列，依時間排序)：向量化壓縮成大 K，再把已宣告的指標整段算完
+        結果與逐根 update() 完全相同 (重複時間戳只算第一根，最後一根大 K 一樣視為還沒收完)；只能灌進空的框架
+        """
+        if self.times or self._cur is not None:
+            raise RuntimeError("load() 只能用在還沒餵過資料的指標框架")
+        t = np.asarray(times, dtype="datetime64[ns]")
+        if len(t) == 0: return
+        keep = np.ones(len(t), dtype=bool)
+        keep[1:] = t[1:] > np.maximum.accumulate(t)[:-1]
+        t = t[keep]
+        h, l, c = (np.asarray(a, dtype=float)[keep] for a in (high, low, close))
+        v = np.asarray(volume)[keep]
+
+        # 大 K 起始時間 = 去掉秒數後，分鐘數往下取到 resample 的倍數 (與 bucket_start 相同)
+        minutes = t.astype("datetime64[m]")
+        starts = minutes - ((minutes.astype("<i8") % 60) % self.resample).astype("timedelta64[m]")
+        cuts = np.flatnonzero(starts[1:] != starts[:-1]) + 1
+        first = np.concatenate(([0], cuts))
+        last = np.append(cuts, len(t)) - 1
+        b_high = np.maximum.reduceat(h, first)
+        b_low = np.minimum.reduceat(l, first)
+        b_vol = np.add.reduceat(v, first)
+        b_close = c[last]
+        b_times = starts[first].astype("datetime64[us]").tolist()
+
+        closed = len(first) - 1
+        self.times.extend(b_times[:closed])
+        self.high.extend(b_high[:closed].tolist())
+        self.low.extend(b_low[:closed].tolist())
+        self.close.extend(b_close[:closed].tolist())
+        self.volume.extend(b_vol[:closed].tolist())
+        self._cur = [b_times[-1], float(b_high[-1]), float(b_low[-1]), float(b_close[-1]), b_vol[-1].item()]
+        self.last_ts = t[-1].astype("datetime64[us]").tolist()
+        for ind in self.series.values():
+            for i in range(closed):
+                ind.update(i)
+
+    def freeze(self):
+        """
+        轉成唯讀 numpy 陣列 (最佳化器預先算好後交給多個工人行程共用)
+        fork 出來的工人讀 numpy 陣列不會動到 Python 物件的參考計數，記憶體頁面可以一直共用不被複製
+        """
+        for name in ("high", "low", "close", "volume"):
+            setattr(self, name, np.asarray(getattr(self, name)))
+        for ind in self.series.values():
+            ind.values = np.asarray(ind.values, dtype=float)
+        self.frozen = True
+        return self
+
+    def count_at(self, ts) -> int:
+        """1 分 K 時間 ts 當下已經收完幾根大 K (即時行情永遠是最後一根，直接回傳長度)"""
+        start = bucket_start(ts, self.resample)
+        if self._cur is not None and start == self._cur[0]:
+            return len(self.times)
+        return bisect_left(self.times, start)
+
+    def value(self, key, n):
+        """第 n 根大 K 收完時的指標值 (n = count_at 的結果；n == 0 回傳 None)"""
+        if n <= 0: return None
+        return self.series[key].values[n - 1]
+
+    def bar(self, n) -> dict:
+        """第 n 根大 K 本身 (給要看原始量價的策略用)"""
+        i = n - 1
+        return {'high': self.high[i], 'low': self.low[i], 'close': self.close[i], 'volume': self.volume[i]}
+
+class IndicatorRegistry:
+    """
+    指標登記處：同一條行情 (同一個商品) 的所有策略共用一份，依 resample 分成 IndicatorFrame
+    引擎替每個商品開一個 (真實策略 + 紙上策略共用)；最佳化器每個資料檔開一個 (同一個工人跑的組合共用)
+    """
+    def __init__(self):
+        self.frames = {}
+
+    def frame(self, resample) -> IndicatorFrame:
+        f = self.frames.get(resample)
+        if f is None:
+            f = self.frames[resample] = IndicatorFrame(resample)
+        return f
+
+    def stats(self) -> dict:
+        """每個時間級別已收幾根大 K、共用幾條指標序列"""
+        return {r: (len(f.times), len(f.series)) for r, f in self.frames.items()}
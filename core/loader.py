@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from core.tick_store import ts_to_datetimes
 
 def load_history_data(file_path: str, tail_count: int = 15000) -> list:
     """
@@ -67,4 +68,15 @@ def load_history_data(file_path: str, tail_count: int = 15000) -> list:
 
     except Exception as e:
         print(f"❌ [Loader] 讀取失敗: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+def records_to_bars(records) -> list:
+    """
+    BAR_DTYPE 紀錄 (core/bar_store.py) -> 與 load_history_data 相同格式的 list of dict
+    時間一次批次轉換、數值欄一次 tolist()，不逐筆 pd.to_datetime
+    """
+    if len(records) == 0: return []
+    cols = [records[c].tolist() for c in ("open", "high", "low", "close", "volume")]
+    return [{'datetime': t, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+            for t, o, h, l, c, v in zip(ts_to_datetimes(records["ts"]), *cols)]
@@ -0,0 +1,123 @@
+from core.base_strategy import BaseStrategy
+
+class PaperBook:
+    """一個紙上策略：策略 + 自己的影子帳本 (預設 MockExecutor)，只吃行情，不碰券商"""
+    def __init__(self, symbol, strategy, executor):
+        self.symbol = symbol
+        self.strategy = strategy
+        self.executor = executor
+        self.name = getattr(strategy, 'name', type(strategy).__name__)
+        self.signals = 0
+        # 策略有覆寫 on_tick 才逐筆呼叫 (與 SymbolSlot 相同規則)
+        self.tick_hook = type(strategy).on_tick is not BaseStrategy.on_tick
+        # 成交驅動帳本 (掛了成交模型) 的部位變化一樣回寫給策略
+        executor.position_listener = lambda: strategy.set_position(executor.expected_position)
+
+class Portfolio:
+    """
+    紙上策略組合 (多策略共用同一條行情)
+    引擎的每個商品 (SymbolSlot) 已經有一個真實策略；這裡再掛 N 個紙上策略，吃同一個合成器吐出的 K 棒 / 同一筆 Tick，
+    各自一本影子帳本互不干擾。整個組合只需要一個行程、一次登入、一條報價連線、一次 CSV 解析。
+    exposure() 把真實 + 紙上部位依商品加總，看整體曝險。
+    """
+    def __init__(self, router):
+        self.router = router
+        self.books = {}   # symbol -> [PaperBook]
+
+    def add(self, symbol, strategy, executor=None) -> PaperBook:
+        if executor is None:
+            from modules.mock_executor import MockExecutor
+            executor = MockExecutor()
+        # 紙上策略的記憶卡檔名會跟同類別的真實策略撞名，一律不寫
+        strategy.save_state = lambda: None
+        slot = self.router.get(symbol)
+        if slot is not None:
+            strategy.bind_indicators(slot.indicators) # 跟同商品的真實策略共用指標
+        book = PaperBook(symbol, strategy, executor)
+        self.books.setdefault(symbol, []).append(book)
+        return book
+
+    def __len__(self):
+        return sum(len(b) for b in self.books.values())
+
+    def __iter__(self):
+        for books in list(self.books.values()):
+            yield from books
+
+    def load_history_bars(self, symbol, bars):
+        """暖機：同一份已解析好的歷史 K 棒直接餵給每個紙上策略 (CSV 只讀一次)"""
+        for book in self.books.get(symbol, ()):
+            book.strategy.load_history_bars(bars)
+
+    def on_tick(self, symbol, tick, bid=None, ask=None):
+        books = self.books.get(symbol)
+        if not books: return
+        price, volume, ts = tick.price, getattr(tick, 'volume', 0), getattr(tick, 'timestamp', None)
+        for book in books:
+            book.executor.on_market_data(price, volume, bid, ask, ts)
+            if book.tick_hook:
+                signal = book.strategy.on_tick(tick)
+                if signal: self._execute(book, signal, price)
+
+    def on_bar(self, symbol, bar, advance_market=False):
+        """K 棒收盤：每個紙上策略各自判斷、各自記帳 (advance_market=只有 K 棒沒有 Tick 時，用收盤價推進模擬撮合)"""
+        books = self.books.get(symbol)
+        if not books: return
+        for book in books:
+            if advance_market:
+                book.executor.on_market_data(bar.close, bar.volume, ts=bar.timestamp)
+            signal = book.strategy.on_bar(bar)
+            if signal: self._execute(book, signal, bar.close)
+            book.executor.mark_to_market(bar.close, bar.timestamp)
+
+    def _execute(self, book, signal, price):
+        book.signals += 1
+        book.executor.execute_signal(signal, price)
+        book.strategy.set_position(book.executor.expected_position)
+
+    def flush(self):
+        for book in self:
+            book.executor.flush()
+
+    def exposure(self) -> dict:
+        """
+        依商品加總曝險：{symbol: {"live": 真實部位, "paper": 紙上部位合計, "net": 合計, "books": 紙上策略數}}
+        部位一律用 expected_position (成交 + 在途)，跟策略看到的一致
+        """
+        result = {}
+        for slot in self.router:
+            result[slot.symbol] = {"live": slot.executor.expected_position, "paper": 0, "net": 0, "books": 0}
+        for symbol, books in self.books.items():
+            row = result.setdefault(symbol, {"live": 0, "paper": 0, "net": 0, "books": 0})
+            row["paper"] = sum(b.executor.expected_position for b in books)
+            row["books"] = len(books)
+        for row in result.values():
+            row["net"] = row["live"] + row["paper"]
+        return result
+
+    def summary(self) -> list:
+        """每個紙上策略一列 (名稱、商品、部位、損益、交易次數)，依損益排序"""
+        rows = [{
+            "name": b.name,
+            "symbol": b.symbol,
+            "position": b.executor.expected_position,
+            "pnl": b.executor.total_pnl,
+            "trades": len(b.executor.trades),
+            "signals": b.signals,
+        } for b in self]
+        rows.sort(key=lambda r: r["pnl"], reverse=True)
+        return rows
+
+    def report(self) -> str:
+        """給 Telegram /paper 用的文字報表"""
+        if not self.books:
+            return "📭 目前沒有掛任何紙上策略"
+        lines = ["🧪 **紙上策略組合**", "------------------"]
+        for i, r in enumerate(self.summary(), 1):
+            lines.append(f"{i}. {r['name']} [{r['symbol']}]\n"
+                         f"   部位 {r['position']:+d} | 損益 ${r['pnl']:,.0f} | {r['trades']} 筆")
+        lines.append("------------------")
+        lines.append("📐 **合計曝險 (真實 + 紙上)**")
+        for symbol, row in self.exposure().items():
+            lines.append(f"{symbol}: 真實 {row['live']:+d} / 紙上 {row['paper']:+d} ({row['books']} 組) = {row['net']:+d}")
+        return "\n".join(lines)
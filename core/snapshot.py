@@ -0,0 +1,43 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, Tuple
+
+@dataclass(frozen=True)
+class AccountSnapshot:
+    """
+    券商帳務快照 (唯讀)
+    由 AccountSnapshotService 在背景一次批次抓回「持倉 + 保證金」，
+    /status、/balance 與儀表板都讀這份，不再各自去打券商 API。
+    """
+    position: int = 0               # 淨部位 (多正空負)
+    avg_cost: float = 0.0           # 持倉平均成本
+    unrealized_pnl: float = 0.0     # 未實現損益
+    equity: float = 0.0             # 權益數
+    available_margin: float = 0.0   # 可用保證金
+    fetched_at: Optional[datetime] = None  # 抓取完成時間 (None = 還沒抓過)
+    fetch_ms: float = 0.0           # 這次抓取花了多久 (毫秒)
+    error: str = ""                 # 最近一次抓取失敗的原因 (成功則為空)
+
+    def age(self, now: Optional[datetime] = None) -> float:
+        """距離上次成功抓取幾秒 (沒抓過回傳 inf)"""
+        if self.fetched_at is None:
+            return float('inf')
+        return ((now or datetime.now()) - self.fetched_at).total_seconds()
+
+@dataclass(frozen=True)
+class EngineSnapshot:
+    """
+    引擎狀態快照 (唯讀)
+    由 Engine 在狀態改變時 (K 棒收盤、成交、指令) 發布一份，
+    儀表板只讀這份快照畫面，不再自己去翻策略與執行官的內臟。
+    """
+    version: int = 0
+    symbol: str = ""
+    strategy_name: str = ""
+    position: int = 0
+    auto_trading: bool = True
+    metrics: Tuple[Tuple[str, str], ...] = ()   # 策略 get_ui_dict() 的結果 (已轉成字串)
+    total_pnl: float = 0.0
+    trade_count: int = 0
+    account: Optional[AccountSnapshot] = None  # 券商帳務快照 (沒掛 AccountSnapshotService 時為 None)
+    updated_at: datetime = field(default_factory=datetime.now)
@@ -0,0 +1,68 @@
+from core.aggregator import BarAggregator
+from core.base_strategy import BaseStrategy
+from core.indicators import IndicatorRegistry
+
+class SymbolSlot:
+    """一個交易商品的全套零件：K 線合成器 + 指標登記處 + 策略 + 這個合約的帳本 (執行器) + 對帳員"""
+    def __init__(self, symbol, strategy, executor, aggregator=None, reconciler=None):
+        self.symbol = symbol
+        self.strategy = strategy
+        self.executor = executor
+        self.aggregator = aggregator or BarAggregator(symbol)
+        self.reconciler = reconciler
+        # 📐 同一條行情的策略 (真實 + 紙上) 共用一份指標
+        self.indicators = IndicatorRegistry()
+        strategy.bind_indicators(self.indicators)
+        # 策略有覆寫 on_tick 才逐筆呼叫
+        self.tick_hook = type(strategy).on_tick is not BaseStrategy.on_tick
+
+class SymbolRouter:
+    """
+    商品路由器 (多商品 / 多合約)
+    Tick、K 棒、券商回報都依「商品代碼」查字典分派到對應的 SymbolSlot，一次 dict 查詢，不用逐一比對
+    symbol: 引擎內部用的代碼 (例如 TMF202603，也是 tick.symbol / bar.symbol)
+    broker code: 券商回報裡的合約代碼 (例如 TMFC6)，由 bind_broker_code 對應到 symbol
+    """
+    def __init__(self):
+        self.slots = {}          # symbol -> SymbolSlot (依加入順序，第一個是主商品)
+        self._broker_codes = {}  # 券商合約代碼 -> SymbolSlot
+
+    def add(self, slot: SymbolSlot) -> SymbolSlot:
+        self.slots[slot.symbol] = slot
+        return slot
+
+    def get(self, symbol):
+        return self.slots.get(symbol)
+
+    def bind_broker_code(self, code, slot: SymbolSlot):
+        self._broker_codes[code] = slot
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __iter__(self):
+        return iter(list(self.slots.values()))
+
+    def positions(self) -> dict:
+        """各合約的 (成交部位, 預期部位)"""
+        return {s.symbol: (s.executor.current_position, s.executor.expected_position) for s in self}
+
+    def route_order_event(self, stat, msg):
+        """
+        券商回報分派 (直接綁給 api.set_order_callback)
+        成交回報看 full_code、委託回報看 contract.full_code / contract.code；對不上的 (例如手動下的其他商品) 廣播給全部，
+        各帳本的 OrderManager 認不得自然會忽略，對帳員也會依合約代碼過濾
+        """
+        slot = None
+        if isinstance(msg, dict) and self._broker_codes:
+            contract = msg.get("contract") or {}
+            for code in (msg.get("full_code"), contract.get("full_code"), contract.get("code"), msg.get("code")):
+                if code and code in self._broker_codes:
+                    slot = self._broker_codes[code]
+                    break
+        targets = [slot] if slot else list(self)
+        for s in targets:
+            if hasattr(s.executor, 'on_order_event'):
+                s.executor.on_order_event(stat, msg)
+            if s.reconciler:
+                s.reconciler.on_order_event(stat, msg)
@@ -0,0 +1,192 @@
+import os
+from datetime import datetime, date, timedelta
+import numpy as np
+
+# ==========================================
+# 📦 Tick 二進位格式 (固定寬度，可直接 memmap)
+# ts     : int64   奈秒時間戳 (台灣本地時間當作 UTC 存，與 Shioaji kbars 的 ts 慣例一致)
+# price  : float64 成交價
+# volume : int32   成交口數
+# bid/ask: float64 當下最佳買/賣價 (沒有就存 0)
+# 一筆 36 bytes，一天幾十萬筆也只有十幾 MB
+# ==========================================
+TICK_DTYPE = np.dtype([
+    ("ts", "<i8"),
+    ("price", "<f8"),
+    ("volume", "<i4"),
+    ("bid", "<f8"),
+    ("ask", "<f8"),
+])
+
+_EPOCH = datetime(1970, 1, 1)
+
+def to_ns(dt) -> int:
+    """datetime -> 奈秒時間戳 (本地時間當作 UTC)"""
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
+def from_ns(ts) -> datetime:
+    """奈秒時間戳 -> datetime (微秒精度)"""
+    return _EPOCH + timedelta(microseconds=int(ts) // 1000)
+
+def ts_to_datetimes(ts_array) -> list:
+    """一整段奈秒時間戳一次轉成 datetime 清單 (C 層批次轉換，比一筆一筆轉快很多)"""
+    return np.asarray(ts_array, dtype="<i8").view("datetime64[ns]").astype("datetime64[us]").tolist()
+
+def from_dataframe(df) -> np.ndarray:
+    """
+    DataFrame (欄位 datetime, price/close, volume, 可選 bid/ask) -> TICK_DTYPE 陣列
+    用來把既有的 CSV / Shioaji ticks API 結果轉進 TickStore
+    """
+    out = np.zeros(len(df), dtype=TICK_DTYPE)
+    ts = df["datetime"] if "datetime" in df.columns else df["ts"]
+    out["ts"] = np.asarray(ts, dtype="datetime64[ns]").astype("<i8")
+    out["price"] = df["price"] if "price" in df.columns else df["close"]
+    if "volume" in df.columns: out["volume"] = df["volume"]
+    for col, names in (("bid", ("bid", "bid_price")), ("ask", ("ask", "ask_price"))):
+        for name in names:
+            if name in df.columns:
+                out[col] = df[name]
+                break
+    return out
+
+# 盤別：07:00 ~ 15:00 之間算日盤，其餘算夜盤 (夜盤跨午夜，會分在兩個日期檔裡)
+DAY_SESSION = "day"
+NIGHT_SESSION = "night"
+
+def session_codes(ts_array) -> np.ndarray:
+    """每筆紀錄的盤別 (1 = 日盤, 2 = 夜盤)，整段向量化計算"""
+    minutes = (np.asarray(ts_array, dtype="<i8") // 60_000_000_000) % 1440
+    return np.where((minutes >= 420) & (minutes < 900), 1, 2)
+
+_SESSION_NAMES = {1: DAY_SESSION, 2: NIGHT_SESSION}
+
+class TickStore:
+    """
+    Tick 資料庫 (一個商品一個資料夾，一天一個檔案)
+    檔案: {root}/{symbol}/{symbol}_{YYYYMMDD}.tick，內容就是連續的 TICK_DTYPE 紀錄，沒有檔頭
+    索引: 同名 .idx 文字檔，每換一次盤別 (日盤/夜盤) 記一行「起始筆數,第一筆ts,盤別」，只會往後接
+    讀取一律用 np.memmap，回放幾個月的 Tick 也不用整包讀進記憶體
+    """
+    EXT = ".tick"
+    INDEX_EXT = ".idx"
+
+    def __init__(self, root="data/ticks"):
+        self.root = root
+        self._last_session = {}  # path -> 檔案最後一筆的盤別 (避免每次都讀索引檔)
+
+    def path_for(self, symbol: str, day) -> str:
+        day_str = day.strftime("%Y%m%d") if isinstance(day, (date, datetime)) else str(day).replace("-", "")
+        return os.path.join(self.root, symbol, f"{symbol}_{day_str}{self.EXT}")
+
+    def days(self, symbol: str, start=None, end=None) -> list:
+        """列出有資料的日期字串 (YYYYMMDD，已排序)；start/end 可給 'YYYY-MM-DD' 或 date"""
+        folder = os.path.join(self.root, symbol)
+        if not os.path.isdir(folder): return []
+        lo = _day_key(start) if start else None
+        hi = _day_key(end) if end else None
+        prefix = f"{symbol}_"
+        result = []
+        for name in os.listdir(folder):
+            if not (name.startswith(prefix) and name.endswith(self.EXT)): continue
+            key = name[len(prefix):-len(self.EXT)]
+            if (lo and key < lo) or (hi and key > hi): continue
+            result.append(key)
+        return sorted(result)
+
+    def append(self, symbol: str, day, records: np.ndarray) -> str:
+        """把一批紀錄接到當天檔案尾端 (紀錄必須已是 TICK_DTYPE)，並順手更新盤別索引"""
+        if len(records) == 0: return self.path_for(symbol, day)
+        path = self.path_for(symbol, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size % TICK_DTYPE.itemsize:
+            # 上次寫到一半就當機：切掉不完整的尾巴，不然後面每一筆都會錯位
+            size -= size % TICK_DTYPE.itemsize
+            with open(path, "r+b") as f:
+                f.truncate(size)
+        with open(path, "ab") as f:
+            f.write(np.ascontiguousarray(records, dtype=TICK_DTYPE).tobytes())
+        self._append_index(path, size // TICK_DTYPE.itemsize, records)
+        return path
+
+    def _append_index(self, path, base, records):
+        codes = session_codes(records["ts"])
+        last = self._last_session.get(path)
+        if last is None:
+            entries = _read_index_file(path[:-len(self.EXT)] + self.INDEX_EXT)
+            last = {v: k for k, v in _SESSION_NAMES.items()}.get(entries[-1][2]) if entries else 0
+        starts = (np.flatnonzero(np.diff(codes)) + 1).tolist()
+        if codes[0] != last:
+            starts.insert(0, 0)
+        if starts:
+            with open(path[:-len(self.EXT)] + self.INDEX_EXT, "a") as f:
+                for i in starts:
+                    f.write(f"{base + i},{int(records['ts'][i])},{_SESSION_NAMES[int(codes[i])]}\n")
+        self._last_session[path] = int(codes[-1])
+
+    def sessions(self, symbol: str, day) -> list:
+        """當天檔案的盤別區段 [(盤別, 起始筆數, 結束筆數)]，拿去切 read() 的結果即可"""
+        path = self.path_for(symbol, day)
+        entries = _read_index_file(path[:-len(self.EXT)] + self.INDEX_EXT)
+        total = os.path.getsize(path) // TICK_DTYPE.itemsize if os.path.exists(path) else 0
+        result = []
+        for i, (offset, _, name) in enumerate(entries):
+            end = entries[i + 1][0] if i + 1 < len(entries) else total
+            result.append((name, offset, end))
+        return result
+
+    def read_session(self, symbol: str, day, session=DAY_SESSION) -> np.ndarray:
+        """只讀某一盤 (例如只回放日盤)；同一天同盤別有好幾段就接起來"""
+        data = self.read(symbol, day)
+        parts = [data[a:b] for name, a, b in self.sessions(symbol, day) if name == session]
+        if not parts: return np.zeros(0, dtype=TICK_DTYPE)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def write(self, symbol: str, records: np.ndarray) -> list:
+        """依日期拆檔寫入 (records 需已依時間排序)；回傳寫入的檔案"""
+        if len(records) == 0: return []
+        days = records["ts"] // 86_400_000_000_000
+        cuts = np.flatnonzero(np.diff(days)) + 1
+        paths = []
+        for chunk in np.split(records, cuts):
+            paths.append(self.append(symbol, from_ns(chunk["ts"][0]).date(), chunk))
+        return paths
+
+    def read(self, symbol: str, day) -> np.ndarray:
+        """唯讀 memmap 開啟某一天 (檔案不存在或是空檔回傳空陣列)"""
+        path = self.path_for(symbol, day)
+        return open_ticks(path)
+
+    def iter_chunks(self, symbol: str, start=None, end=None, chunk_size=65536):
+        """依時間順序一段一段吐出紀錄 (每段都是 memmap 的切片，不會複製)"""
+        for key in self.days(symbol, start, end):
+            data = self.read(symbol, key)
+            for i in range(0, len(data), chunk_size):
+                yield data[i:i + chunk_size]
+
+    def count(self, symbol: str, start=None, end=None) -> int:
+        """總筆數 (直接用檔案大小算，不用打開)"""
+        return sum(os.path.getsize(self.path_for(symbol, key)) // TICK_DTYPE.itemsize
+                   for key in self.days(symbol, start, end))
+
+def open_ticks(path: str) -> np.ndarray:
+    """唯讀 memmap 開啟 Tick 檔；寫到一半的尾巴 (不足一筆) 會被忽略"""
+    if not os.path.exists(path): return np.zeros(0, dtype=TICK_DTYPE)
+    n = os.path.getsize(path) // TICK_DTYPE.itemsize
+    if n == 0: return np.zeros(0, dtype=TICK_DTYPE)
+    return np.memmap(path, dtype=TICK_DTYPE, mode="r", shape=(n,))
+
+def _read_index_file(path) -> list:
+    if not os.path.exists(path): return []
+    entries = []
+    with open(path) as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) == 3:
+                entries.append((int(parts[0]), int(parts[1]), parts[2]))
+    return entries
+
+def _day_key(value) -> str:
+    if isinstance(value, (date, datetime)): return value.strftime("%Y%m%d")
+    return str(value).replace("-", "")[:8]
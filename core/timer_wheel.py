@@ -0,0 +1,125 @@
+import itertools
+import threading
+import time
+
+class TimerWheel:
+    """
+    時間輪 (Hashed Timing Wheel) - 單一排程器取代「一張單開一條 sleep 執行緒」
+    兩種用法:
+    1. 回測 (手動時鐘): 由資料時間戳呼叫 advance(now)，到期的任務在呼叫端執行緒上依到期時間順序執行 (可重現)
+    2. 即時 (背景時鐘): start() 開一條執行緒用 time.monotonic() 推進，schedule 也改以真實時間為基準
+    排程/取消都是 O(1)；resolution 是時間格的寬度 (秒)，到期時間會落在同一格的任務依 (到期時間, 排程順序) 執行
+    """
+    def __init__(self, resolution=0.01, slots=512, now=None):
+        self.resolution = resolution
+        self.slots = slots
+        self._wheel = [[] for _ in range(slots)]
+        self._seq = itertools.count()
+        self._count = 0
+        self._lock = threading.RLock()
+        self.now = time.monotonic() if now is None else now
+        self._cursor = self._tick_of(self.now)   # 已經處理到哪一格 (絕對格號)
+
+        self._thread = None
+        self._running = False
+        self._wake = threading.Event()
+
+    def __len__(self):
+        return self._count
+
+    def _tick_of(self, t):
+        return int(t // self.resolution)
+
+    # ==========================================
+    # ⏰ 排程
+    # ==========================================
+    def schedule(self, delay, fn, *args):
+        """delay 秒後執行 fn(*args)，回傳可用來 cancel 的 handle"""
+        with self._lock:
+            base = time.monotonic() if self._running else self.now
+            deadline = base + max(0.0, delay)
+            tick = max(self._tick_of(deadline), self._cursor)
+            entry = [deadline, next(self._seq), tick, fn, args, False]
+            self._wheel[tick % self.slots].append(entry)
+            self._count += 1
+        self._wake.set()
+        return entry
+
+    def cancel(self, handle):
+        with self._lock:
+            if not handle[5]:
+                handle[5] = True
+                handle[3] = None # 放掉參照，實際移除等輪到那一格時順便做
+
+    # ==========================================
+    # ▶️ 推進
+    # ==========================================
+    def advance(self, now):
+        """把時鐘推進到 now，依到期順序執行所有到期任務，回傳執行了幾個"""
+        fired = 0
+        while True:
+            with self._lock:
+                if now < self.now:
+                    return fired
+                target = self._tick_of(now)
+                # 一口氣跳很遠 (例如回測換日)：每格掃一次就好，不用一格一格走
+                span = range(self.slots) if target - self._cursor >= self.slots else range(self._cursor, target + 1)
+                due = []
+                for t in span:
+                    idx = t % self.slots
+                    bucket = self._wheel[idx]
+                    if not bucket: continue
+                    keep = []
+                    for e in bucket:
+                        if e[5]:
+                            self._count -= 1 # 已取消，順手清掉
+                        elif e[2] <= target and e[0] <= now:
+                            due.append(e)
+                        else:
+                            keep.append(e)
+                    self._wheel[idx] = keep
+                self._cursor = target
+                if not due:
+                    self.now = now
+                    return fired
+                due.sort(key=lambda e: (e[0], e[1]))
+                for e in due:
+                    e[5] = True
+                self._count -= len(due)
+
+            for e in due:
+                # 執行前先把時鐘撥到該任務的到期時間，任務裡再排的新任務才會算對
+                with self._lock:
+                    self.now = max(self.now, e[0])
+                try:
+                    e[3](*e[4])
+                except Exception as ex:
+                    print(f"⚠️ [TimerWheel] 排程任務失敗: {ex}")
+                fired += 1
+            # 任務執行中可能又排了已到期的新任務，再掃一輪
+
+    # ==========================================
+    # 🧵 即時模式
+    # ==========================================
+    def start(self):
+        if self._running: return self
+        self._running = True
+        with self._lock:
+            self.now = time.monotonic()
+            self._cursor = self._tick_of(self.now)
+        self._thread = threading.Thread(target=self._run, name="TimerWheel", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(1.0)
+
+    def _run(self):
+        while self._running:
+            self.advance(time.monotonic())
+            # 有任務就每格醒一次，沒任務就睡到有人排程
+            self._wake.clear()
+            self._wake.wait(self.resolution if self._count else None)
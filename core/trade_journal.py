@@ -0,0 +1,136 @@
+import numpy as np
+from core.tick_store import to_ns, from_ns
+from core.analytics import NAT_NS
+
+# ==========================================
+# 📒 交易帳本欄位 (每一欄一條連續的 numpy 陣列，不是一筆一個 dict)
+# pnl         : float64 這趟交易淨損益 (已扣手續費，與原本 dict 的 'pnl' 相同)
+# direction   : int8    +1 = 多單, -1 = 空單, 0 = 不明
+# qty         : int32   平倉口數
+# entry_price : float64 進場均價
+# exit_price  : float64 出場均價
+# fee         : float64 這筆損益裡扣掉的手續費
+# slippage    : float64 滑價點數 (成交價比訊號價差了幾點，正數 = 吃虧)
+# entry_ns    : int64   進場時間 (奈秒，NAT_NS = 沒有)
+# exit_ns     : int64   出場時間
+# reason      : int16   出場原因代碼 (對照 TradeJournal.reasons，同一句原因只存一次)
+# 一筆 55 bytes；一萬筆不到 1 MB (list of dict 大約要 5 MB 以上)
+# ==========================================
+TRADE_COLUMNS = [
+    ("pnl", "<f8"),
+    ("direction", "i1"),
+    ("qty", "<i4"),
+    ("entry_price", "<f8"),
+    ("exit_price", "<f8"),
+    ("fee", "<f8"),
+    ("slippage", "<f8"),
+    ("entry_ns", "<i8"),
+    ("exit_ns", "<i8"),
+    ("reason", "<i2"),
+]
+_DIRECTIONS = {"LONG": 1, "SHORT": -1}
+_DIRECTION_NAMES = {1: "LONG", -1: "SHORT", 0: "UNKNOWN"}
+
+class TradeJournal:
+    """
+    欄位式交易帳本 (取代 BaseExecutor.trades 的 list of dict)
+    1. append() 寫進預先配置好的 numpy 欄位，滿了容量加倍 (攤銷 O(1))
+    2. arrays() / column() 回傳唯讀視圖 (不複製)，直接餵給 core/analytics 向量化計算
+    3. to_frame() / to_parquet() 匯出給 pandas / 外部分析
+    4. 舊介面照樣能用：len()、if journal:、journal[i] / for t in journal 會拿到跟以前一樣的 dict
+    """
+    def __init__(self, capacity=256):
+        self._cols = {name: np.empty(capacity, dtype=dt) for name, dt in TRADE_COLUMNS}
+        self.size = 0
+        self.reasons = []      # 代碼 -> 原因文字
+        self._reason_ids = {}  # 原因文字 -> 代碼
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
+
+    def append(self, pnl, direction="UNKNOWN", entry_time=None, exit_time=None, qty=0,
+               entry_price=0.0, exit_price=0.0, fee=0.0, slippage=0.0, reason=""):
+        if self.size == len(self._cols["pnl"]):
+            self._grow()
+        i = self.size
+        c = self._cols
+        c["pnl"][i] = pnl
+        c["direction"][i] = _DIRECTIONS.get(str(direction), 0)
+        c["qty"][i] = qty
+        c["entry_price"][i] = entry_price
+        c["exit_price"][i] = exit_price
+        c["fee"][i] = fee
+        c["slippage"][i] = slippage
+        c["entry_ns"][i] = to_ns(entry_time) if entry_time is not None else NAT_NS
+        c["exit_ns"][i] = to_ns(exit_time) if exit_time is not None else NAT_NS
+        c["reason"][i] = self._reason_code(reason)
+        self.size = i + 1
+
+    def _reason_code(self, reason) -> int:
+        reason = str(reason or "")
+        code = self._reason_ids.get(reason)
+        if code is None:
+            code = self._reason_ids[reason] = len(self.reasons)
+            self.reasons.append(reason)
+        return code
+
+    def _grow(self):
+        cap = max(1, len(self._cols["pnl"])) * 2
+        for name, arr in self._cols.items():
+            new = np.empty(cap, dtype=arr.dtype)
+            new[:self.size] = arr[:self.size]
+            self._cols[name] = new
+
+    def column(self, name) -> np.ndarray:
+        """單一欄位的唯讀視圖 (不複製)"""
+        view = self._cols[name][:self.size]
+        view.flags.writeable = False
+        return view
+
+    def arrays(self):
+        """(pnl, direction, entry_ns, exit_ns)：core/analytics.compute_metrics 直接吃的格式"""
+        return tuple(self.column(n) for n in ("pnl", "direction", "entry_ns", "exit_ns"))
+
+    # --- 舊介面相容 (逐筆 dict) ---
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.size))]
+        if i < 0: i += self.size
+        if not 0 <= i < self.size: raise IndexError("trade index out of range")
+        c = self._cols
+        entry_ns, exit_ns = int(c["entry_ns"][i]), int(c["exit_ns"][i])
+        return {
+            'pnl': float(c["pnl"][i]),
+            'direction': _DIRECTION_NAMES.get(int(c["direction"][i]), "UNKNOWN"),
+            'entry_time': from_ns(entry_ns) if entry_ns != NAT_NS else None,
+            'exit_time': from_ns(exit_ns) if exit_ns != NAT_NS else None,
+            'qty': int(c["qty"][i]),
+            'entry_price': float(c["entry_price"][i]),
+            'exit_price': float(c["exit_price"][i]),
+            'fee': float(c["fee"][i]),
+            'slippage': float(c["slippage"][i]),
+            'reason': self.reasons[c["reason"][i]],
+        }
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+    # --- 匯出 ---
+    def to_frame(self):
+        """轉成 pandas DataFrame (數值欄直接包 numpy 視圖；時間欄轉 datetime64、原因轉 category)"""
+        import pandas as pd
+        data = {name: self.column(name) for name, _ in TRADE_COLUMNS if name not in ("entry_ns", "exit_ns", "reason")}
+        data["direction"] = pd.Categorical.from_codes(self.column("direction") + 1, ["SHORT", "UNKNOWN", "LONG"])
+        data["entry_time"] = self.column("entry_ns").view("datetime64[ns]")
+        data["exit_time"] = self.column("exit_ns").view("datetime64[ns]")
+        data["reason"] = pd.Categorical.from_codes(self.column("reason"), self.reasons or [""])
+        return pd.DataFrame(data, copy=False)
+
+    def to_parquet(self, path):
+        """存成 Parquet (需要 pyarrow 或 fastparquet)"""
+        self.to_frame().to_parquet(path, index=False)
+        return path
@@ -108,8 +108,21 @@ def main():
     print(f"💰 最終損益: ${executor.total_pnl:,.0f}")
     print(f"🔢 交易次數: {len(executor.trades)}")
     print(f"🏆 勝率: {(executor.win_count / len(executor.trades) * 100) if executor.trades else 0:.1f}%")
+    print(f"📉 盯市最大回撤 (含未實現): ${executor.equity_curve.max_drawdown:,.0f}")
     print(f"📂 詳細 Log 已儲存至: {log_file_path}")
     print("="*40)
+
+    # 📈 權益曲線存檔 (Visualizer 會畫在價格圖下方)
+    if len(executor.equity_curve):
+        equity_path = os.path.join(BACKTEST_DIR, "equity_curve.csv")
+        executor.equity_curve.to_series().to_csv(equity_path, index_label="datetime")
+        print(f"📈 權益曲線已儲存至: {equity_path}")
+
+    # 📒 逐筆交易明細 (進出場價、口數、手續費、滑價、出場原因)
+    if executor.trades:
+        trades_path = os.path.join(BACKTEST_DIR, "trades.csv")
+        executor.trades.to_frame().to_csv(trades_path, index=False)
+        print(f"📒 交易明細已儲存至: {trades_path}")
     
     print("\n💡 提示: 現在你可以執行 Visualizer 了:")
     print(f"   python tools/visualizer.py {log_file_path}")
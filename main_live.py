@@ -10,8 +10,19 @@ from strategies.ma_strategy import MAStrategy
 from strategies.smart_hold_strategy import SmartHoldStrategy
 from tools.universal_downloader import UniversalDownloader
 from modules.ui_dashboard import DashboardUI
+from modules.position_reconciler import PositionReconciler
+from modules.account_snapshot import AccountSnapshotService
 
 
+def build_strategy():
+    """
+    實戰策略工廠：主合約與 EXTRA_CONTRACTS 的每個分帳都從這裡建，
+    調好的參數只寫這一個地方，分帳不會悄悄跑成類別預設值
+    """
+    from strategies.ma_adx_strategy import MaAdxStrategy
+    return MaAdxStrategy()
+    # return SmartHoldStrategy()
+
 def main():
     # my_strategy = MAStrategy(
     #     fast_window=30, 
@@ -28,9 +39,7 @@ def main():
     sys.stdout = global_interceptor
     sys.stderr = global_interceptor
 
-    from strategies.ma_adx_strategy import MaAdxStrategy
-    my_strategy = MaAdxStrategy()
-    # my_strategy = SmartHoldStrategy()
+    my_strategy = build_strategy()
     # print(f"🧠 [策略] 載入模組: {my_strategy.name}")
 
     # print(f"🚀 TaiEx Bot V3 [Live Mode] 啟動中...")
@@ -75,6 +84,10 @@ def main():
     # 3. 初始化 行情餵食 (ShioajiFeeder)
     # -----------------------------------------------------
     feeder = ShioajiFeeder(api)
+    if Settings.TICK_RECORD:
+        # 📼 背景錄下每筆 Tick (回呼執行緒只排隊，寫檔在背景)，之後可用 TickReplayFeeder 逐筆回測
+        from modules.tick_recorder import TickRecorder
+        feeder.tick_recorder = TickRecorder(Settings.TARGET_CONTRACT, root=Settings.TICK_DIR).start()
 
     # -----------------------------------------------------
     # 4. 啟動 機器人引擎 (Engine)
@@ -86,52 +99,40 @@ def main():
     # =====================================================
     # 🛡️ 實戰核心防護：綁定「券商成交回報」監聽器 (自動對帳)
     # =====================================================
-    def on_order_event(update_info, update_events):
-        """
-        處理 Shioaji 的訂單狀態回報 (包含 Deal 成交、Cancel 刪單等)
-        """
-        try:
-            # 取得回報的狀態字串
-            status = getattr(update_info, 'status', str(update_info))
-            status_str = str(status)
-            
-            # 偵測到「完全成交 (Filled)」或「部分成交 (PartFilled)」或「Deal」
-            if "Filled" in status_str or "Deal" in status_str:
-                print(f"\n⚡️ [API 回報] 偵測到真實成交事件！啟動背景同步對帳機制...")
-                
-                # 開啟一個背景小工人，絕對不卡住 API 回報接收的 Thread
-                def _delayed_sync():
-                    # 稍微等 1.5 秒，確保券商後端的部位表已經結算更新完畢
-                    time.sleep(1.5)
-                    
-                    try:
-                        # 1. 從券商抓取最新的真實倉位
-                        real_pos = executor.get_position()
-                        
-                        # 2. 強制更新策略與 Executor 的「影子帳本」
-                        old_pos = bot.strategy.position
-                        bot.strategy.set_position(real_pos)
-                        executor.current_position = real_pos
-                        
-                        # 3. 發送 Telegram 報告 (如果 Commander 已經就緒)
-                        msg = f"🔄 **真實成交回報同步**\n舊倉位: {old_pos}\n新倉位: {real_pos} (已對齊券商)"
-                        if hasattr(bot, 'commander') and bot.commander:
-                            bot.commander.send_message(msg)
-                        print(f"✅ {msg.replace('**', '')}")
-                        
-                    except Exception as e:
-                        print(f"❌ [同步回報失敗] {e}")
-
-                # 啟動背景同步執行緒
-                threading.Thread(target=_delayed_sync, daemon=True).start()
-                
-        except Exception as e:
-            print(f"⚠️ 處理 API 回報發生錯誤: {e}")
-
-    # 正式將監聽器綁定給 Shioaji API
-    api.set_order_callback(on_order_event)
+    # 成交回報直接推算部位，只有對不上時才去券商查 (不再每筆成交都睡 1.5 秒再查)
+    # 券商帳務改由背景批次刷新 (持倉 + 保證金一起抓)，/status、/balance、儀表板都讀快取
+    account_service = AccountSnapshotService(executor, interval=30.0, on_update=bot.publish_snapshot)
+    bot.account_service = account_service
+
+    # 多合約時對帳員只認自己合約的成交 (例如 TMFC6)，轉倉期間近遠月才不會互相干擾
+    multi = bool(Settings.EXTRA_CONTRACTS)
+    reconciler = PositionReconciler(bot, executor, on_deal=account_service.request_refresh,
+                                    code_prefix=executor.contract_code() if multi else "TMF")
+    bot.reconciler = reconciler # /sync 與開機對帳後會自動重設基準
+    bot.primary.reconciler = reconciler
+    bot.router.bind_broker_code(executor.contract_code(), bot.primary)
+
+    # 🔀 其他合約 (EXTRA_CONTRACTS)：共用同一個 API 登入、行情連線與帳號，各自一本帳 + 一個策略
+    for target in Settings.EXTRA_CONTRACTS:
+        extra_executor = executor.for_contract(target)
+        extra_strategy = build_strategy() # 跟主合約同一套參數
+        extra_strategy.save_state = lambda: None # 記憶卡檔名依策略類別命名，分帳不覆寫主帳的
+        slot = bot.add_symbol(target, extra_strategy, extra_executor)
+        slot.reconciler = PositionReconciler(bot, extra_executor, on_deal=account_service.request_refresh,
+                                             code_prefix=extra_executor.contract_code(), notify=False,
+                                             strategy=extra_strategy)
+        bot.router.bind_broker_code(extra_executor.contract_code(), slot)
+
+    # 正式將監聽器綁定給 Shioaji API (回報分派：依合約代碼交給對應的帳本與對帳員)
+    api.set_order_callback(bot.router.route_order_event)
     # =====================================================
 
+    # 🧪 紙上策略 (選用)：跟實戰策略吃同一條行情，各自記影子帳，不會送單；Telegram 輸入 /paper 看比較表
+    # from strategies.asym_ma_adx_strategy import AsymMaAdxStrategy
+    # from strategies.universal_ma_strategy import UniversalMaStrategy
+    # bot.add_paper_strategy(AsymMaAdxStrategy())
+    # bot.add_paper_strategy(UniversalMaStrategy())
+
     # -----------------------------------------------------
     # 5. 數據預載 (Warm-up) - 雙軌機制的第一步
     # -----------------------------------------------------
@@ -163,6 +164,8 @@ def main():
     # sys.stderr = ui.interceptor
 
     print("\n🟢 [系統] 執行 API 前置連線與訂閱 (Main Thread)...")
+    account_service.refresh_now()
+    account_service.start()
     bot.start(block=False)
 
     print("\n🟢 [系統] 準備切換至戰術儀表板...")
@@ -41,36 +41,13 @@ def main():
     # =====================================================
     # 🛡️ 模擬核心防護：綁定「模擬券商」的成交回報 (與 Live 完全一致)
     # =====================================================
-    def on_order_event(update_info, update_events):
-        try:
-            status_str = str(getattr(update_info, 'status', ''))
-            
-            if "Filled" in status_str or "Deal" in status_str:
-                print(f"\n⚡️ [模擬回報] 偵測到模擬成交事件！啟動同步對帳機制...")
-                
-                # 🚀 啟動背景小工人，等帳本徹底結算完再對帳
-                def _delayed_sync():
-                    time.sleep(1.0) # 等待 1 秒確保 Executor 帳本更新完畢
-                    
-                    # 取得 Executor 目前算出來的真實部位
-                    real_pos = executor.current_position
-                    
-                    # 強制更新策略大腦的影子帳本
-                    bot.strategy.set_position(real_pos)
-                    print(f"✅ [系統] 對帳完成！當前部位同步為: {real_pos}")
-                    
-                    # 順便發個 Telegram 通知
-                    if hasattr(bot, 'commander') and bot.commander:
-                        bot.commander.send_message(f"🔄 **模擬對帳完成**\n新倉位: {real_pos}")
-
-                import threading
-                threading.Thread(target=_delayed_sync, daemon=True).start()
-
-        except Exception as e:
-            print(f"⚠️ 處理模擬回報發生錯誤: {e}")
+    # 模擬帳本本身就是「券商」，對不上時直接讀它
+    from modules.position_reconciler import PositionReconciler
+    reconciler = PositionReconciler(bot, executor, position_source=lambda: executor.current_position)
+    bot.reconciler = reconciler
 
     # 把這個接線生綁定給我們的 MockExecutor
-    executor.set_order_callback(on_order_event)
+    executor.set_order_callback(reconciler.on_order_event)
     # =====================================================
 
     # 3. 暖機 (其實 Sim 不需要，但呼叫也不會壞，保持一致性)
@@ -0,0 +1,81 @@
+import threading
+import time
+from dataclasses import replace
+from core.snapshot import AccountSnapshot
+
+class AccountSnapshotService:
+    """
+    券商帳務快取 (背景批次刷新)
+    1. 背景工人每 interval 秒呼叫一次 executor.fetch_account_snapshot() (持倉 + 保證金一起抓)
+    2. 成交後呼叫 request_refresh()，等 debounce 秒 (讓分批成交先到齊) 就立刻刷新一次
+    3. /status、/balance、儀表板一律呼叫 get() 讀記憶體，附帶抓取時間，永遠不會卡在券商 API 上
+    """
+    def __init__(self, executor, interval=30.0, debounce=0.5, on_update=None):
+        self.executor = executor
+        self.interval = interval
+        self.debounce = debounce
+        self.on_update = on_update  # 刷新完成後通知 (例如 bot.publish_snapshot)
+
+        self._snapshot = AccountSnapshot()
+        self._cond = threading.Condition()
+        self._refresh_at = 0.0      # 下一次要刷新的時間 (monotonic)
+        self._running = False
+        self._thread = None
+        self.fetch_count = 0
+
+    def start(self):
+        if self._running: return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="AccountSnapshot", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def get(self) -> AccountSnapshot:
+        """讀取最新快照 (參照讀取是原子操作，不需要鎖)"""
+        return self._snapshot
+
+    def request_refresh(self, *args):
+        """要求盡快刷新 (例如成交後)；短時間內多次要求只會刷新一次"""
+        with self._cond:
+            self._refresh_at = min(self._refresh_at, time.monotonic() + self.debounce)
+            self._cond.notify()
+
+    def refresh_now(self) -> AccountSnapshot:
+        """同步刷新一次 (開機時先抓一份，避免第一次查詢拿到空快照)"""
+        self._fetch()
+        return self._snapshot
+
+    def _run(self):
+        with self._cond:
+            self._refresh_at = time.monotonic()
+        while True:
+            with self._cond:
+                while self._running:
+                    wait = self._refresh_at - time.monotonic()
+                    if wait <= 0: break
+                    self._cond.wait(wait)
+                if not self._running: return
+                self._refresh_at = time.monotonic() + self.interval
+            self._fetch()
+
+    def _fetch(self):
+        self.fetch_count += 1
+        try:
+            snap = self.executor.fetch_account_snapshot()
+        except Exception as e:
+            # 抓取失敗：保留上一份數據，只標記錯誤 (讀者可從 age() 看出資料多舊)
+            snap = replace(self._snapshot, error=str(e))
+            print(f"⚠️ [AccountSnapshot] 帳務刷新失敗: {e}")
+        self._snapshot = snap
+        if self.on_update:
+            try:
+                self.on_update()
+            except Exception as e:
+                print(f"⚠️ [AccountSnapshot] 通知失敗: {e}")
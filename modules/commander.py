@@ -2,19 +2,25 @@ import requests
 import threading
 import time
 from config.settings import Settings
-import queue
+from collections import deque
 
 class TelegramCommander:
     """
-    雙向指揮官 V3.3 (Trader Edition)
+    雙向指揮官 V3.4 (Trader Edition)
     新增:
     1. 手動交易指令: /buy, /sell
     2. 同步指令: /sync (強制同步真實倉位)
+    3. 發送改為「單一郵差」: 常駐 HTTP Session (Keep-Alive) + 有上限的發送佇列，
+       遵守 Telegram 速率限制，連發的通知會自動合併成一則，並保證送達順序。
+       交易通知 (priority=True) 照順序排在同一條佇列裡，只是佇列塞爆時不會被丟掉。
     """
-    def __init__(self):
+    MAX_TEXT_LEN = 4096 # Telegram 單則訊息長度上限
+
+    def __init__(self, max_queue=200, min_send_interval=1.0, max_retries=3, api_base=None):
         self.token = Settings.TELEGRAM_TOKEN
         self.chat_id = Settings.TELEGRAM_CHAT_ID
-        self.base_url = f"https://api.telegram.org/bot{self.token}/"
+        api_base = (api_base or Settings.TELEGRAM_API_BASE).rstrip("/")
+        self.base_url = f"{api_base}/bot{self.token}/"
         
         self.enabled = bool(self.token and self.chat_id)
         self.last_update_id = 0
@@ -22,6 +28,22 @@ class TelegramCommander:
         
         # 🕒 記錄啟動時間 (這行是關鍵！)
         self.startup_time = int(time.time())
+
+        # 📮 郵差設定：一條先進先出佇列 + 一個工人 + 兩條常駐連線 (發送 / 長輪詢各一條，不互相卡住)
+        # 一般訊息最多排 max_queue 則 (滿了丟最舊的一般訊息)；成交 / 平倉等交易通知永遠不丟，順序不變
+        self.min_send_interval = min_send_interval # 同一個聊天室每秒最多 1 則
+        self.max_retries = max_retries
+        self.max_queue = max_queue
+        self._outbox = deque()  # [(訊息, 是否為交易通知)]
+        self._normal = 0        # 佇列裡的一般訊息數
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._dropped = 0 # 這一波塞車丟了幾則 (只在開始丟與送通後各印一行)
+        self._sender = None
+        self._sender_lock = threading.Lock()
+        self._last_sent = 0.0
+        self.session = requests.Session()
+        self.poll_session = requests.Session()
         
         # 回呼函數
         self.get_status_cb = None
@@ -33,19 +55,130 @@ class TelegramCommander:
         self.sync_position_cb = None
         self.flatten_cb = None  # <--- 新增這個
         self.setcost_cb = None
+        self.paper_cb = None    # 紙上策略組合報表
 
         if self.enabled:
-            print("📡 [Commander] 雙向通訊模組 V3.2 (防殭屍版) 已就緒")
+            print("📡 [Commander] 雙向通訊模組 V3.4 (單一郵差版) 已就緒")
 
-    # --- 發送功能 (不變) ---
-    def send_message(self, text: str):
+    # --- 發送功能 ---
+    def send_message(self, text: str, priority=False):
+        """
+        丟進發送佇列就返回，呼叫端 (引擎/報價執行緒) 永遠不會卡在網路上
+        priority=True: 成交 / 平倉 / 倉位修正等交易通知，佇列再滿也不會被丟掉 (不插隊，送達順序不變)
+        """
         if not self.enabled: return
-        try:
-            url = self.base_url + "sendMessage"
-            data = {"chat_id": self.chat_id, "text": text, "parse_mode": "Markdown"}
-            threading.Thread(target=requests.post, args=(url,), kwargs={'data': data}, daemon=True).start()
-        except Exception as e:
-            print(f"⚠️ [Commander] 發送失敗: {e}")
+        self._ensure_sender()
+        first_drop = False
+        with self._cond:
+            if not priority:
+                if self._normal >= self.max_queue:
+                    # 佇列塞爆 (網路斷線太久)：原地丟掉最舊的一則一般訊息，其他訊息的順序不動
+                    for i, (_, urgent) in enumerate(self._outbox):
+                        if not urgent:
+                            del self._outbox[i]
+                            break
+                    self._normal -= 1
+                    self._dropped += 1
+                    first_drop = self._dropped == 1
+                self._normal += 1
+            self._outbox.append((text, priority))
+            self._cond.notify()
+        if first_drop:
+            print("⚠️ [Commander] 發送佇列已滿，開始丟棄最舊的一般訊息 (交易通知不受影響)")
+
+    def stop(self, timeout=5.0):
+        """停止監聽，並讓郵差把佇列裡剩下的訊息送完 (最多等 timeout 秒)"""
+        self.is_running = False
+        sender = self._sender
+        if sender and sender.is_alive():
+            with self._cond:
+                self._stopping = True
+                self._cond.notify()
+            sender.join(timeout)
+
+    def _next(self, block=True):
+        """(郵差) 依序取下一則；block=False 時沒有就回傳 None；收工且送完回傳 None"""
+        with self._cond:
+            while block and not self._outbox and not self._stopping:
+                self._cond.wait()
+            if not self._outbox: return None
+            text, urgent = self._outbox.popleft()
+            if not urgent: self._normal -= 1
+            return text
+
+    def _ensure_sender(self):
+        if self._sender and self._sender.is_alive(): return
+        with self._sender_lock:
+            if self._sender and self._sender.is_alive(): return
+            self._sender = threading.Thread(target=self._sender_loop, name="TelegramSender", daemon=True)
+            self._sender.start()
+
+    def _sender_loop(self):
+        """唯一的郵差：依序取件、等速率限制、把排隊中的訊息合併後送出"""
+        carry = None
+        while True:
+            text = carry if carry is not None else self._next()
+            carry = None
+            if text is None: break
+
+            # ⏱️ 速率限制：離上一則太近就先等，等待期間進來的訊息會被一起合併
+            wait = self._last_sent + self.min_send_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            # 📦 合併：把目前排隊中的訊息一次帶走 (保持原本順序，不超過長度上限)
+            batch = [text]
+            size = len(text)
+            while True:
+                nxt = self._next(block=False)
+                if nxt is None: break
+                if size + 2 + len(nxt) > self.MAX_TEXT_LEN:
+                    carry = nxt # 放不下的留到下一趟
+                    break
+                batch.append(nxt)
+                size += 2 + len(nxt)
+
+            self._post("\n\n".join(batch))
+            self._last_sent = time.monotonic()
+
+            if self._dropped:
+                with self._cond:
+                    dropped, self._dropped = self._dropped, 0
+                print(f"⚠️ [Commander] 塞車期間共丟棄 {dropped} 則一般訊息")
+
+    def _post(self, text, parse_mode="Markdown"):
+        url = self.base_url + "sendMessage"
+        data = {"chat_id": self.chat_id, "text": text}
+        if parse_mode: data["parse_mode"] = parse_mode
+        for attempt in range(self.max_retries):
+            try:
+                resp = self.session.post(url, data=data, timeout=10)
+                if resp.status_code == 429:
+                    # Telegram 叫我們冷靜一下：照它給的秒數等
+                    try:
+                        retry_after = resp.json().get("parameters", {}).get("retry_after", 1)
+                    except ValueError:
+                        retry_after = 1
+                    time.sleep(retry_after)
+                    continue
+                if resp.status_code >= 500:
+                    time.sleep(1 + attempt)
+                    continue
+                if resp.status_code == 400 and parse_mode:
+                    # 合併的訊息裡有一則 Markdown 不成對 (_ * `)，整批會被退件 -> 改用純文字重送，不連累其他通知
+                    print(f"⚠️ [Commander] Markdown 解析失敗，改用純文字重送: {resp.text[:200]}")
+                    return self._post(text, parse_mode=None)
+                if resp.status_code != 200:
+                    print(f"⚠️ [Commander] 發送失敗: HTTP {resp.status_code} {resp.text[:200]}")
+                    return False
+                return True
+            except requests.RequestException as e:
+                if attempt == self.max_retries - 1:
+                    print(f"⚠️ [Commander] 發送失敗: {e}")
+                    return False
+                time.sleep(1 + attempt)
+        print("⚠️ [Commander] 發送失敗: 重試次數用盡")
+        return False
 
     def send_startup_report(self, symbol: str, strategy_info: str):
         self.send_message(
@@ -64,7 +197,7 @@ class TelegramCommander:
             f"🕒 時間: {signal.timestamp.strftime('%H:%M:%S')}"
         )
 
-    # --- 監聽功能 (不變) ---
+    # --- 監聽功能 ---
     def start_listening(self):
         if not self.enabled: return
         self.is_running = True
@@ -76,16 +209,17 @@ class TelegramCommander:
             try:
                 url = self.base_url + "getUpdates"
                 params = {"offset": self.last_update_id + 1, "timeout": 30}
-                resp = requests.get(url, params=params, timeout=35)
+                resp = self.poll_session.get(url, params=params, timeout=35)
                 if resp.status_code == 200:
                     data = resp.json()
                     if data["ok"]:
                         for result in data["result"]:
                             self.last_update_id = result["update_id"]
                             self._handle_message(result)
+                else:
+                    time.sleep(1)
             except Exception:
                 time.sleep(5)
-            time.sleep(1)
 
     def _handle_message(self, result):
         if "message" not in result or "text" not in result["message"]: return
@@ -195,6 +329,9 @@ class TelegramCommander:
             else:
                 self.send_message("❌ 請提供成本價 (例如 /setcost 35000)")
 
+        elif cmd == "/paper":
+            if self.paper_cb: self.send_message(self.paper_cb())
+
         elif cmd == "/help":
             self.send_message(
                 "🎮 **指令列表**\n"
@@ -206,6 +343,7 @@ class TelegramCommander:
                 "`/sync` - 同步真實倉位\n"
                 "`/status` - 系統狀態\n"
                 "`/balance` - 權益數查詢\n"
+                "`/paper` - 紙上策略組合\n"
                 "`/unlock` - 解除鎖定\n"
                 "`/setcost` - 更新成本價"
             )
@@ -213,7 +351,7 @@ class TelegramCommander:
             self.send_message(f"❓ 未知指令: {text}")
 
     # 記得更新 callback 設定介面
-    def set_callbacks(self, status_cb, balance_cb, toggle_cb, shutdown_cb, manual_trade_cb, sync_position_cb,flatten_cb, setcost_cb):
+    def set_callbacks(self, status_cb, balance_cb, toggle_cb, shutdown_cb, manual_trade_cb, sync_position_cb,flatten_cb, setcost_cb, paper_cb=None):
         self.get_status_cb = status_cb
         self.get_balance_cb = balance_cb
         self.toggle_trading_cb = toggle_cb
@@ -221,4 +359,5 @@ class TelegramCommander:
         self.manual_trade_cb = manual_trade_cb  # 🆕
         self.sync_position_cb = sync_position_cb # 🆕
         self.flatten_cb = flatten_cb
-        self.setcost_cb = setcost_cb
\ No newline at end of file
+        self.setcost_cb = setcost_cb
+        self.paper_cb = paper_cb
\ No newline at end of file
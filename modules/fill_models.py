@@ -0,0 +1,148 @@
+import math
+import random
+
+# ==========================================
+# ⏱️ 延遲模型 (委託送出 -> 到達交易所)
+# ==========================================
+class FixedLatency:
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+
+    def sample(self):
+        return self.seconds
+
+class UniformLatency:
+    def __init__(self, low=0.02, high=0.1, seed=None):
+        self.low, self.high = low, high
+        self._rng = random.Random(seed)
+
+    def sample(self):
+        return self._rng.uniform(self.low, self.high)
+
+class LogNormalLatency:
+    """長尾延遲：大部分很快，偶爾卡很久 (median 為中位數，sigma 越大尾巴越長)"""
+    def __init__(self, median=0.05, sigma=0.5, cap=2.0, seed=None):
+        self.mu = math.log(median)
+        self.sigma = sigma
+        self.cap = cap
+        self._rng = random.Random(seed)
+
+    def sample(self):
+        return min(self.cap, self._rng.lognormvariate(self.mu, self.sigma))
+
+# ==========================================
+# 📖 撮合用的報價與委託
+# ==========================================
+class Quote:
+    """最新報價 (最後成交價 / 買價 / 賣價)；沒有五檔資料時 bid/ask 以 last ± 半個價差推估"""
+    __slots__ = ("last", "bid", "ask", "ts")
+
+    def __init__(self, last=0.0, bid=0.0, ask=0.0, ts=0.0):
+        self.last, self.bid, self.ask, self.ts = last, bid, ask, ts
+
+class SimOrder:
+    """模擬撮合中的委託"""
+    __slots__ = ("order_id", "direction", "qty", "limit", "remaining", "queue_ahead", "filled_qty", "after")
+
+    def __init__(self, order_id, direction, qty, limit=None, after=None):
+        self.order_id = order_id
+        self.direction = direction  # "BUY" / "SELL"
+        self.qty = qty
+        self.limit = limit          # None = 市價單
+        self.remaining = qty
+        self.queue_ahead = 0.0      # 限價單前面還排了幾口
+        self.filled_qty = 0
+        self.after = after
+
+    @property
+    def is_buy(self):
+        return self.direction == "BUY"
+
+# ==========================================
+# 🎯 成交模型
+# ==========================================
+class FillModel:
+    """
+    成交模型介面
+    on_arrival(order, quote) : 委託 (經過 latency 後) 到達交易所時，回傳立即成交的 [(口數, 價格)]
+    on_trade(order, quote, volume) : 掛著的限價單遇到新成交量時，回傳這次成交的 [(口數, 價格)]
+    """
+    def __init__(self, latency=None):
+        self.latency = latency or FixedLatency(0.0)
+
+    def on_arrival(self, order, quote):
+        raise NotImplementedError
+
+    def on_trade(self, order, quote, volume):
+        return []
+
+class SlippageFillModel(FillModel):
+    """原本 MockExecutor 的行為：一律全部成交在 價格 ± 固定滑價"""
+    def __init__(self, slippage_points=1.0, latency=None):
+        super().__init__(latency)
+        self.slippage_points = slippage_points
+
+    def on_arrival(self, order, quote):
+        price = order.limit if order.limit else quote.last
+        price += self.slippage_points if order.is_buy else -self.slippage_points
+        return [(order.remaining, price)]
+
+class BidAskFillModel(FillModel):
+    """
+    買賣價差 + 排隊 + 分批成交
+    1. 市價單: 買在 ask、賣在 bid；top_size 設定時每檔只吃得到 top_size 口，其餘往下一檔 (每檔 tick_size 點) 成交
+    2. 可立即成交的限價單: 同市價單，但不會吃超過限價
+    3. 不能立即成交的限價單: 掛著排隊，前面先排 queue_ahead 口 (預設 = 當下一檔的量 top_size)
+       之後成交價「穿過」限價 -> 全部成交；成交價「剛好等於」限價 -> 成交量先消化前面的隊伍，剩下的才輪到我們 (可能分批)
+    bid/ask 沒有資料 (例如只有 1 分 K) 時，以 last ± default_spread/2 推估
+    """
+    def __init__(self, latency=None, default_spread=1.0, tick_size=1.0, top_size=None, queue_ahead=None):
+        super().__init__(latency)
+        self.default_spread = default_spread
+        self.tick_size = tick_size
+        self.top_size = top_size
+        self.queue_ahead = queue_ahead
+
+    def _touch(self, order, quote):
+        if order.is_buy:
+            return quote.ask if quote.ask > 0 else quote.last + self.default_spread / 2.0
+        return quote.bid if quote.bid > 0 else quote.last - self.default_spread / 2.0
+
+    def _sweep(self, order, touch, qty):
+        """從最佳價開始往下一檔一檔吃，直到吃完或碰到限價"""
+        fills = []
+        step = self.tick_size if order.is_buy else -self.tick_size
+        price = touch
+        while qty > 0:
+            if order.limit and ((order.is_buy and price > order.limit) or (not order.is_buy and price < order.limit)):
+                break
+            lot = qty if not self.top_size else min(qty, self.top_size)
+            fills.append((lot, price))
+            qty -= lot
+            price += step
+        return fills
+
+    def on_arrival(self, order, quote):
+        touch = self._touch(order, quote)
+        marketable = order.limit is None or (touch <= order.limit if order.is_buy else touch >= order.limit)
+        if marketable:
+            order.queue_ahead = 0.0 # 吃不完的剩餘口數掛在限價上，排在最前面
+            return self._sweep(order, touch, order.remaining)
+        # 掛單排隊
+        order.queue_ahead = float(self.queue_ahead if self.queue_ahead is not None else (self.top_size or 0))
+        return []
+
+    def on_trade(self, order, quote, volume):
+        if order.limit is None or order.remaining <= 0: return []
+        last = quote.last
+        through = last < order.limit if order.is_buy else last > order.limit
+        if through:
+            return [(order.remaining, order.limit)]
+        if last != order.limit or volume <= 0:
+            return []
+        # 剛好成交在限價：先消化排在前面的量
+        consumed = min(order.queue_ahead, volume)
+        order.queue_ahead -= consumed
+        left = int(volume - consumed)
+        if left <= 0: return []
+        return [(min(order.remaining, left), order.limit)]
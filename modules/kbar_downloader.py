@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import numpy as np
+from core.bar_store import BarStore, BAR_DTYPE, bars_from_kbars, to_ns_bound
+from core.tick_store import from_ns
+
+class RateLimiter:
+    """滑動視窗限流：任何 period 秒內最多 max_calls 次 (永豐歷史查詢有次數上限，超過會被擋)"""
+    def __init__(self, max_calls=50, period=5.0):
+        self.max_calls = max(1, int(max_calls))
+        self.period = period
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                wait = self.period - (now - self._calls[0])
+            time.sleep(max(wait, 0.001))
+
+def split_dates(start, end, chunk_days=30) -> list:
+    """[start, end] (含) 切成每段 chunk_days 天的 [(起, 迄), ...] 日期字串"""
+    day = datetime.strptime(str(start)[:10], "%Y-%m-%d")
+    last = datetime.strptime(str(end)[:10], "%Y-%m-%d")
+    chunks = []
+    while day <= last:
+        stop = min(day + timedelta(days=chunk_days - 1), last)
+        chunks.append((day.strftime("%Y-%m-%d"), stop.strftime("%Y-%m-%d")))
+        day = stop + timedelta(days=1)
+    return chunks
+
+class ChunkedKbarDownloader:
+    """
+    分段平行下載歷史 1 分 K (取代一次 api.kbars 抓好幾年、全部放在記憶體裡的做法)
+    1. 日期區間切成 chunk_days 天一段，max_workers 條執行緒同時抓，RateLimiter 控制查詢頻率；單段失敗自己重試
+    2. 每段抓完馬上存成檢查點 {root}/_chunks/{symbol}/{起}_{迄}.bar (BAR_DTYPE 原始紀錄，先寫暫存檔再換名)
+    3. 從最早那段開始，前面都到齊就依序 BarStore.append 進資料庫 (串流寫入，記憶體只留還在抓的那幾段)，
+       接完就刪檢查點；中間某段失敗時，後面的段先留在檢查點等下次
+    4. 續傳：重跑同一個區間時，資料庫最後一根之前的段不再抓，已有檢查點的段直接讀檔
+    """
+    def __init__(self, api, store: BarStore, max_workers=4, chunk_days=30,
+                 rate_limit=(50, 5.0), retries=3, backoff=1.0):
+        self.api = api
+        self.store = store
+        self.max_workers = max(1, int(max_workers))
+        self.chunk_days = max(1, int(chunk_days))
+        self.limiter = RateLimiter(*rate_limit)
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.stats = {"chunks": 0, "fetched": 0, "resumed": 0, "skipped": 0, "failed": 0, "retries": 0, "bars": 0}
+
+    def checkpoint_dir(self, symbol):
+        return os.path.join(self.store.root, "_chunks", symbol)
+
+    def checkpoint_path(self, symbol, chunk):
+        return os.path.join(self.checkpoint_dir(symbol), f"{chunk[0]}_{chunk[1]}.bar")
+
+    def plan(self, symbol, start, end) -> list:
+        """要處理的段落 (資料庫最後一根之後的才算；含最後一根的那段要重抓，夜盤可能還沒收完)"""
+        chunks = split_dates(start, end, self.chunk_days)
+        last = self.store.last_ts(symbol)
+        if last is None: return chunks
+        todo = [c for c in chunks if to_ns_bound(c[1], end=True) >= last]
+        self.stats["skipped"] += len(chunks) - len(todo)
+        return todo
+
+    def download(self, contract, symbol, start, end) -> dict:
+        chunks = self.plan(symbol, start, end)
+        self.stats["chunks"] += len(chunks)
+        if not chunks:
+            print(f"✅ [Kbars] {symbol} 資料庫已涵蓋 {start} ~ {end}，不用下載。")
+            return self.stats
+        os.makedirs(self.checkpoint_dir(symbol), exist_ok=True)
+        print(f"🔄 [Kbars] {symbol} {chunks[0][0]} ~ {chunks[-1][1]}：{len(chunks)} 段 x {self.chunk_days} 天，{self.max_workers} 條執行緒")
+
+        ready = [os.path.exists(self.checkpoint_path(symbol, c)) for c in chunks]
+        self.stats["resumed"] += sum(ready)
+        failed = set()
+        next_idx = self._commit(symbol, chunks, ready, 0)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="Kbars") as pool:
+            futures = {pool.submit(self._fetch_chunk, contract, symbol, c): i
+                       for i, c in enumerate(chunks) if not ready[i]}
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    n = fut.result()
+                    ready[i] = True
+                    self.stats["fetched"] += 1
+                    print(f"   📥 {chunks[i][0]} ~ {chunks[i][1]}: {n} 根 ({sum(ready)}/{len(chunks)})")
+                except Exception as e:
+                    failed.add(i)
+                    self.stats["failed"] += 1
+                    print(f"   ❌ {chunks[i][0]} ~ {chunks[i][1]} 下載失敗: {e}")
+                next_idx = self._commit(symbol, chunks, ready, next_idx)
+
+        elapsed = time.perf_counter() - t0
+        if failed:
+            pending = sum(ready[next_idx:])
+            print(f"⚠️ [Kbars] {len(failed)} 段失敗，{pending} 段已下載但排在失敗段之後，先留在檢查點 ({self.checkpoint_dir(symbol)})；重跑同一指令會從斷點續傳。")
+        else:
+            try: os.rmdir(self.checkpoint_dir(symbol))
+            except OSError: pass
+        last = self.store.last_ts(symbol)
+        print(f"✅ [Kbars] {symbol} 新增 {self.stats['bars']} 根，耗時 {elapsed:.1f}s，資料庫最後一根: {from_ns(last) if last is not None else 'N/A'}")
+        return self.stats
+
+    def _fetch_chunk(self, contract, symbol, chunk) -> int:
+        """(工作執行緒) 抓一段 -> 檢查點檔；失敗依 backoff 指數退避重試"""
+        for attempt in range(self.retries + 1):
+            try:
+                self.limiter.acquire()
+                records = bars_from_kbars(self.api.kbars(contract=contract, start=chunk[0], end=chunk[1]))
+                break
+            except Exception:
+                if attempt >= self.retries: raise
+                self.stats["retries"] += 1
+                time.sleep(self.backoff * (2 ** attempt))
+        path = self.checkpoint_path(symbol, chunk)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(np.ascontiguousarray(records, dtype=BAR_DTYPE).tobytes())
+        os.replace(tmp, path)
+        return len(records)
+
+    def _commit(self, symbol, chunks, ready, next_idx) -> int:
+        """(主執行緒) 從 next_idx 開始，連續到齊的段依序接進資料庫；回傳下一個還沒到的段"""
+        while next_idx < len(chunks) and ready[next_idx]:
+            path = self.checkpoint_path(symbol, chunks[next_idx])
+            self.stats["bars"] += self.store.append(symbol, np.fromfile(path, dtype=BAR_DTYPE))
+            os.remove(path)
+            next_idx += 1
+        return next_idx
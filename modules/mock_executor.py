@@ -1,43 +1,174 @@
+import itertools
+import threading
 from core.base_executor import BaseExecutor
-import time
+from core.timer_wheel import TimerWheel
+from modules.fill_models import Quote, SimOrder
 
 # 建立一個假的期交所回報物件 (模仿 Shioaji 的格式)
 class MockUpdateInfo:
     def __init__(self, status="Filled"):
         self.status = status
 
+# 所有 MockExecutor 共用一個即時時間輪送「延遲回報」，不再一張單開一條 sleep 執行緒
+_callback_wheel = None
+_callback_wheel_lock = threading.Lock()
+
+def _get_callback_wheel():
+    global _callback_wheel
+    with _callback_wheel_lock:
+        if _callback_wheel is None:
+            _callback_wheel = TimerWheel(resolution=0.01).start()
+        return _callback_wheel
+
 class MockExecutor(BaseExecutor):
     """
     模擬執行器 (搭載真實滑價模擬系統)
-    收到命令 -> 疊加滑價懲罰 -> 回傳 '成交'
+    1. 預設 (fill_model=None): 收到命令 -> 疊加滑價懲罰 -> 當下回傳 '成交' (原行為，回測結果不變)
+    2. 掛上 fill_model (modules/fill_models.py): 改走成交驅動帳本
+       送單 -> 經過 latency 才到交易所 -> 由成交模型決定成交價/口數 (買賣價差、分批成交、限價排隊)
+       -> on_fill 記帳 + 成交回報；時間由行情時間戳 (on_market_data) 推進，回測結果可重現
+       限價單掛超過 order_ttl 秒 (模擬時間) 還沒成交完就刪單，剩下的口數不再算在途
     """
-    def __init__(self, initial_capital=500000, slippage_points=1.0):
+    def __init__(self, initial_capital=500000, slippage_points=1.0, fill_model=None, order_type="MARKET",
+                 order_ttl=60.0):
         super().__init__(initial_capital)
         # 🚀 新增：預設每次成交滑價 1 點 (進出各滑 1 點，一趟就是 2 點成本)
-        self.slippage_points = slippage_points 
+        self.slippage_points = slippage_points
         self.order_callback = None  # 🚀 新增：用來存放回報機制的電話號碼
+        self.callback_delay = 0.5   # 假裝網路傳輸花了 0.5 秒
+
+        # 🎯 成交模型 (None = 原本的固定滑價即時成交)
+        self.fill_model = fill_model
+        self.order_type = order_type        # "MARKET" / "LIMIT" (限價 = 訊號價格)
+        self.order_ttl = order_ttl          # 限價單最多掛幾秒 (None = 掛到成交為止)
+        self.quote = Quote()
+        self.clock = TimerWheel(resolution=0.01, now=0.0) # 手動時鐘，由行情時間戳推進
+        self.resting = {}                   # order_id -> 掛在交易所上還沒成交完的 SimOrder
+        self._waiting = {}                  # parent order_id -> [等前一張成交才送的 SimOrder]
+        self._cancelled = set()             # 還在路上就被刪掉的 order_id (到達交易所時直接丟掉)
+        self._ids = itertools.count(1)
+        self._deal_seq = itertools.count(1)
+        if fill_model is not None:
+            self.fill_driven = True
 
     def set_order_callback(self, callback):
         """模擬 Shioaji 的 api.set_order_callback"""
         self.order_callback = callback
 
     def _execute_impl(self, direction, qty, price):
-        fill_price = price 
+        fill_price = price
         if direction.upper() == 'BUY': fill_price = price + self.slippage_points
         elif direction.upper() == 'SELL': fill_price = price - self.slippage_points
-            
+
         msg = f"⚡️ [Mock] {direction} {qty} @ {fill_price:.2f} (滑價:{self.slippage_points})"
         print(msg) # 🚀 確保終端機能印出這行，讓儀表板抓到！
-        
+
         # 🚀 模擬期交所的「非同步延遲回報」
         if self.order_callback:
-            def fire_callback():
-                time.sleep(0.5) # 假裝網路傳輸花了 0.5 秒
-                mock_info = MockUpdateInfo(status="Filled")
-                self.order_callback(mock_info, None)
-                
-            # 開啟背景執行緒去打電話，不卡住目前的帳本結算！
-            import threading
-            threading.Thread(target=fire_callback, daemon=True).start()
-            
-        return True, fill_price, msg
\ No newline at end of file
+            # 成交明細照 Shioaji 期貨成交回報的欄位給，對帳員才能直接推算部位
+            deal = {"code": "TMF", "action": "Buy" if direction.upper() == 'BUY' else "Sell",
+                    "price": fill_price, "quantity": qty}
+            # 排進共用時間輪，不卡住目前的帳本結算！
+            _get_callback_wheel().schedule(self.callback_delay, self.order_callback, MockUpdateInfo(status="Filled"), deal)
+
+        return True, fill_price, msg
+
+    # ==========================================
+    # 🎯 成交模型模式
+    # ==========================================
+    def _submit_impl(self, direction, qty, price, after=None):
+        order_id = f"sim{next(self._ids):06d}"
+        limit = float(price) if self.order_type == "LIMIT" else None
+        order = SimOrder(order_id, direction, int(qty), limit, after)
+        if after is not None and after in self.pending_orders:
+            # 反手開倉腳：等平倉腳完全成交才送
+            self._waiting.setdefault(after, []).append(order)
+        else:
+            self._send(order)
+        return True, order_id, f"⚡️ [Mock] 委託 {order_id} {direction} {qty} 已送出"
+
+    def _cancel_impl(self, order_id):
+        """刪單：掛著的直接拿掉，還在路上的到達時丟掉，等前一張成交的開倉腳不再送"""
+        self._waiting.pop(order_id, None)
+        if self.resting.pop(order_id, None) is not None: return
+        for children in self._waiting.values():
+            if any(c.order_id == order_id for c in children):
+                children[:] = [c for c in children if c.order_id != order_id]
+                return
+        self._cancelled.add(order_id)
+
+    def _send(self, order):
+        self.clock.schedule(self.fill_model.latency.sample(), self._arrive, order)
+
+    def _arrive(self, order):
+        """委託到達交易所：市價/可成交限價單立刻撮合，其餘掛著排隊"""
+        if order.order_id in self._cancelled:
+            self._cancelled.discard(order.order_id)
+            return
+        fills = self.fill_model.on_arrival(order, self.quote)
+        self._book(order, fills)
+        if order.remaining > 0:
+            if order.limit is None:
+                # 市價單吃不完的部分：交易所刪除剩餘口數 (FAK)
+                self._done(order)
+            else:
+                self.resting[order.order_id] = order
+                if self.order_ttl:
+                    self.clock.schedule(self.order_ttl, self._expire, order)
+
+    def _expire(self, order):
+        """限價單逾時：交易所刪掉剩下的口數"""
+        if order.order_id in self.resting:
+            print(f"⏰ [Mock] {order.order_id} 掛單逾時，刪除剩餘 {order.remaining} 口")
+            self._done(order)
+
+    def _book(self, order, fills):
+        for qty, price in fills:
+            qty = min(qty, order.remaining)
+            if qty <= 0: continue
+            order.remaining -= qty
+            order.filled_qty += qty
+            fill_time = self.quote.ts or None
+            self.on_fill(order.direction, qty, price, order_id=order.order_id, fill_time=fill_time)
+            print(f"⚡️ [Mock] {order.order_id} {order.direction} {qty} @ {price:.2f} ({order.filled_qty}/{order.qty})")
+            if self.order_callback:
+                deal = {"trade_id": order.order_id, "exchange_seq": next(self._deal_seq), "code": "TMF",
+                        "action": "Buy" if order.is_buy else "Sell", "price": price, "quantity": qty}
+                self.order_callback(MockUpdateInfo(status="Filled"), deal)
+        if order.remaining == 0:
+            self._done(order)
+
+    def _done(self, order):
+        self.resting.pop(order.order_id, None)
+        if order.remaining > 0:
+            self.on_order_done(order.order_id)
+        children = self._waiting.pop(order.order_id, [])
+        for child in children:
+            if order.remaining == 0:
+                self._send(child)
+            else:
+                self.on_order_done(child.order_id) # 前一張沒成交完，開倉腳一併取消
+
+    def on_market_data(self, price, volume=0, bid=None, ask=None, ts=None):
+        if self.fill_model is None: return
+        now = ts.timestamp() if hasattr(ts, 'timestamp') else ts
+        with self._ledger_lock:
+            # 1. 先推進時鐘：這段期間到達交易所的委託，看到的是「上一筆」報價
+            if now is not None:
+                self.clock.advance(now)
+            # 2. 更新報價
+            q = self.quote
+            q.last = float(price)
+            q.bid = float(bid) if bid else 0.0
+            q.ask = float(ask) if ask else 0.0
+            q.ts = ts
+            # 3. 新成交量撮合掛著的限價單
+            if self.resting:
+                for order in list(self.resting.values()):
+                    self._book(order, self.fill_model.on_trade(order, q, volume))
+
+    def flush(self):
+        """把在路上的委託全部送到交易所 (回測期末結算用，否則最後一張平倉單永遠等不到下一筆行情)"""
+        if self.fill_model is None: return
+        with self._ledger_lock:
+            self.clock.advance(self.clock.now + 3600)
@@ -2,6 +2,9 @@ import pandas as pd
 import time
 import threading
 from core.event import BarEvent, EventType
+from core.bar_store import is_store_source, open_source, bars_to_dataframe
+from core.data_quality import source_report, describe
+from config.settings import Settings
 
 class CsvHistoryFeeder:
     """
@@ -11,10 +14,10 @@ class CsvHistoryFeeder:
     1. BarEvent 實例化移除 'event_type' 參數 (由類別內部自動處理)。
     2. 維持 threading 背景執行。
     """
-    def __init__(self, file_path, speed=0.5):
+    def __init__(self, file_path, speed=0.5, df=None):
         self.file_path = file_path
         self.speed = speed
-        self.df = None
+        self.df = df  # 可直接給已經解析好的 DataFrame (最佳化器多組參數共用同一份，不用每組重讀 CSV)
         self.running = False
         self.target_code = "TMF_SIM"
         
@@ -22,6 +25,15 @@ class CsvHistoryFeeder:
         self.on_tick_callback = None 
 
     def connect(self):
+        if self.df is not None:
+            print(f"✅ [Sim] 使用預先載入的資料，共 {len(self.df)} 筆")
+            return
+        if is_store_source(self.file_path):
+            # 資料庫區間 (regime:/bars:)：只把這一段轉成 DataFrame，不用讀整份 CSV
+            self.df = bars_to_dataframe(open_source(self.file_path, Settings.BAR_DIR))
+            print(f"✅ [Sim] 資料庫區間 {self.file_path} 載入成功，共 {len(self.df)} 筆")
+            self._print_quality()
+            return
         print(f"🔌 [Sim] 正在讀取歷史資料: {self.file_path}...")
         try:
             self.df = pd.read_csv(self.file_path)
@@ -43,6 +55,7 @@ class CsvHistoryFeeder:
                 self.df.sort_values('datetime', inplace=True)
                 self.df.reset_index(drop=True, inplace=True)
                 print(f"✅ [Sim] 資料載入成功，共 {len(self.df)} 筆")
+                self._print_quality()
             else:
                 print(f"❌ [Sim] CSV 缺少時間欄位")
                 self.df = pd.DataFrame()
@@ -51,6 +64,11 @@ class CsvHistoryFeeder:
             print(f"❌ [Sim] 讀取 CSV 失敗: {e}")
             self.df = pd.DataFrame()
 
+    def _print_quality(self):
+        """印出資料更新時存好的健檢報告 (回測不再自己檢查一遍)"""
+        report, start, end = source_report(self.file_path, Settings.BAR_DIR)
+        print(f"🩺 [Sim] 資料健檢: {describe(report, start, end)}")
+
     def subscribe(self, symbol):
         self.target_code = symbol
         print(f"📡 [Sim] 模擬訂閱: {symbol}")
@@ -122,4 +140,168 @@ class CsvHistoryFeeder:
                 time.sleep(self.speed)
             
         print("\n🏁 [Sim] 回放結束")
-        self.running = False
\ No newline at end of file
+        self.running = False
+
+class BarStoreFeeder:
+    """
+    BarStoreFeeder (資料庫回放機)
+    直接回放 core/bar_store.py 的 memmap 區間 (資料來源字串 regime:/bars:，或直接給紀錄陣列)
+    不解析 CSV、不建 DataFrame；一次處理一整段，時間戳用 numpy 批次轉 datetime
+    最佳化器把同一個區間 (memmap 切片) 交給所有工人，fork 之後共用同一份檔案快取頁面
+    """
+    def __init__(self, source, speed=0, records=None, root=None, chunk_size=65536):
+        self.source = source
+        self.speed = speed
+        self.records = records
+        self.root = root or Settings.BAR_DIR
+        self.chunk_size = chunk_size
+        self.running = False
+        self.target_code = "TMF_SIM"
+
+        self.on_bar_callback = None
+        self.on_tick_callback = None
+
+    def connect(self):
+        opened = self.records is None # 自己開檔才印健檢 (最佳化器每組參數共用同一份資料，不用每組都印)
+        if opened:
+            try:
+                self.records = open_source(self.source, self.root)
+            except (KeyError, FileNotFoundError) as e:
+                print(f"❌ [BarStore] {e}")
+                self.records = None
+                return
+        n = len(self.records)
+        if n:
+            from core.tick_store import from_ns
+            print(f"✅ [BarStore] {self.source}: {n:,} 根 ({from_ns(self.records['ts'][0])} ~ {from_ns(self.records['ts'][-1])})")
+            if opened:
+                report, start, end = source_report(self.source, self.root)
+                print(f"🩺 [BarStore] 資料健檢: {describe(report, start, end)}")
+        else:
+            print(f"⚠️ [BarStore] {self.source}: 區間內沒有資料")
+
+    def subscribe(self, symbol):
+        self.target_code = symbol
+        print(f"📡 [BarStore] 模擬訂閱: {symbol}")
+
+    def set_on_tick(self, callback):
+        pass
+
+    def set_on_bar(self, callback):
+        self.on_bar_callback = callback
+
+    def start(self):
+        if self.records is None or len(self.records) == 0:
+            print("⚠️ [BarStore] 無資料可回放")
+            return
+        self.running = True
+        t = threading.Thread(target=self._run_loop, daemon=True)
+        t.start()
+
+    def stop(self):
+        self.running = False
+        print("🛑 [BarStore] 停止回放")
+
+    def _run_loop(self):
+        from core.tick_store import ts_to_datetimes
+        callback = self.on_bar_callback
+        symbol = self.target_code
+        records = self.records
+        for i in range(0, len(records), self.chunk_size):
+            if not self.running: break
+            chunk = records[i:i + self.chunk_size]
+            for ts, o, h, l, c, v in zip(ts_to_datetimes(chunk["ts"]), chunk["open"].tolist(), chunk["high"].tolist(),
+                                         chunk["low"].tolist(), chunk["close"].tolist(), chunk["volume"].tolist()):
+                if not self.running: break
+                if callback:
+                    callback(BarEvent(symbol=symbol, timestamp=ts, open=o, high=h, low=l, close=c, volume=v))
+                if self.speed > 0:
+                    time.sleep(self.speed)
+        print("\n🏁 [BarStore] 回放結束")
+        self.running = False
+
+class TickReplayFeeder:
+    """
+    TickReplayFeeder (逐筆回放機)
+    從 TickStore 的二進位 Tick 檔 (memmap) 讀出逐筆成交，走 set_on_tick -> Engine -> BarAggregator
+    與實戰 ShioajiFeeder 完全同一條管線：K 棒由真的合成器合成，策略的 on_tick 盤中停損也會逐筆觸發
+    效能重點:
+    1. 一次處理一整段 (chunk_size 筆)，時間戳用 numpy 批次轉 datetime
+    2. 只建立一個 TickEvent 反覆填值送出 (下游只讀取、不保存 Tick 物件)
+    """
+    def __init__(self, symbol="TMF", root="data/ticks", start=None, end=None, speed=0, chunk_size=65536):
+        from core.tick_store import TickStore
+        self.store = TickStore(root)
+        self.source_symbol = symbol     # Tick 檔的商品資料夾名稱
+        self.start_date = start
+        self.end_date = end
+        self.speed = speed              # 每筆之間睡幾秒 (0 = 全速)
+        self.chunk_size = chunk_size
+        self.running = False
+        self.target_code = symbol       # 送出去的 tick.symbol (subscribe 時改成引擎的 symbol)
+        self.total_ticks = 0
+        self.replayed = 0
+
+        self.on_bar_callback = None
+        self.on_tick_callback = None
+
+    def connect(self):
+        self.total_ticks = self.store.count(self.source_symbol, self.start_date, self.end_date)
+        days = self.store.days(self.source_symbol, self.start_date, self.end_date)
+        if days:
+            print(f"✅ [TickReplay] {self.source_symbol}: {len(days)} 天 ({days[0]} ~ {days[-1]})，共 {self.total_ticks:,} 筆")
+        else:
+            print(f"❌ [TickReplay] 找不到 Tick 資料: {self.store.root}/{self.source_symbol}")
+
+    def subscribe(self, symbol):
+        self.target_code = symbol
+        print(f"📡 [TickReplay] 模擬訂閱: {symbol}")
+
+    def set_on_tick(self, callback):
+        self.on_tick_callback = callback
+
+    def set_on_bar(self, callback):
+        pass # K 棒一律由引擎的合成器產生
+
+    def start(self):
+        if not self.total_ticks:
+            print("⚠️ [TickReplay] 無資料可回放")
+            return
+        self.running = True
+        t = threading.Thread(target=self._run_loop, daemon=True)
+        t.start()
+
+    def stop(self):
+        self.running = False
+        print("🛑 [TickReplay] 停止回放")
+
+    def _run_loop(self):
+        from core.event import TickEvent
+        from core.tick_store import ts_to_datetimes
+
+        callback = self.on_tick_callback
+        tick = TickEvent(symbol=self.target_code)
+        speed = self.speed
+        count = 0
+        t0 = time.perf_counter()
+
+        for chunk in self.store.iter_chunks(self.source_symbol, self.start_date, self.end_date, self.chunk_size):
+            if not self.running: break
+            for ts, price, vol, bid, ask in zip(ts_to_datetimes(chunk["ts"]), chunk["price"].tolist(),
+                                                chunk["volume"].tolist(), chunk["bid"].tolist(), chunk["ask"].tolist()):
+                tick.timestamp = ts
+                tick.price = price
+                tick.volume = vol
+                tick.bid_price = bid
+                tick.ask_price = ask
+                callback(tick)
+                if speed > 0:
+                    if not self.running: break
+                    time.sleep(speed)
+            count += len(chunk)
+            self.replayed = count
+
+        elapsed = time.perf_counter() - t0
+        rate = count / elapsed * 60 if elapsed > 0 else 0
+        print(f"\n🏁 [TickReplay] 回放結束: {count:,} 筆 / {elapsed:.1f}s ({rate/1e6:.2f}M 筆/分鐘)")
+        self.running = False
@@ -0,0 +1,602 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+from config.settings import Settings
+
+# 如果有裝 shioaji，就借用它的列舉與帳號類別，讓 RealExecutor 的型別判斷原封不動地通過
+try:
+    import shioaji as sj
+    from shioaji import account as sj_account
+    Action = sj.constant.Action
+    OrderState = sj.OrderState
+except ImportError:
+    sj_account = None
+
+    class Action(Enum):
+        Buy = "Buy"
+        Sell = "Sell"
+
+    class OrderState(Enum):
+        """模仿 sj.OrderState (str() 會是 'OrderState.FuturesDeal')"""
+        FuturesOrder = "FORDER"
+        FuturesDeal = "FDEAL"
+
+# 各商品規格 (每點價值)：跟實戰 RealExecutor 用同一份設定，假券商不會跟真實乘數對不上
+POINT_VALUES = Settings.POINT_VALUES
+
+def _is_buy(action):
+    return "Buy" in str(action)
+
+class MockContract:
+    """模仿 shioaji 的期貨合約物件"""
+    def __init__(self, code, category):
+        self.code = code
+        self.symbol = code
+        self.category = category
+        self.name = f"{category}(模擬)"
+        self.exchange = "TAIFEX"
+        self.delivery_month = ""
+        self.reference = 0.0
+
+    def __repr__(self):
+        return f"MockContract(code={self.code!r})"
+
+class _FuturesCategory:
+    """api.Contracts.Futures.TMF[code] / api.Contracts.Futures.MXF.MXFR1 都能用"""
+    def __init__(self, category):
+        self._category = category
+        self._contracts = {}
+
+    def __getitem__(self, code):
+        if code not in self._contracts:
+            self._contracts[code] = MockContract(code, self._category)
+        return self._contracts[code]
+
+    def __getattr__(self, code):
+        if code.startswith("_"): raise AttributeError(code)
+        return self[code]
+
+class _Futures:
+    def __init__(self):
+        self._categories = {}
+
+    def __getattr__(self, category):
+        if category.startswith("_"): raise AttributeError(category)
+        if category not in self._categories:
+            self._categories[category] = _FuturesCategory(category)
+        return self._categories[category]
+
+class _Contracts:
+    def __init__(self):
+        self.Futures = _Futures()
+
+class MockTickFOPv1:
+    """模仿 shioaji TickFOPv1 (價格用 Decimal，跟真的一樣)"""
+    __slots__ = ("code", "datetime", "open", "close", "high", "low", "volume", "total_volume",
+                 "amount", "total_amount", "avg_price", "underlying_price", "tick_type",
+                 "chg_type", "price_chg", "pct_chg", "simtrade", "bid_price", "ask_price")
+
+class MockOrder:
+    def __init__(self, price, quantity, action, price_type=None, order_type=None, account=None, **kwargs):
+        self.id = ""
+        self.seqno = ""
+        self.ordno = ""
+        self.price = price
+        self.quantity = int(quantity)
+        self.action = action
+        self.price_type = price_type
+        self.order_type = order_type
+        self.octype = kwargs.get("octype", kwargs.get("oct_type"))
+        self.account = account
+
+class MockOrderStatus:
+    def __init__(self):
+        self.status = "PendingSubmit"
+        self.deal_quantity = 0
+        self.cancel_quantity = 0
+        self.deals = []
+
+class MockTrade:
+    def __init__(self, contract, order):
+        self.contract = contract
+        self.order = order
+        self.status = MockOrderStatus()
+
+class MockFuturePosition:
+    def __init__(self, id, code, direction, quantity, price, last_price, pnl):
+        self.id = id
+        self.code = code
+        self.direction = direction
+        self.quantity = quantity
+        self.price = price
+        self.last_price = last_price
+        self.pnl = pnl
+
+class MockMargin:
+    def __init__(self, equity, initial_margin, maintenance_margin, available_margin):
+        self.equity = equity
+        self.equity_amount = equity
+        self.initial_margin = initial_margin
+        self.maintenance_margin = maintenance_margin
+        self.available_margin = available_margin
+        self.risk_indicator = (equity / maintenance_margin * 100) if maintenance_margin else 999.0
+
+class MockKbars(dict):
+    """pd.DataFrame({**kbars}) 可以直接吃"""
+    pass
+
+class _MockAccount:
+    def __init__(self, account_id):
+        self.account_id = account_id
+        self.broker_id = "F002000"
+        self.person_id = "A123456789"
+        self.signed = True
+        self.username = "mock"
+
+def _make_future_account(account_id):
+    if sj_account is not None:
+        try:
+            return sj_account.FutureAccount(person_id="A123456789", broker_id="F002000",
+                                            account_id=account_id, signed=True, username="mock")
+        except Exception:
+            pass
+    return _MockAccount(account_id)
+
+class MockQuote:
+    """api.quote 的替身：管理報價回呼與訂閱清單"""
+    def __init__(self, broker):
+        self._broker = broker
+        self.on_tick_fop_v1 = None
+        self.subscribed = {}
+
+    def set_on_tick_fop_v1_callback(self, callback):
+        self.on_tick_fop_v1 = callback
+
+    def subscribe(self, contract, quote_type=None, version=None, **kwargs):
+        self.subscribed[contract.code] = contract
+        self._broker._ensure_book(contract.code)
+
+    def unsubscribe(self, contract, quote_type=None, **kwargs):
+        self.subscribed.pop(contract.code, None)
+
+class MockShioaji:
+    """
+    假永豐 API (券商替身) - 離線壓測專用
+    功能:
+    1. 報價: 透過 set_on_tick_fop_v1_callback 依設定頻率推送 Tick (可手動灌爆量)
+    2. 下單: api.Order / place_order / cancel_order / set_order_callback，委託回報與成交回報有可設定的延遲，支援分批成交
+       IOC 限價單吃不到就刪除 (回報 op_type=Cancel)，ROD 限價單掛著等價格穿越
+    3. 帳務: list_positions / margin (每次呼叫都會模擬一次往返延遲，並記錄呼叫次數)
+    4. 歷史: kbars (合成 1 分 K，給回補與下載器測試用)
+    """
+    def __init__(self, start_price=20000.0, volatility=2.0, spread=1.0,
+                 ack_delay=0.02, fill_delay=0.08, partial_fill_lots=0,
+                 api_latency=0.05, place_latency=0.0, sim_start=None, sim_seconds_per_tick=None,
+                 initial_equity=500000.0, margin_per_lot=None, fee_per_lot=22.0, seed=None,
+                 kbars_fail_rate=0.0):
+        self._rng = random.Random(seed)
+        self.volatility = volatility            # 每筆 Tick 隨機漫步的標準差 (點)
+        self.spread = spread                    # 買賣價差 (點)
+        self.ack_delay = ack_delay              # 委託 -> 委託回報 (秒)
+        self.fill_delay = fill_delay            # 委託 -> 成交回報 (秒)
+        self.partial_fill_lots = partial_fill_lots # >0 代表每次最多成交幾口 (分批成交)
+        self.api_latency = api_latency          # list_positions / margin 的往返延遲 (秒)
+        self.place_latency = place_latency      # place_order 本身的往返延遲 (秒)
+        self.initial_equity = initial_equity
+        self.margin_per_lot = margin_per_lot or {"TMF": 18000.0, "MXF": 90000.0, "TXF": 360000.0}
+        self.fee_per_lot = fee_per_lot
+        self.kbars_fail_rate = kbars_fail_rate  # kbars 查詢逾時的機率 (測下載器的重試 / 續傳)
+
+        # 🕒 模擬時鐘：sim_seconds_per_tick=None 代表用真實時間蓋 Tick 時間戳
+        self.sim_seconds_per_tick = sim_seconds_per_tick
+        self._sim_clock = sim_start or datetime.now().replace(second=0, microsecond=0)
+
+        self.Contracts = _Contracts()
+        self.quote = MockQuote(self)
+        self.futopt_account = _make_future_account("9876543")
+        self.stock_account = self.futopt_account # RealExecutor 找不到期貨帳號時的備案
+        self._order_callback = None
+
+        # 📈 每個商品的盤口
+        self._start_price = start_price
+        self._last_price = {}
+        self._lock = threading.RLock()
+
+        # 📒 帳務
+        self._positions = {}   # code -> [淨口數, 均價]
+        self._realized = 0.0
+        self._fees = 0.0
+        self._resting = []     # 尚未成交的限價單 (MockTrade)
+        self._ids = itertools.count(1)
+
+        # 📊 壓測量測用
+        self.calls = Counter()         # 各 API 被呼叫幾次
+        self.order_log = []            # (收到委託的時間, 觸發這筆委託的 Tick 推送時間, code, action, qty)
+        self.tick_block = []           # 每筆 Tick 回呼卡住推送端多久 (秒)
+        self._current_tick_t0 = None
+        self._tick_caller = None
+
+        # ⏰ 單一排程執行緒 (負責所有延遲回報)
+        self._timers = []
+        self._timer_seq = itertools.count()
+        self._timer_cond = threading.Condition()
+        self._closed = False
+        self._timer_thread = threading.Thread(target=self._timer_loop, name="MockBrokerTimer", daemon=True)
+        self._timer_thread.start()
+        self._tick_thread = None
+        self._tick_stop = threading.Event()
+
+    # ==========================================
+    # 🔐 連線與帳號
+    # ==========================================
+    def login(self, api_key=None, secret_key=None, **kwargs):
+        self.calls["login"] += 1
+        return [self.futopt_account]
+
+    def logout(self):
+        self.calls["logout"] += 1
+        self.stop_ticks()
+        self.close()
+        return True
+
+    def activate_ca(self, ca_path=None, ca_passwd=None, person_id=None, **kwargs):
+        self.calls["activate_ca"] += 1
+        return True
+
+    def list_accounts(self):
+        self.calls["list_accounts"] += 1
+        return [self.futopt_account]
+
+    def close(self):
+        with self._timer_cond:
+            self._closed = True
+            self._timer_cond.notify_all()
+
+    # ==========================================
+    # 📈 報價
+    # ==========================================
+    def _ensure_book(self, code):
+        with self._lock:
+            if code not in self._last_price:
+                self._last_price[code] = self._start_price
+
+    def last_price(self, code):
+        return self._last_price.get(code, self._start_price)
+
+    def emit_ticks(self, count, code=None, volume=1):
+        """在呼叫端執行緒上連續推送 count 筆 Tick (壓測爆量用)"""
+        codes = [code] if code else list(self.quote.subscribed)
+        for _ in range(count):
+            for c in codes:
+                self._emit_tick(c, volume)
+
+    def start_ticks(self, rate=10.0, volume=1):
+        """背景依 rate (筆/秒) 推送 Tick"""
+        self.stop_ticks()
+        self._tick_stop.clear()
+
+        def loop():
+            interval = 1.0 / rate if rate > 0 else 0.0
+            next_t = time.perf_counter()
+            while not self._tick_stop.is_set():
+                for c in list(self.quote.subscribed):
+                    self._emit_tick(c, volume)
+                next_t += interval
+                sleep = next_t - time.perf_counter()
+                if sleep > 0:
+                    self._tick_stop.wait(sleep)
+
+        self._tick_thread = threading.Thread(target=loop, name="MockBrokerTicks", daemon=True)
+        self._tick_thread.start()
+
+    def stop_ticks(self):
+        self._tick_stop.set()
+        if self._tick_thread:
+            self._tick_thread.join(1.0)
+            self._tick_thread = None
+
+    def _next_tick_time(self):
+        if self.sim_seconds_per_tick is None:
+            return datetime.now()
+        self._sim_clock += timedelta(seconds=self.sim_seconds_per_tick)
+        return self._sim_clock
+
+    def _emit_tick(self, code, volume):
+        with self._lock:
+            self._ensure_book(code)
+            price = round(self._last_price[code] + self._rng.gauss(0.0, self.volatility))
+            self._last_price[code] = price
+            tick_time = self._next_tick_time()
+
+        tick = MockTickFOPv1()
+        tick.code = code
+        tick.datetime = tick_time
+        tick.open = tick.high = tick.low = tick.avg_price = tick.underlying_price = Decimal(price)
+        tick.close = Decimal(price)
+        tick.volume = volume
+        tick.total_volume = volume
+        tick.amount = tick.total_amount = Decimal(price * volume)
+        tick.tick_type = 1
+        tick.chg_type = 0
+        tick.price_chg = Decimal(0)
+        tick.pct_chg = Decimal(0)
+        tick.simtrade = False
+        tick.bid_price = Decimal(price - self.spread / 2.0)
+        tick.ask_price = Decimal(price + self.spread / 2.0)
+
+        # 先撮合掛著的限價單，再把 Tick 推出去
+        self._match_resting(code, price)
+
+        cb = self.quote.on_tick_fop_v1
+        if cb and code in self.quote.subscribed:
+            t0 = time.perf_counter()
+            self._current_tick_t0 = t0
+            self._tick_caller = threading.current_thread()
+            cb("TAIFEX", tick)
+            self._current_tick_t0 = None
+            self.tick_block.append(time.perf_counter() - t0)
+
+    # ==========================================
+    # 🧾 下單與回報
+    # ==========================================
+    def Order(self, price, quantity, action, price_type=None, order_type=None, account=None, **kwargs):
+        return MockOrder(price, quantity, action, price_type, order_type, account, **kwargs)
+
+    def set_order_callback(self, callback):
+        self._order_callback = callback
+
+    def place_order(self, contract, order, timeout=5000, **kwargs):
+        self.calls["place_order"] += 1
+        if self.place_latency > 0: time.sleep(self.place_latency)
+        recv = time.perf_counter()
+        # 同步送單時才知道是哪筆 Tick 觸發的 (非同步送單是在別的執行緒，記 None)
+        tick_t0 = self._current_tick_t0 if threading.current_thread() is self._tick_caller else None
+        self.order_log.append((recv, tick_t0, contract.code, str(order.action), order.quantity))
+
+        seq = next(self._ids)
+        order.id = f"mock{seq:06d}"
+        order.seqno = f"{seq:06d}"
+        order.ordno = f"X{seq:05d}"
+        trade = MockTrade(contract, order)
+        trade.status.status = "PendingSubmit"
+        self._ensure_book(contract.code)
+
+        self._schedule(self.ack_delay, self._ack, trade)
+        self._schedule(self.fill_delay, self._try_fill, trade)
+        return trade
+
+    def cancel_order(self, trade, timeout=5000, **kwargs):
+        """刪單：從掛單簿拿掉，經過 ack_delay 回報 Cancel (已全部成交的單刪不掉)"""
+        self.calls["cancel_order"] += 1
+        if self.place_latency > 0: time.sleep(self.place_latency)
+        with self._lock:
+            if trade in self._resting:
+                self._resting.remove(trade)
+        self._schedule(self.ack_delay, self._cancel, trade)
+        return trade
+
+    def _cancel(self, trade):
+        with self._lock:
+            status = trade.status
+            if status.status in ("Filled", "Cancelled"): return
+            status.cancel_quantity = trade.order.quantity - status.deal_quantity
+            status.status = "Cancelled"
+        self._fire(OrderState.FuturesOrder, self._order_msg(trade, "Cancel"))
+
+    def _ack(self, trade):
+        if trade.status.status == "PendingSubmit":
+            trade.status.status = "Submitted"
+        self._fire(OrderState.FuturesOrder, self._order_msg(trade, "New"))
+
+    def _is_market(self, order):
+        return "MKT" in str(order.price_type) or not order.price
+
+    def _try_fill(self, trade):
+        """時間到：市價單直接成交，限價單可成交就以對手價成交 (不會比限價差)，否則 ROD 掛著等價格穿越、IOC 刪除"""
+        order = trade.order
+        code = trade.contract.code
+        last = self.last_price(code)
+        if trade.status.status == "Cancelled": return
+        touch = last + (self.spread / 2.0 if _is_buy(order.action) else -self.spread / 2.0)
+        if self._is_market(order):
+            price = touch
+        else:
+            marketable = (last <= order.price) if _is_buy(order.action) else (last >= order.price)
+            if not marketable:
+                if "IOC" in str(order.order_type):
+                    self._cancel(trade)
+                    return
+                with self._lock:
+                    self._resting.append(trade)
+                return
+            price = min(touch, float(order.price)) if _is_buy(order.action) else max(touch, float(order.price))
+        self._fill(trade, price)
+
+    def _match_resting(self, code, price):
+        if not self._resting: return
+        with self._lock:
+            ready, still = [], []
+            for trade in self._resting:
+                order = trade.order
+                if trade.contract.code != code:
+                    still.append(trade)
+                elif (_is_buy(order.action) and price <= order.price) or (not _is_buy(order.action) and price >= order.price):
+                    ready.append(trade)
+                else:
+                    still.append(trade)
+            self._resting = still
+        for trade in ready:
+            self._schedule(0.0, self._fill, trade, float(trade.order.price))
+
+    def _fill(self, trade, price):
+        """依 partial_fill_lots 拆成數筆成交回報 (每批間隔 ack_delay)"""
+        remaining = trade.order.quantity - trade.status.deal_quantity
+        if remaining <= 0 or trade.status.status == "Cancelled": return
+        lots = min(remaining, self.partial_fill_lots) if self.partial_fill_lots > 0 else remaining
+        self._book_deal(trade, lots, price)
+        if trade.order.quantity - trade.status.deal_quantity > 0:
+            self._schedule(self.ack_delay or 0.01, self._fill, trade, price)
+
+    def _book_deal(self, trade, qty, price):
+        code = trade.contract.code
+        sign = 1 if _is_buy(trade.order.action) else -1
+        with self._lock:
+            pos, avg = self._positions.get(code, [0, 0.0])
+            pv = POINT_VALUES.get(code[:3], 10.0)
+            delta = sign * qty
+            if pos == 0 or (pos > 0) == (delta > 0):
+                new_pos = pos + delta
+                avg = (abs(pos) * avg + qty * price) / abs(new_pos)
+            else:
+                closed = min(abs(pos), qty)
+                self._realized += (price - avg) * closed * pv * (1 if pos > 0 else -1)
+                new_pos = pos + delta
+                if new_pos == 0:
+                    avg = 0.0
+                elif (new_pos > 0) != (pos > 0):
+                    avg = price # 反手：剩下的口數以成交價開新倉
+            self._positions[code] = [new_pos, avg]
+            self._fees += self.fee_per_lot * qty
+
+            trade.status.deal_quantity += qty
+            trade.status.deals.append((qty, price))
+            trade.status.status = "Filled" if trade.status.deal_quantity >= trade.order.quantity else "PartFilled"
+
+        self._fire(OrderState.FuturesDeal, self._deal_msg(trade, qty, price))
+
+    def _order_msg(self, trade, op_type):
+        order, contract = trade.order, trade.contract
+        return {
+            "operation": {"op_type": op_type, "op_code": "00", "op_msg": ""},
+            "order": {"id": order.id, "seqno": order.seqno, "ordno": order.ordno,
+                      "action": "Buy" if _is_buy(order.action) else "Sell",
+                      "price": float(order.price or 0), "quantity": order.quantity,
+                      "order_type": str(order.order_type), "price_type": str(order.price_type),
+                      "oc_type": str(order.octype)},
+            "status": {"id": order.id, "exchange_ts": time.time(),
+                       "order_quantity": order.quantity, "deal_quantity": trade.status.deal_quantity,
+                       "cancel_quantity": trade.status.cancel_quantity, "modified_price": 0.0},
+            "contract": {"security_type": "FUT", "exchange": "TAIFEX",
+                         "code": contract.category, "full_code": contract.code},
+        }
+
+    def _deal_msg(self, trade, qty, price):
+        order, contract = trade.order, trade.contract
+        return {
+            "trade_id": order.id, "seqno": order.seqno, "ordno": order.ordno,
+            "exchange_seq": f"{next(self._ids):08d}", "broker_id": "F002000",
+            "account_id": getattr(order.account, "account_id", ""),
+            "action": "Buy" if _is_buy(order.action) else "Sell",
+            "code": contract.category, "full_code": contract.code,
+            "price": price, "quantity": qty, "subaccount": "",
+            "security_type": "FUT", "delivery_month": contract.delivery_month,
+            "strike_price": 0.0, "option_right": "Future", "market_type": "Day",
+            "combo": False, "ts": time.time(),
+        }
+
+    def _fire(self, stat, msg):
+        cb = self._order_callback
+        if cb:
+            try:
+                cb(stat, msg)
+            except Exception as e:
+                print(f"⚠️ [MockShioaji] 回報處理函數發生錯誤: {e}")
+
+    # ==========================================
+    # 🏦 帳務查詢 (每次都模擬一次往返延遲)
+    # ==========================================
+    def list_positions(self, account=None, **kwargs):
+        self.calls["list_positions"] += 1
+        if self.api_latency > 0: time.sleep(self.api_latency)
+        buy = getattr(Action, "Buy")
+        sell = getattr(Action, "Sell")
+        result = []
+        with self._lock:
+            for i, (code, (pos, avg)) in enumerate(self._positions.items()):
+                if pos == 0: continue
+                last = self.last_price(code)
+                pv = POINT_VALUES.get(code[:3], 10.0)
+                pnl = (last - avg) * pos * pv
+                result.append(MockFuturePosition(i, code, buy if pos > 0 else sell, abs(pos), avg, last, pnl))
+        return result
+
+    def margin(self, account=None, **kwargs):
+        self.calls["margin"] += 1
+        if self.api_latency > 0: time.sleep(self.api_latency)
+        with self._lock:
+            unrealized = 0.0
+            initial = 0.0
+            for code, (pos, avg) in self._positions.items():
+                pv = POINT_VALUES.get(code[:3], 10.0)
+                unrealized += (self.last_price(code) - avg) * pos * pv
+                initial += abs(pos) * self.margin_per_lot.get(code[:3], 18000.0)
+            equity = self.initial_equity + self._realized - self._fees + unrealized
+        maintenance = initial * 0.77
+        return MockMargin(equity, initial, maintenance, equity - initial)
+
+    # ==========================================
+    # 🕯️ 歷史 K 棒 (合成)
+    # ==========================================
+    def kbars(self, contract, start, end, timeout=30000, **kwargs):
+        """
+        產生 start~end (含) 的合成 1 分 K，只涵蓋日盤 08:46~13:45 與夜盤 15:01~隔日 05:00
+        每個交易日用自己的亂數種子 -> 同一天不管是一次抓整段還是分段抓，拿到的 K 棒都一樣
+        """
+        self.calls["kbars"] += 1
+        if self.api_latency > 0: time.sleep(self.api_latency)
+        if self.kbars_fail_rate and self._rng.random() < self.kbars_fail_rate:
+            self.calls["kbars_failed"] += 1
+            raise TimeoutError(f"kbars {contract.code} {start}~{end} 逾時 (模擬)")
+        day = datetime.strptime(str(start)[:10], "%Y-%m-%d")
+        last_day = datetime.strptime(str(end)[:10], "%Y-%m-%d")
+        out = {"ts": [], "Open": [], "High": [], "Low": [], "Close": [], "Volume": [], "Amount": []}
+        while day <= last_day:
+            if day.weekday() < 5:
+                rng = random.Random(f"{contract.code}-{day:%Y%m%d}")
+                price = self._start_price + round(rng.gauss(0.0, self.volatility * 50))
+                sessions = [(day.replace(hour=8, minute=46), day.replace(hour=13, minute=45)),
+                            (day.replace(hour=15, minute=1), (day + timedelta(days=1)).replace(hour=5, minute=0))]
+                for s, e in sessions:
+                    t = s
+                    while t <= e:
+                        o = price
+                        c = round(o + rng.gauss(0.0, self.volatility * 3))
+                        h = max(o, c) + abs(round(rng.gauss(0.0, self.volatility)))
+                        l = min(o, c) - abs(round(rng.gauss(0.0, self.volatility)))
+                        v = rng.randint(1, 200)
+                        # 跟永豐一樣：ts 是「把台北時間當成 UTC」的奈秒數
+                        out["ts"].append(int((t - datetime(1970, 1, 1)).total_seconds() * 1e9))
+                        out["Open"].append(float(o)); out["High"].append(float(h))
+                        out["Low"].append(float(l)); out["Close"].append(float(c))
+                        out["Volume"].append(v); out["Amount"].append(float(c * v))
+                        price = c
+                        t += timedelta(minutes=1)
+            day += timedelta(days=1)
+        return MockKbars(out)
+
+    # ==========================================
+    # ⏰ 單一排程器
+    # ==========================================
+    def _schedule(self, delay, fn, *args):
+        with self._timer_cond:
+            heapq.heappush(self._timers, (time.monotonic() + max(0.0, delay), next(self._timer_seq), fn, args))
+            self._timer_cond.notify()
+
+    def _timer_loop(self):
+        while True:
+            with self._timer_cond:
+                while not self._closed and (not self._timers or self._timers[0][0] > time.monotonic()):
+                    timeout = (self._timers[0][0] - time.monotonic()) if self._timers else None
+                    self._timer_cond.wait(timeout)
+                if self._closed: return
+                _, _, fn, args = heapq.heappop(self._timers)
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"⚠️ [MockShioaji] 排程任務失敗: {e}")
@@ -0,0 +1,169 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class MockTelegramServer:
+    """
+    假 Telegram Bot API (本機壓測專用)
+    只實作指揮官會用到的兩支 API:
+    1. getUpdates  - 支援 offset 與長輪詢 (timeout)
+    2. sendMessage - 記錄收到的訊息
+    並可設定: 網路延遲 / 隨機錯誤 (500) / 速率限制 (429) / 指令風暴
+    """
+    def __init__(self, host="127.0.0.1", port=0, chat_id="10000",
+                 latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1, seed=None):
+        self.chat_id = str(chat_id)
+        self.latency = latency                  # 每個請求固定延遲 (秒)
+        self.jitter = jitter                    # 額外隨機延遲上限 (秒)
+        self.error_rate = error_rate            # 回 500 的機率
+        self.rate_limit_rate = rate_limit_rate  # 回 429 的機率
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+
+        # 📬 上行 (使用者 -> Bot) 的更新佇列
+        self._updates = []
+        self._next_update_id = 1
+        self._cond = threading.Condition()
+
+        # 📮 下行 (Bot -> 使用者) 的收件紀錄: (收到時間, chat_id, text)
+        self.sent_messages = []
+        self.inject_times = {}  # update_id -> 注入時間 (算延遲用)
+        self.stats = {"getUpdates": 0, "sendMessage": 0, "errors": 0, "rate_limited": 0}
+
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="MockTelegram", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        with self._cond:
+            self._cond.notify_all()
+
+    # ==========================================
+    # 🎮 測試腳本用的操控介面
+    # ==========================================
+    def inject_command(self, text, chat_id=None, date=None):
+        """模擬使用者在聊天室打了一行指令，回傳 update_id"""
+        with self._cond:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            self._updates.append({
+                "update_id": update_id,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(date if date is not None else time.time()),
+                    "chat": {"id": int(chat_id or self.chat_id), "type": "private"},
+                    "text": text,
+                },
+            })
+            self.inject_times[update_id] = time.perf_counter()
+            self._cond.notify_all()
+        return update_id
+
+    def storm(self, count, text="/status", interval=0.0):
+        """指令風暴：連續注入 count 則指令"""
+        ids = []
+        for _ in range(count):
+            ids.append(self.inject_command(text))
+            if interval > 0:
+                time.sleep(interval)
+        return ids
+
+    def received_texts(self):
+        return [m[2] for m in self.sent_messages]
+
+    # ==========================================
+    # 🔧 API 實作
+    # ==========================================
+    def _get_updates(self, params):
+        offset = int(params.get("offset", 0) or 0)
+        timeout = float(params.get("timeout", 0) or 0)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            # Telegram 語意：offset 之前的更新視為已確認，直接丟掉
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return list(self._updates)
+
+    def _send_message(self, params):
+        self.sent_messages.append((time.perf_counter(), str(params.get("chat_id", "")), params.get("text", "")))
+        return {"message_id": len(self.sent_messages), "chat": {"id": params.get("chat_id")}, "text": params.get("text", "")}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # 支援 Keep-Alive，才量得到連線重用的效果
+
+            def log_message(self, *args):
+                pass # 安靜模式，不要洗版
+
+            def _reply(self, code, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _params(self):
+                parsed = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                length = int(self.headers.get("Content-Length", 0) or 0)
+                if length:
+                    raw = self.rfile.read(length).decode("utf-8")
+                    if "json" in (self.headers.get("Content-Type") or ""):
+                        params.update(json.loads(raw))
+                    else:
+                        params.update({k: v[-1] for k, v in parse_qs(raw).items()})
+                return parsed.path.rsplit("/", 1)[-1], params
+
+            def _handle(self):
+                method, params = self._params()
+
+                delay = server.latency + (server._rng.random() * server.jitter if server.jitter else 0.0)
+                if delay > 0:
+                    time.sleep(delay)
+
+                # 💥 錯誤注入 (長輪詢也可能被打斷)
+                roll = server._rng.random()
+                if roll < server.rate_limit_rate:
+                    server.stats["rate_limited"] += 1
+                    return self._reply(429, {"ok": False, "error_code": 429,
+                                             "description": "Too Many Requests",
+                                             "parameters": {"retry_after": server.retry_after}})
+                if roll < server.rate_limit_rate + server.error_rate:
+                    server.stats["errors"] += 1
+                    return self._reply(500, {"ok": False, "error_code": 500, "description": "Injected error"})
+
+                if method == "getUpdates":
+                    server.stats["getUpdates"] += 1
+                    return self._reply(200, {"ok": True, "result": server._get_updates(params)})
+                if method == "sendMessage":
+                    server.stats["sendMessage"] += 1
+                    return self._reply(200, {"ok": True, "result": server._send_message(params)})
+                return self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+
+            do_GET = _handle
+            do_POST = _handle
+
+        return Handler
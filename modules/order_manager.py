@@ -0,0 +1,267 @@
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from core.event import OrderStatus
+
+class ManagedOrder:
+    """一張受管委託的狀態紀錄 (由 OrderManager 更新，外部唯讀)"""
+    def __init__(self, local_id, direction, qty, price, tag=""):
+        self.local_id = local_id
+        self.direction = direction      # "BUY" / "SELL"
+        self.qty = qty
+        self.price = price              # 0 = 市價
+        self.tag = tag                  # 例如 "close" / "open"，方便 Log 辨識
+        self.status = OrderStatus.PENDING
+        self.broker_id = None           # 券商委託 ID (trade.order.id)
+        self.trade = None               # place_order 回傳的 Trade 物件
+        self.filled_qty = 0
+        self.avg_fill_price = 0.0
+        self.reason = ""
+        self.after = None               # 要等哪一張單完全成交才能送 (None = 馬上送)
+        self.created_at = time.perf_counter()
+        self.submitted_at = None
+        self.acked_at = None
+        self.done_at = None
+        self.cancel_requested_at = None # 送出刪單的時間 (None = 還沒刪)
+        self._sending = False           # 送單工人已經拿走 (place_order 可能正在路上)
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """等到這張單結束 (成交/拒單/取消)，回傳是否結束"""
+        return self._done.wait(timeout)
+
+    def __repr__(self):
+        return (f"ManagedOrder(#{self.local_id} {self.tag} {self.direction} {self.filled_qty}/{self.qty} "
+                f"@ {self.price} {self.status.value})")
+
+class OrderManager:
+    """
+    委託管理員 (非同步送單 + 委託狀態追蹤)
+    1. submit() 只把委託排進佇列就回傳，引擎的 K 棒執行緒不再卡在 place_order 上
+    2. 預設只有一條送單工人，委託一定依 submit 的順序到券商 (FLATTEN 之後的新倉不會搶在前面)
+       反手兩腳不用等成交就接連送出；sender_threads > 1 會讓相鄰訊號的委託可能亂序，只建議壓測用
+    3. 依 set_order_callback 的回報更新狀態: PENDING -> SUBMITTED -> ACKED -> PARTIALLY_FILLED -> FILLED / REJECTED / CANCELLED
+    4. 設了 after 的委託會等前一張完全成交才送 (交易所不允許同時送反手兩腳時用)；前一張失敗則一併取消
+    5. order_ttl: 送出後超過幾秒還沒結束的委託自動刪單 (刪單後再等一個 order_ttl 仍沒回報就在本地結束)，
+       不會有一張掛著的單永遠佔著在途口數
+    """
+    def __init__(self, place_fn, sender_threads=1, on_update=None, on_fill=None, keep_done=500,
+                 cancel_fn=None, order_ttl=None):
+        self.place_fn = place_fn            # (direction, qty, price) -> Trade，實際呼叫 api.place_order
+        self.cancel_fn = cancel_fn          # (Trade) -> None，實際呼叫 api.cancel_order
+        self.order_ttl = order_ttl          # 委託存活秒數 (None = 不自動刪單)
+        self.on_update = on_update          # 委託狀態改變時通知 (ManagedOrder)
+        self.on_fill = on_fill              # 每筆成交回報通知 (ManagedOrder, qty, price)，給成交驅動帳本記帳
+        self.keep_done = keep_done          # 已結束的委託最多保留幾張 (避免長時間執行記憶體一直長)
+
+        self._queue = queue.Queue()
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self.orders = {}                    # local_id -> ManagedOrder
+        self._by_broker_id = {}             # broker_id -> ManagedOrder
+        self._early_events = {}             # 比 place_order 回傳還早到的回報 (broker_id -> [(kind, msg)])
+        self._waiting = {}                  # parent local_id -> [child ManagedOrder]
+        self._done_ids = deque()
+
+        self._workers = []
+        for i in range(max(1, sender_threads)):
+            t = threading.Thread(target=self._sender_loop, name=f"OrderSender-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    # ==========================================
+    # 📤 送單
+    # ==========================================
+    def submit(self, direction, qty, price, tag="", after=None):
+        """排入送單佇列，立刻回傳 ManagedOrder (after 可以是 ManagedOrder 或 local_id)"""
+        if after is not None and not isinstance(after, ManagedOrder):
+            after = self.orders.get(after)
+        order = ManagedOrder(next(self._ids), direction, qty, price, tag)
+        with self._lock:
+            self.orders[order.local_id] = order
+            if after is not None and not after.status.is_done:
+                order.after = after
+                self._waiting.setdefault(after.local_id, []).append(order)
+                return order
+            parent_failed = after is not None and after.status != OrderStatus.FILLED
+        if parent_failed:
+            self._finish(order, OrderStatus.CANCELLED, f"前一張委託 #{after.local_id} 未成交")
+            return order
+        self._queue.put(order)
+        return order
+
+    def cancel(self, order):
+        """刪單：還沒送出的直接在本地取消；已送出的請券商刪，等 Cancel 回報再結束"""
+        with self._lock:
+            if order.status.is_done: return
+            sent = order._sending
+            if sent:
+                order.cancel_requested_at = time.perf_counter()
+        if not sent:
+            self._finish(order, OrderStatus.CANCELLED, "送出前已刪單")
+            return
+        if order.trade is None or self.cancel_fn is None: return # 還在 place_order 路上：送出後由送單工人補刪
+        try:
+            self.cancel_fn(order.trade)
+        except Exception as e:
+            print(f"⚠️ [OrderManager] 刪單失敗 {order}: {e}")
+
+    def _sweep(self):
+        """逾時委託：先請券商刪單；刪了還是等不到回報，就在本地結束 (實際部位交給對帳員校正)"""
+        now = time.perf_counter()
+        with self._lock:
+            stale = [o for o in self.orders.values()
+                     if not o.status.is_done and o.submitted_at is not None and now - o.submitted_at > self.order_ttl]
+        for order in stale:
+            if order.cancel_requested_at is None:
+                print(f"⏰ [OrderManager] 委託逾時 {self.order_ttl:g}s 未結束，送出刪單: {order}")
+                self.cancel(order)
+            elif now - order.cancel_requested_at > self.order_ttl:
+                self._finish(order, OrderStatus.CANCELLED, "刪單後逾時未回報")
+
+    def open_orders(self):
+        with self._lock:
+            return [o for o in self.orders.values() if not o.status.is_done]
+
+    def stop(self, timeout=2.0):
+        for _ in self._workers:
+            self._queue.put(None)
+        for t in self._workers:
+            t.join(timeout)
+
+    def _sender_loop(self):
+        sweep_every = self.order_ttl / 2.0 if self.order_ttl else None
+        last_sweep = time.perf_counter()
+        while True:
+            try:
+                order = self._queue.get(timeout=sweep_every)
+            except queue.Empty:
+                order = False
+            if sweep_every and time.perf_counter() - last_sweep >= sweep_every:
+                self._sweep()
+                last_sweep = time.perf_counter()
+            if order is None: return
+            if order is False: continue
+            with self._lock:
+                if order.status.is_done: continue # 送出前已被刪掉
+                order._sending = True
+            try:
+                trade = self.place_fn(order.direction, order.qty, order.price)
+            except Exception as e:
+                self._finish(order, OrderStatus.REJECTED, f"API Error: {e}")
+                continue
+
+            broker_id = getattr(getattr(trade, 'order', None), 'id', None)
+            with self._lock:
+                order.trade = trade
+                order.broker_id = broker_id
+                order.submitted_at = time.perf_counter()
+                if order.status == OrderStatus.PENDING:
+                    order.status = OrderStatus.SUBMITTED
+                if broker_id:
+                    self._by_broker_id[broker_id] = order
+                early = self._early_events.pop(broker_id, [])
+                cancel_now = order.cancel_requested_at is not None
+            self._notify(order)
+            # 回報比 place_order 回傳還早到 (常見於成交很快的市價單)，補處理
+            for kind, msg in early:
+                self._apply(order, kind, msg)
+            if cancel_now:
+                self.cancel(order) # 送單途中被要求刪單 (逾時 / 手動)，現在有 Trade 了才刪得掉
+
+    # ==========================================
+    # 📥 回報
+    # ==========================================
+    def on_order_event(self, stat, msg):
+        """接 api.set_order_callback 的回報 (委託回報 / 成交回報)"""
+        if not isinstance(msg, dict): return
+        status_str = str(getattr(stat, 'status', stat))
+        if "Deal" in status_str:
+            kind, broker_id = "deal", msg.get("trade_id")
+        else:
+            kind, broker_id = "order", (msg.get("order") or {}).get("id")
+        if not broker_id: return
+
+        with self._lock:
+            order = self._by_broker_id.get(broker_id)
+            if order is None:
+                # 可能是還沒對上號的自家委託，也可能是手機/網頁下的單；先暫存，太多就丟最舊的
+                self._early_events.setdefault(broker_id, []).append((kind, msg))
+                if len(self._early_events) > 1000:
+                    self._early_events.pop(next(iter(self._early_events)))
+                return
+        self._apply(order, kind, msg)
+
+    def _apply(self, order, kind, msg):
+        if kind == "deal":
+            qty = int(msg.get("quantity", 0) or 0)
+            price = float(msg.get("price", 0.0) or 0.0)
+            with self._lock:
+                if order.status.is_done: return
+                total = order.filled_qty + qty
+                order.avg_fill_price = (order.avg_fill_price * order.filled_qty + price * qty) / total if total else 0.0
+                order.filled_qty = total
+                if order.filled_qty >= order.qty:
+                    filled = True
+                else:
+                    filled = False
+                    order.status = OrderStatus.PARTIALLY_FILLED
+            if self.on_fill:
+                try:
+                    self.on_fill(order, qty, price)
+                except Exception as e:
+                    print(f"⚠️ [OrderManager] 成交通知失敗: {e}")
+            if filled:
+                self._finish(order, OrderStatus.FILLED)
+            else:
+                self._notify(order)
+            return
+
+        op = msg.get("operation", {})
+        op_type, op_code = op.get("op_type", ""), op.get("op_code", "00")
+        if op_code not in ("00", "", None):
+            self._finish(order, OrderStatus.REJECTED, op.get("op_msg", "") or f"op_code={op_code}")
+        elif op_type == "Cancel":
+            self._finish(order, OrderStatus.CANCELLED, "已刪單")
+        else:
+            with self._lock:
+                if order.status in (OrderStatus.PENDING, OrderStatus.SUBMITTED):
+                    order.status = OrderStatus.ACKED
+                    order.acked_at = time.perf_counter()
+            self._notify(order)
+
+    def _finish(self, order, status, reason=""):
+        with self._lock:
+            if order.status.is_done: return
+            order.status = status
+            order.reason = reason
+            order.done_at = time.perf_counter()
+            children = self._waiting.pop(order.local_id, [])
+            self._done_ids.append(order.local_id)
+            self._trim()
+        order._done.set()
+        if status == OrderStatus.REJECTED:
+            print(f"❌ [OrderManager] 委託失敗 {order}: {reason}")
+        self._notify(order)
+
+        # 等這張單的後續委託：成交就放行，否則一併取消
+        for child in children:
+            if status == OrderStatus.FILLED:
+                self._queue.put(child)
+            else:
+                self._finish(child, OrderStatus.CANCELLED, f"前一張委託 #{order.local_id} {status.value}")
+
+    def _trim(self):
+        while len(self._done_ids) > self.keep_done:
+            old = self.orders.pop(self._done_ids.popleft(), None)
+            if old and old.broker_id:
+                self._by_broker_id.pop(old.broker_id, None)
+
+    def _notify(self, order):
+        if self.on_update:
+            try:
+                self.on_update(order)
+            except Exception as e:
+                print(f"⚠️ [OrderManager] 狀態通知失敗: {e}")
@@ -0,0 +1,188 @@
+import threading
+import time
+from collections import deque
+
+class PositionReconciler:
+    """
+    事件驅動對帳員 (取代「睡 1.5 秒再查 list_positions」的舊版 _delayed_sync)
+    運作方式:
+    1. 成交回報 (Deal) 一進來就直接用回報裡的 action/quantity 累加出「回報推算部位」，不打 API
+    2. 同一時間的多筆回報 (分批成交、反手兩腳) 都在同一把鎖裡合併，只由一個背景工人處理
+    3. 回報安靜 settle 秒後，推算部位 == 影子帳本 -> 對帳完成，零 API 呼叫
+    4. 兩邊對不上 (漏回報 / 被拒單 / 人工下單) 且持續 verify_after 秒 -> 才去券商查一次真實部位 (去抖動)
+    5. 校正時連均價 / 進場時間一起對齊券商 (成本查不到就用最新報價代替，並提醒)
+    """
+    def __init__(self, bot, executor, position_source=None, code_prefix="TMF",
+                 settle=0.3, verify_after=2.0, notify=True, on_deal=None, strategy=None, max_seen_deals=10000):
+        self.bot = bot
+        self.executor = executor
+        self.strategy = strategy            # 要校正哪個策略的部位 (預設 bot.strategy；多商品時傳該商品的策略)
+        # 券商真實部位來源 (實戰: RealExecutor.get_position；模擬: 直接讀模擬帳本)
+        self.position_source = position_source or executor.get_position
+        self.code_prefix = code_prefix
+        self.settle = settle                # 回報安靜多久才比對 (秒)
+        self.verify_after = verify_after    # 對不上時，最多容忍多久才去券商查 (秒)
+        self.notify = notify
+        self.on_deal = on_deal              # 每筆成交回報的額外通知 (例如要求帳務快取刷新)
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self.deal_position = None           # 回報推算部位 (None = 尚未建立基準)
+        self._seen_deals = set()            # 重複回報過濾 (只記最近 max_seen_deals 筆，長時間執行不會無限長大)
+        self._seen_order = deque(maxlen=max_seen_deals)
+        self._dirty = False
+        self._last_event = 0.0
+        self._mismatch_since = None
+        self._running = True
+
+        self.stats = {"deals": 0, "duplicates": 0, "matched": 0, "polls": 0, "corrections": 0}
+
+        self._worker = threading.Thread(target=self._run, name="PositionReconciler", daemon=True)
+        self._worker.start()
+
+    # ==========================================
+    # 📥 外部介面
+    # ==========================================
+    def reset(self, position):
+        """以券商確認過的部位當作新基準 (開機對帳 / 手動 /sync 後呼叫)"""
+        with self._cond:
+            self.deal_position = int(position)
+            self._mismatch_since = None
+
+    def on_order_event(self, stat, msg):
+        """直接綁給 api.set_order_callback (也相容 MockExecutor 的回報)"""
+        try:
+            status_str = str(getattr(stat, 'status', stat))
+            if "Deal" in status_str or "Filled" in status_str:
+                self._on_deal(msg)
+            elif isinstance(msg, dict):
+                # 委託回報：被拒/刪單代表影子帳本預期的部位不會來了，排一次比對
+                op = msg.get("operation", {})
+                if op.get("op_code") not in (None, "", "00") or op.get("op_type") == "Cancel":
+                    self._touch()
+        except Exception as e:
+            print(f"⚠️ [Reconciler] 處理 API 回報發生錯誤: {e}")
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._worker.join(timeout=2)
+
+    # ==========================================
+    # 🔧 內部邏輯
+    # ==========================================
+    def _on_deal(self, msg):
+        if not isinstance(msg, dict):
+            # 沒有成交明細可用，只能排一次比對
+            self._touch()
+            return
+
+        code = str(msg.get("full_code") or msg.get("code") or "")
+        if code and self.code_prefix and not code.startswith(self.code_prefix):
+            return
+
+        key = (msg.get("trade_id") or msg.get("seqno"), msg.get("exchange_seq"))
+        qty = int(msg.get("quantity", 0) or 0)
+        delta = qty if "Buy" in str(msg.get("action", "")) else -qty
+
+        with self._cond:
+            if key[0] is not None and key[1] is not None:
+                if key in self._seen_deals:
+                    self.stats["duplicates"] += 1
+                    return
+                if len(self._seen_order) == self._seen_order.maxlen:
+                    self._seen_deals.discard(self._seen_order[0])
+                self._seen_order.append(key)
+                self._seen_deals.add(key)
+            if self.deal_position is None:
+                # 還沒有基準：假設回報之前的影子帳本已扣掉這筆
+                self.deal_position = self.executor.current_position - delta
+            self.deal_position += delta
+            self.stats["deals"] += 1
+            self._dirty = True
+            self._last_event = time.monotonic()
+            self._cond.notify()
+
+        if self.on_deal:
+            self.on_deal(msg)
+
+    def _touch(self):
+        with self._cond:
+            self._dirty = True
+            self._last_event = time.monotonic()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._dirty:
+                    self._cond.wait()
+                if not self._running: return
+
+                # ⏳ 去抖動：等回報安靜 settle 秒 (期間再來的回報會把時間往後推)
+                wait = self._last_event + self.settle - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+
+                expected = self.executor.current_position
+                computed = self.deal_position if self.deal_position is not None else expected
+                if computed == expected:
+                    self._dirty = False
+                    self._mismatch_since = None
+                    self.stats["matched"] += 1
+                    continue
+
+                # 對不上：可能還有委託在路上，先給 verify_after 秒的寬限
+                now = time.monotonic()
+                if self._mismatch_since is None:
+                    self._mismatch_since = now
+                remaining = self._mismatch_since + self.verify_after - now
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                self._dirty = False
+                self._mismatch_since = None
+
+            # 🔍 寬限期過了還對不上 -> 去券商查一次 (鎖外執行，不擋回報)
+            self._verify(computed, expected)
+
+    def _verify(self, computed, expected):
+        self.stats["polls"] += 1
+        try:
+            real_pos = int(self.position_source())
+        except Exception as e:
+            print(f"❌ [Reconciler] 查詢券商部位失敗: {e}")
+            return
+
+        with self._cond:
+            self.deal_position = real_pos
+
+        if real_pos == self.executor.current_position:
+            print(f"✅ [Reconciler] 券商部位 {real_pos} 與影子帳本一致 (回報推算值 {computed} 已校正)")
+            return
+
+        self.stats["corrections"] += 1
+        strategy = self.strategy or self.bot.strategy
+        old_pos = strategy.position
+        strategy.set_position(real_pos)
+
+        # 均價也要跟著對齊：優先用券商成本，查不到用最新報價代替 (總比沿用錯方向的舊均價好)
+        cost = getattr(self.executor, 'get_real_cost', lambda: 0.0)() if real_pos else 0.0
+        basis = self.executor.resync_position(real_pos, cost=cost, fallback=getattr(strategy, 'latest_price', 0.0) or 0.0)
+        if basis is None:
+            basis = "未知"
+            print("⚠️ [Reconciler] 查不到部位成本，均價歸零；未實現損益與下一次平倉損益在 /sync 前都不準")
+        pending = dict(self.executor.pending_orders)
+        if pending:
+            print(f"⚠️ [Reconciler] 校正時仍有在途委託 {pending}，成交後部位會再變動")
+        if hasattr(self.bot, 'publish_snapshot'):
+            self.bot.publish_snapshot()
+
+        msg = f"🔄 **真實成交回報同步**\n舊倉位: {old_pos}\n新倉位: {real_pos} (已對齊券商)"
+        if real_pos:
+            msg += f"\n均價: {self.executor.avg_price:.0f} ({basis})"
+        print(f"✅ {msg.replace('**', '')}")
+        if self.notify and getattr(self.bot, 'commander', None):
+            self.bot.commander.send_message(msg, priority=True)
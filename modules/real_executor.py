@@ -1,9 +1,14 @@
 from core.base_executor import BaseExecutor
 from config.settings import Settings
 import shioaji as sj
-from shioaji import constant, account # 引入 constant 用於判斷下單類型
+from shioaji import constant # 引入 constant 用於判斷下單類型
+from shioaji import account as sj_account # 別名：__init__ 的 account 參數 (分帳) 會蓋掉模組名稱
 import sys
 import os
+import time
+from datetime import datetime
+from core.snapshot import AccountSnapshot
+from modules.order_manager import OrderManager
 
 class RealExecutor(BaseExecutor):
     """
@@ -11,16 +16,43 @@ class RealExecutor(BaseExecutor):
     特色:
     1. 自動掃描期貨帳號 (不再依賴外部傳入)
     2. 支援 CA 憑證自動啟動
-    3. 精準下單參數: 市價(MKT)+IOC / 限價(LMT)+ROD
+    3. 精準下單參數: 市價(MKT)+IOC / 限價(LMT)+ROD (同步模式)
     4. 數值強制轉型 (Decimal -> Float/Int)
+    5. 非同步送單 (async_orders): 委託交給 OrderManager 的送單工人 (單一工人，依序送出)，反手兩腳不等成交接連送出
+    6. 成交驅動帳本: 非同步模式下部位/均價/損益以真實成交回報記帳 (BaseExecutor.on_fill)
+       訊號單一律送「可成交的 IOC」(限價 = 訊號價 ± ioc_buffer 點，沒價格就 MKT)，吃不到的口數由交易所刪除，
+       不會有掛著的 ROD 單讓在途口數永遠不歸零；萬一回報遺失，OrderManager 逾時 order_ttl 秒會自動刪單
+    7. 多商品: 一個合約一本帳 (for_contract 開出共用同一個 API 連線/帳號/憑證的分帳)
     """
-    def __init__(self, api, dry_run=False):
-        # 注意: 我們不再需要從外部傳入 account，因為我們會自己掃描
+    def __init__(self, api, dry_run=False, async_orders=True, sender_threads=1, parallel_reversal=True,
+                 target_contract=None, account=None, ioc_buffer=10.0, order_ttl=10.0):
+        # 注意: 我們不再需要從外部傳入 account，因為我們會自己掃描 (分帳時直接沿用主帳的帳號)
         super().__init__()
         self.api = api
         self.dry_run = dry_run
+        self.target_contract = target_contract or getattr(Settings, "TARGET_CONTRACT", "TMF202603")
+        self.product = self.target_contract[:3]
+        self.POINT_VALUE = float(Settings.POINT_VALUES.get(self.product, self.POINT_VALUE))
         self.contract = None 
-        self.account = None
+        self.account = account
+        self._async_orders = async_orders
+        self._sender_threads = sender_threads
+        self.ioc_buffer = ioc_buffer # 訊號單的 IOC 限價保護點數 (買 = 訊號價 + buffer，賣 = 訊號價 - buffer)
+        self.order_ttl = order_ttl
+
+        # 📮 委託管理員 (Dry Run 不會真的送單，不需要)
+        # parallel_reversal=False 時，反手的開倉腳會等平倉腳完全成交才送
+        self.parallel_reversal = parallel_reversal
+        self.order_manager = None
+        if async_orders and not dry_run:
+            self.order_manager = OrderManager(self._place_ioc_order, sender_threads=sender_threads,
+                                              on_update=self._on_order_update, on_fill=self._on_order_fill,
+                                              cancel_fn=self._cancel_order, order_ttl=order_ttl)
+            # ⚡ 非同步送單 = 成交驅動帳本：部位/均價/損益都等真實成交回報才記
+            self.fill_driven = True
+
+        if account is not None:
+            return # 分帳：帳號與憑證都已由主帳處理好
 
         # ---------------------------------------------------------
         # 1. 帳號掃描 (來自舊版 Trader)
@@ -29,7 +61,7 @@ class RealExecutor(BaseExecutor):
         try:
             all_accounts = self.api.list_accounts()
             for acc in all_accounts:
-                if isinstance(acc, account.FutureAccount):
+                if isinstance(acc, sj_account.FutureAccount):
                     self.account = acc
                     break
             
@@ -80,18 +112,32 @@ class RealExecutor(BaseExecutor):
             return f"{symbol}{month_code}{year_code}"
         except: return target_str
 
+    def for_contract(self, target_contract):
+        """
+        開一本新合約的分帳 (例如 MXF202603，或轉倉期間的次月 TMF)
+        共用同一個 api 連線、期貨帳號與已啟動的憑證，部位/損益/在途委託各自獨立
+        """
+        return RealExecutor(self.api, dry_run=self.dry_run, async_orders=self._async_orders,
+                            sender_threads=self._sender_threads, parallel_reversal=self.parallel_reversal,
+                            target_contract=target_contract, account=self.account,
+                            ioc_buffer=self.ioc_buffer, order_ttl=self.order_ttl)
+
     def _get_contract(self):
-        # (取得合約邏輯保持不變)
         if self.contract is None:
             try:
-                target_setting = getattr(Settings, "TARGET_CONTRACT", "TMF202603")
-                code = self._resolve_shioaji_code(target_setting)
-                self.contract = self.api.Contracts.Futures.TMF[code]
+                code = self._resolve_shioaji_code(self.target_contract)
+                # 依商品代號找合約分類 (TMF / MXF / TXF ...)
+                self.contract = getattr(self.api.Contracts.Futures, self.product)[code]
                 print(f"📄 [RealExecutor] 鎖定合約: {self.contract.name} ({self.contract.code})")
             except Exception as e:
                 print(f"❌ [RealExecutor] 取得合約失敗: {e}")
         return self.contract
 
+    def contract_code(self):
+        """券商端的合約代碼 (例如 TMFC6)；查不到合約時退回商品代號"""
+        contract = self._get_contract()
+        return contract.code if contract else self.product
+
     def _execute_impl(self, direction, qty, price):
         """
         [實作] 真實下單 (融合舊版 Trader 邏輯)
@@ -100,8 +146,7 @@ class RealExecutor(BaseExecutor):
         if not contract: return False, 0.0, "找不到合約"
         if not self.account: return False, 0.0, "無有效帳號"
 
-        # 1. 動作轉換
-        action_enum = constant.Action.Buy if direction == "BUY" else constant.Action.Sell
+        # 1. 動作轉換 (在 _place_order 裡做)
         
         # 2. 價格類型與委託條件 (關鍵修正！)
         # 如果 Engine 傳來的 price 是 0，或者是某些特定策略要求市價
@@ -123,20 +168,9 @@ class RealExecutor(BaseExecutor):
             msg = f"[Dry Run] 模擬真實下單: {direction} {qty}口 @ {input_price} ({p_type}, {o_type})"
             return True, input_price, msg
 
-        # 4. 真實下單
+        # 4. 真實下單 (同步模式；非同步模式走 _submit_impl)
         try:
-            order = self.api.Order(
-                price=input_price,
-                quantity=qty,
-                action=action_enum,
-                price_type=p_type,
-                order_type=o_type, 
-                oct_type=constant.FuturesOCType.Auto, # 自動判斷新平倉
-                account=self.account
-            )
-            
-            # print(f"🚀 [Real] 送出訂單: {direction} {qty} @ {input_price}")
-            trade = self.api.place_order(contract, order)
+            trade = self._place_order(direction, qty, input_price)
             
             # 這裡簡單回傳委託成功，實際上可能要等 callback
             msg = f"[Real] 委託成功 ID: {trade.order.id}"
@@ -145,6 +179,65 @@ class RealExecutor(BaseExecutor):
         except Exception as e:
             return False, 0.0, f"API Error: {e}"
 
+    def _place_order(self, direction, qty, input_price, ioc=False):
+        """組出 Shioaji 委託並呼叫 place_order (同步，會等 API 回傳)；ioc=True 時限價單也配 IOC"""
+        contract = self._get_contract()
+        action_enum = constant.Action.Buy if direction == "BUY" else constant.Action.Sell
+        if input_price <= 0:
+            p_type, o_type = constant.FuturesPriceType.MKT, constant.OrderType.IOC
+        else:
+            p_type = constant.FuturesPriceType.LMT
+            o_type = constant.OrderType.IOC if ioc else constant.OrderType.ROD
+        order = self.api.Order(
+            price=input_price,
+            quantity=qty,
+            action=action_enum,
+            price_type=p_type,
+            order_type=o_type, 
+            oct_type=constant.FuturesOCType.Auto, # 自動判斷新平倉
+            account=self.account
+        )
+        # print(f"🚀 [Real] 送出訂單: {direction} {qty} @ {input_price}")
+        return self.api.place_order(contract, order)
+
+    def _place_ioc_order(self, direction, qty, input_price):
+        """[成交驅動模式] 訊號單：限價加上保護點數變成可成交的 IOC，當下吃不到的口數直接由交易所刪除"""
+        if input_price > 0:
+            input_price += self.ioc_buffer if direction == "BUY" else -self.ioc_buffer
+        return self._place_order(direction, qty, input_price, ioc=True)
+
+    def _cancel_order(self, trade):
+        """OrderManager 逾時刪單 -> api.cancel_order (結果由委託回報的 Cancel 帶回來)"""
+        self.api.cancel_order(trade)
+
+    def _cancel_impl(self, order_id):
+        """[成交驅動模式] 刪單交給 OrderManager (還沒送出的直接取消，已送出的呼叫 api.cancel_order)"""
+        order = self.order_manager.orders.get(order_id)
+        if order is not None:
+            self.order_manager.cancel(order)
+
+    def _submit_impl(self, direction, qty, price, after=None):
+        """[成交驅動模式] 排進 OrderManager 的送單佇列就回來，不等成交"""
+        if not self._get_contract(): return False, None, "找不到合約"
+        if not self.account: return False, None, "無有效帳號"
+        input_price = price if price > 0 else 0 # price=0 代表市價
+        order = self.order_manager.submit(direction, qty, input_price, after=after)
+        return True, order.local_id, f"[Real] 委託已排入送單佇列 #{order.local_id}"
+
+    def _on_order_fill(self, order, qty, price):
+        """OrderManager 收到成交回報 -> 影子帳本記帳"""
+        self.on_fill(order.direction, qty, price, order_id=order.local_id)
+
+    def _on_order_update(self, order):
+        """委託結束 (拒單/刪單/IOC 剩餘取消) -> 沒成交的口數不再算在途"""
+        if order.status.is_done:
+            self.on_order_done(order.local_id)
+
+    def on_order_event(self, stat, msg):
+        """券商回報 -> 委託狀態追蹤 (由 main_live 的回報分派器呼叫)"""
+        if self.order_manager:
+            self.order_manager.on_order_event(stat, msg)
+
     def get_balance(self):
         """查詢權益數 (使用舊版 margin 邏輯)"""
         try:
@@ -158,21 +251,30 @@ class RealExecutor(BaseExecutor):
             print(f"❌ 查詢餘額失敗: {e}")
             return 0
 
+    def _summarize_positions(self, positions):
+        """把 list_positions 的結果整理成 (淨口數, 平均成本, 未實現損益)，只算這本帳的合約"""
+        net_qty = 0
+        total_qty = 0
+        total_cost = 0.0
+        pnl = 0.0
+        code = self.contract_code()
+        for p in positions:
+            if p.code == code or (code == self.product and self.product in p.code): # 只算本合約 (轉倉期間近遠月分開算)
+                qty = int(p.quantity) # 強制轉 int
+                price = float(p.price) # 永豐 API 回傳的真實成本價
+                net_qty += -qty if p.direction == constant.Action.Sell else qty
+                total_qty += qty
+                total_cost += price * qty
+                pnl += float(getattr(p, 'pnl', 0.0) or 0.0)
+        avg_cost = total_cost / total_qty if total_qty > 0 else 0.0
+        return net_qty, avg_cost, pnl
+
     def get_position(self):
         """查詢真實持倉 (使用舊版 list_positions 邏輯)"""
         try:
             if not self.account: return 0
-            
             positions = self.api.list_positions(self.account)
-            total_qty = 0
-            
-            for p in positions:
-                if "TMF" in p.code:
-                    qty = int(p.quantity) # 強制轉 int
-                    if p.direction == constant.Action.Sell:
-                        qty = -qty
-                    total_qty += qty
-            return total_qty
+            return self._summarize_positions(positions)[0]
         except Exception as e:
             print(f"❌ 查詢持倉失敗: {e}")
             return 0
@@ -184,25 +286,29 @@ class RealExecutor(BaseExecutor):
         """
         try:
             if not self.account: return 0.0
-            
             positions = self.api.list_positions(self.account)
-            total_cost = 0.0
-            total_qty = 0
-            
-            for p in positions:
-                if "TMF" in p.code: # 確保是我們關注的微型台指期
-                    qty = int(p.quantity)
-                    price = float(p.price) # 永豐 API 回傳的真實成本價
-                    
-                    total_qty += qty
-                    total_cost += (price * qty)
-            
-            # 如果有部位，計算加權平均成本
-            if total_qty > 0:
-                return total_cost / total_qty
-            else:
-                return 0.0
-                
+            return self._summarize_positions(positions)[1]
         except Exception as e:
             print(f"❌ 查詢真實成本失敗: {e}")
-            return 0.0
\ No newline at end of file
+            return 0.0
+
+    def fetch_account_snapshot(self):
+        """
+        一次批次抓回「持倉 + 保證金」(各一次 API)，組成 AccountSnapshot
+        給 AccountSnapshotService 在背景呼叫；失敗時直接丟例外，由呼叫端決定怎麼處理
+        """
+        if not self.account:
+            raise RuntimeError("無有效帳號")
+        t0 = time.perf_counter()
+        positions = self.api.list_positions(self.account)
+        margin = self.api.margin(self.account)
+        net_qty, avg_cost, pnl = self._summarize_positions(positions)
+        return AccountSnapshot(
+            position=net_qty,
+            avg_cost=avg_cost,
+            unrealized_pnl=pnl,
+            equity=float(margin.equity),
+            available_margin=float(getattr(margin, 'available_margin', 0.0) or 0.0),
+            fetched_at=datetime.now(),
+            fetch_ms=(time.perf_counter() - t0) * 1000,
+        )
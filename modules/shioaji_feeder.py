@@ -1,7 +1,8 @@
 import shioaji as sj
 from config.settings import Settings
 from datetime import datetime, timedelta
-import pandas as pd
+import numpy as np
+from core.bar_store import BAR_DTYPE, bars_from_kbars
 
 class ShioajiFeeder:
     """
@@ -14,6 +15,11 @@ class ShioajiFeeder:
         self.on_bar_callback = None # 雖然主要餵 Tick，但預留 Bar 介面
         self.target_code = getattr(Settings, "TARGET_CONTRACT", "TMF202603")
         self.contract = None
+        # 🔀 多合約：引擎 symbol (例如 TMF202603) -> 合約物件；券商代碼 (TMFC6) -> 引擎 symbol
+        self.targets = [self.target_code]
+        self.contracts = {}
+        self._code_map = {}
+        self.tick_recorder = None   # 📼 掛上 TickRecorder 就會把收到的每筆 Tick 錄下來
         
         # 綁定 API 的 callback 到自己的處理函式
         self.api.quote.set_on_tick_fop_v1_callback(self._on_tick_arrived)
@@ -25,82 +31,87 @@ class ShioajiFeeder:
     def set_on_bar(self, callback):
         self.on_bar_callback = callback
 
+    def add_contract(self, target):
+        """多訂閱一個合約 (例如 MXF202603)；connect 之後才加的會立刻解析並訂閱"""
+        if target in self.targets: return
+        self.targets.append(target)
+        if self.contracts:
+            contract = self._load_contract(target)
+            if contract: self._subscribe_contract(contract)
+
     def connect(self):
         """
         Feeder 連線
         (因為 api 是外部傳入且已連線，這裡主要用來確認合約是否存在)
         """
-        print(f"🔌 [Feeder] 準備訂閱行情: {self.target_code}")
-        
+        print(f"🔌 [Feeder] 準備訂閱行情: {', '.join(self.targets)}")
+        for target in self.targets:
+            self._load_contract(target)
+        self.contract = self.contracts.get(self.target_code)
+
+    def _load_contract(self, target):
         # 嘗試解析合約 (使用簡易版邏輯，或與 Executor 共用)
         # 這裡我們直接用與 RealExecutor 類似的邏輯找合約
         try:
-            # 1. 簡易解析: TMF202603 -> TMFC6
-            code = self._resolve_code(self.target_code)
-            self.contract = self.api.Contracts.Futures.TMF[code]
-            print(f"📄 [Feeder] 鎖定行情合約: {self.contract.name} ({self.contract.code})")
+            # 1. 簡易解析: TMF202603 -> TMFC6，再依商品代號 (TMF/MXF/TXF) 找合約分類
+            code = self._resolve_code(target)
+            contract = getattr(self.api.Contracts.Futures, target[:3])[code]
+            self.contracts[target] = contract
+            self._code_map[contract.code] = target
+            print(f"📄 [Feeder] 鎖定行情合約: {contract.name} ({contract.code})")
+            return contract
         except Exception as e:
-            print(f"❌ [Feeder] 找不到合約 {self.target_code}: {e}")
+            print(f"❌ [Feeder] 找不到合約 {target}: {e}")
+            return None
 
-    def fetch_kbars(self, start_date: str) -> list:
+    def fetch_kbars(self, start_date: str, symbol=None) -> np.ndarray:
         """
         [新增功能] 從 API 抓取歷史/近期 K 棒 (1分K)
         :param start_date: 字串格式 'YYYY-MM-DD'
-        :return: list of dict [{'datetime':..., 'close':...}, ...]
+        :param symbol: 哪個合約 (預設主合約)
+        :return: BAR_DTYPE 紀錄陣列 (core/bar_store.py，依時間排序)；引擎用 searchsorted 直接切出新的那段
         """
-        if not self.contract:
+        contract = self.contracts.get(symbol, self.contract) if symbol else self.contract
+        if not contract:
             print("❌ [Feeder] 無合約物件，無法抓取 K 棒")
-            return []
+            return np.zeros(0, dtype=BAR_DTYPE)
 
         print(f"🔄 [Feeder] 正在向永豐 API 請求 K 棒 (Start: {start_date})...")
         
         try:
             # 呼叫 Shioaji kbars API
             kbars = self.api.kbars(
-                contract=self.contract, 
+                contract=contract, 
                 start=start_date, 
                 end=datetime.now().strftime("%Y-%m-%d") # 抓到今天
             )
             
-            # 轉成 DataFrame
-            df = pd.DataFrame({**kbars})
-            if df.empty:
+            # ts 本來就是奈秒時間戳，整批轉成紀錄陣列 (不再 to_dict('records') 一根一個 dict)
+            records = bars_from_kbars(kbars)
+            if len(records) == 0:
                 print("⚠️ [Feeder] API 回傳無資料")
-                return []
+                return records
 
-            # 轉換時間欄位 (ts 是奈秒 timestamp)
-            df.ts = pd.to_datetime(df.ts)
-            
-            # 轉換欄位名稱以符合 BarEvent 標準
-            df.rename(columns={
-                'ts': 'datetime', 
-                'Open': 'open', 
-                'High': 'high', 
-                'Low': 'low', 
-                'Close': 'close', 
-                'Volume': 'volume'
-            }, inplace=True)
-
-            # 轉成 list of dict
-            result_list = df.to_dict('records')
-            print(f"✅ [Feeder] 成功取得 {len(result_list)} 根 K 棒")
-            
-            return result_list
+            print(f"✅ [Feeder] 成功取得 {len(records)} 根 K 棒")
+            return records
 
         except Exception as e:
             print(f"❌ [Feeder] 抓取 K 棒失敗: {e}")
-            return []
+            return np.zeros(0, dtype=BAR_DTYPE)
         
     def subscribe(self, symbol=None):
-        """開始訂閱"""
-        if not self.contract:
+        """開始訂閱 (所有已解析的合約)"""
+        if not self.contracts:
             print("❌ [Feeder] 無合約物件，無法訂閱")
             return
+        for contract in self.contracts.values():
+            self._subscribe_contract(contract)
 
-        print(f"📡 [Feeder] 訂閱即時報價 (L1): {self.contract.code}")
+    def _subscribe_contract(self, contract):
+        print(f"📡 [Feeder] 訂閱即時報價 (L1): {contract.code}")
         try:
             self.api.quote.subscribe(
-                self.contract, 
+                contract, 
                 quote_type=sj.constant.QuoteType.Tick,
                 version=sj.constant.QuoteVersion.v1
             )
@@ -113,10 +124,12 @@ class ShioajiFeeder:
 
     def stop(self):
         """停止"""
-        if self.contract:
-            print(f"🔕 [Feeder] 取消訂閱: {self.contract.code}")
+        if self.tick_recorder:
+            self.tick_recorder.stop()
+        for contract in self.contracts.values():
+            print(f"🔕 [Feeder] 取消訂閱: {contract.code}")
             try:
-                self.api.quote.unsubscribe(self.contract, quote_type=sj.constant.QuoteType.Tick)
+                self.api.quote.unsubscribe(contract, quote_type=sj.constant.QuoteType.Tick)
             except:
                 pass
 
@@ -124,12 +137,22 @@ class ShioajiFeeder:
         """
         Shioaji 回傳的原始 Tick 處理
         """
-        # 確保有 callback 對象
-        if not self.on_tick_callback:
+        # 過濾商品 (只處理我們訂閱的)，順便查出引擎用的 symbol (一次 dict 查詢)
+        symbol = self._code_map.get(tick.code)
+        if symbol is None:
             return
 
-        # 過濾商品 (只處理我們訂閱的)
-        if self.contract and tick.code != self.contract.code:
+        # 📼 錄影 (只排隊，真正寫檔在背景執行緒)
+        if self.tick_recorder:
+            try:
+                self.tick_recorder.record(tick.datetime, float(tick.close), int(tick.volume),
+                                          float(getattr(tick, 'bid_price', 0) or 0), float(getattr(tick, 'ask_price', 0) or 0),
+                                          symbol=symbol)
+            except Exception:
+                pass
+
+        # 確保有 callback 對象
+        if not self.on_tick_callback:
             return
 
         # 轉換資料格式 (Raw -> Standard Dict)
@@ -144,6 +167,7 @@ class ShioajiFeeder:
             
             # 包裝成簡單的 Dict 傳給 Aggregator
             tick_data = {
+                'symbol': symbol,
                 'datetime': tick_time,
                 'price': price,
                 'volume': qty,
@@ -0,0 +1,89 @@
+import atexit
+import threading
+import time
+from collections import deque
+import numpy as np
+from core.tick_store import TickStore, TICK_DTYPE
+
+class TickRecorder:
+    """
+    即時 Tick 錄影機 (寫入 core/tick_store.py 的二進位格式)
+    1. record() 在行情回呼執行緒上只做一次 deque.append (幾百奈秒)，不碰檔案、不轉格式
+    2. 背景寫手每 flush_interval 秒把累積的 Tick 一次轉成 numpy 陣列，依商品/日期接到 {symbol}/{symbol}_{YYYYMMDD}.tick
+    3. TickStore 會順手維護 .idx 盤別索引，之後回測可以直接 memmap + 只挑日盤/夜盤回放
+    """
+    def __init__(self, symbol, root="data/ticks", flush_interval=0.5):
+        self.symbol = symbol
+        self.store = TickStore(root)
+        self.flush_interval = flush_interval
+
+        self._queue = deque()
+        self._running = False
+        self._thread = None
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+
+        self.recorded = 0       # 收到幾筆 (回呼執行緒計數)
+        self.written = 0        # 寫進檔案幾筆
+        self.errors = 0
+        self.last_flush_ms = 0.0
+
+    def record(self, dt, price, volume, bid=0.0, ask=0.0, symbol=None):
+        """(行情回呼執行緒) 只排隊，不做任何轉換；symbol 不給就記在預設商品底下"""
+        self._queue.append((dt, price, volume, bid, ask, symbol or self.symbol))
+        self.recorded += 1
+
+    def start(self):
+        if self._running: return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="TickRecorder", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop) # 程式結束前把最後一批寫完
+        print(f"📼 [TickRecorder] 開始錄製 {self.symbol} -> {self.store.root}")
+        return self
+
+    def stop(self, timeout=2.0):
+        if not self._running: return
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.flush()
+        print(f"📼 [TickRecorder] 停止錄製，共寫入 {self.written:,} 筆")
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """把目前排隊的 Tick 全部寫進檔案 (背景寫手定時呼叫，也可手動呼叫)"""
+        with self._flush_lock:
+            n = len(self._queue)
+            if n == 0: return 0
+            t0 = time.perf_counter()
+            popleft = self._queue.popleft
+            items = [popleft() for _ in range(n)]
+            try:
+                dts, prices, volumes, bids, asks, symbols = zip(*items)
+                records = np.empty(n, dtype=TICK_DTYPE)
+                records["ts"] = np.array(dts, dtype="datetime64[us]").astype("datetime64[ns]").view("<i8")
+                records["price"] = prices
+                records["volume"] = volumes
+                records["bid"] = bids
+                records["ask"] = asks
+                if len(set(symbols)) == 1:
+                    self.store.write(symbols[0], records)
+                else:
+                    # 多合約：依商品分開寫 (各自保持時間順序)
+                    sym_arr = np.array(symbols)
+                    for sym in dict.fromkeys(symbols):
+                        self.store.write(sym, records[sym_arr == sym])
+                self.written += n
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ [TickRecorder] 寫入失敗 ({n} 筆): {e}")
+                return 0
+            self.last_flush_ms = (time.perf_counter() - t0) * 1e3
+            return n
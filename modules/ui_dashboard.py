@@ -1,5 +1,8 @@
+import os
 import sys
 import time
+import queue
+import atexit
 import threading
 from collections import deque
 from datetime import datetime
@@ -11,23 +14,42 @@ from rich.text import Text
 from rich.console import Console
 
 class LogInterceptor:
-    """魔法攔截器：支援雙向分流 (Tee) 與 UI 接管模式"""
-    def __init__(self, log_file="data/backtest_results/live_process.log"):
+    """
+    魔法攔截器：支援雙向分流 (Tee) 與 UI 接管模式
+    寫檔改為「佇列 + 背景書記官」：
+    1. write() 只把文字丟進佇列，任何執行緒 (包含 Shioaji 報價回呼) 都不會卡在磁碟 I/O
+    2. 背景執行緒持有長駐的緩衝檔案把手，批次寫入並定期 fsync
+    3. 檔案超過大小上限時自動輪替 (live_process.log -> .1 -> .2 ...)
+    """
+    def __init__(self, log_file="data/backtest_results/live_process.log",
+                 max_bytes=20 * 1024 * 1024, backup_count=5, fsync_interval=2.0):
         self.logs = deque(maxlen=15)
         self.original_stdout = sys.stdout
         self.original_stderr = sys.stderr
         self.log_file = log_file
         self.ui_active = False # 🚀 新增開關：儀表板是否已接管畫面？
+        self.version = 0       # 📸 每多一行 Log 就 +1，儀表板靠它判斷日誌區要不要重畫
+
+        # 🗄️ 背景書記官設定
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.fsync_interval = fsync_interval
+        self._queue = queue.SimpleQueue() # C 實作的無鎖佇列，put 永遠不會阻塞
+        self._closed = False
+        self._writer = threading.Thread(target=self._writer_loop, name="LogWriter", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
 
     def write(self, text):
         if text.strip():
             time_str = datetime.now().strftime("%H:%M:%S")
             log_line = f"[{time_str}] {text.strip()}"
             self.logs.append(log_line)
+            self.version += 1
             
-            # 1. 永遠寫入實體檔案 (確保 log 不漏接)
-            with open(self.log_file, "a", encoding="utf-8") as f:
-                f.write(log_line + "\n")
+            # 1. 永遠寫入實體檔案 (交給背景書記官，呼叫端不碰磁碟)
+            if not self._closed:
+                self._queue.put(log_line + "\n")
             
             # 2. 🚀 分流邏輯：如果儀表板還沒開，就照常印在傳統終端機上
             if not self.ui_active:
@@ -37,28 +59,126 @@ class LogInterceptor:
         if not self.ui_active:
             self.original_stdout.flush()
 
+    def close(self, timeout=3.0):
+        """收工：通知背景書記官把佇列寫完、fsync 後關檔"""
+        if self._closed: return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    # ==========================================
+    # 🗄️ 背景書記官 (唯一碰磁碟的執行緒)
+    # ==========================================
+    def _open_file(self):
+        log_dir = os.path.dirname(self.log_file)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        f = open(self.log_file, "a", encoding="utf-8", buffering=1024 * 1024)
+        return f, f.tell()
+
+    def _rotate(self, f):
+        """大小輪替：live_process.log -> .1 -> .2 ... (超過 backup_count 的直接丟掉)"""
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = f"{self.log_file}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.log_file}.{i + 1}")
+            os.replace(self.log_file, f"{self.log_file}.1")
+        else:
+            os.remove(self.log_file)
+        return self._open_file()
+
+    def _writer_loop(self):
+        try:
+            f, size = self._open_file()
+        except Exception as e:
+            # 書記官罷工 -> 標記關閉，write() 不再往佇列丟 (不然佇列會無限長大)，已排隊的也清掉
+            self._closed = True
+            self.original_stderr.write(f"⚠️ [LogInterceptor] 無法開啟 Log 檔，停止寫檔: {e}\n")
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            return
+
+        last_sync = time.monotonic()
+        dirty = False
+        running = True
+        while running:
+            try:
+                line = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                line = ""
+
+            # 一次把佇列裡累積的行全部撈出來，批次寫入
+            batch = []
+            while line is not None:
+                if line: batch.append(line)
+                try:
+                    line = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if line is None:
+                running = False
+
+            try:
+                if batch:
+                    chunk = "".join(batch)
+                    f.write(chunk)
+                    size += len(chunk.encode("utf-8"))
+                    dirty = True
+                    if self.max_bytes and size >= self.max_bytes:
+                        f, size = self._rotate(f)
+                        dirty = False
+                        last_sync = time.monotonic()
+
+                # ⏱️ 定期落地：flush + fsync，斷電也最多只掉幾秒的 Log
+                now = time.monotonic()
+                if dirty and (not running or now - last_sync >= self.fsync_interval):
+                    f.flush()
+                    os.fsync(f.fileno())
+                    dirty = False
+                    last_sync = now
+            except Exception as e:
+                self.original_stderr.write(f"⚠️ [LogInterceptor] 寫入 Log 失敗: {e}\n")
+
+        f.close()
+
 class DashboardUI:
+    """
+    戰術儀表板 (髒旗標重畫版)
+    - 上半部只讀 Engine 發布的唯讀快照 (EngineSnapshot)，快照 version 沒變就不重建表格
+    - 下半部只在 Log 攔截器的 version 改變時重畫
+    - Layout 骨架只建一次，每幀只替換有變動的 Panel；重畫頻率有上限，不跟報價執行緒搶 GIL
+    """
     # 🚀 加上 interceptor=None，如果外部有傳進來，就用外部的；沒有就自己建一個
-    def __init__(self, bot, interceptor=None):
+    def __init__(self, bot, interceptor=None, max_fps=4):
         self.bot = bot
         self.interceptor = interceptor if interceptor else LogInterceptor()
+        self.min_frame_interval = 1.0 / max_fps
+
+        # 📸 請引擎開始發布快照，並先拍第一張
+        self.bot.publish_snapshots = True
+        self.bot.publish_snapshot()
 
-    def generate_layout(self) -> Layout:
-        """每次畫面更新時，重新組裝儀表板"""
-        layout = Layout()
-        layout.split_column(
+        # 🦴 骨架只建一次，之後每幀重複使用
+        self.layout = Layout()
+        self.layout.split_column(
             Layout(name="upper", ratio=1), # 上半部：儀表板
             Layout(name="lower", ratio=1)  # 下半部：日誌區
         )
+        self._drawn_upper_key = None
+        self._drawn_log_version = None
 
-        # === 建立上半部：數據表格 ===
-        st = self.bot.strategy
-        ex = getattr(self.bot, 'executor', None) # 👈 找到掌管資金的執行官
-        
-        # 優先讀取 Executor 的真實部位，如果拿不到，才去讀策略的影子部位
-        pos = getattr(ex, 'current_position', getattr(st, 'position', 0))
-
+    def _build_upper_panel(self, snap, clock_str) -> Panel:
+        """依快照組裝上半部數據表格"""
+        pos = snap.position
         pos_str = "[green]🟩 做多[/green]" if pos > 0 else "[red]🟥 做空[/red]" if pos < 0 else "[white]⬜ 空手[/white]"
+        run_str = "🟢 監聽中" if snap.auto_trading else "🟠 已暫停"
         
         table = Table(show_header=False, expand=True, box=None)
         table.add_column("Key1", style="cyan", width=15)
@@ -66,35 +186,59 @@ class DashboardUI:
         table.add_column("Key2", style="cyan", width=15)
         table.add_column("Val2", width=25)
 
-        table.add_row("🤖 策略名稱:", f"{st.name}", "🕒 系統時間:", f"{datetime.now().strftime('%H:%M:%S')}")
-        table.add_row("💼 目前部位:", f"{pos_str} (Qty: {pos})", "⚙️ 運行狀態:", "🟢 監聽中")
-        
-        # 🚀 魔法在這裡：向策略索取專屬的儀表板數據！
-        # 如果這個策略有寫 get_ui_dict()，就抓它的資料；如果沒有，就顯示預設訊息
-        metrics = getattr(st, 'get_ui_dict', lambda: {"提示": "本策略尚未提供監控指標"})()
+        table.add_row("🤖 策略名稱:", f"{snap.strategy_name}", "🕒 系統時間:", clock_str)
+        table.add_row("💼 目前部位:", f"{pos_str} (Qty: {pos})", "⚙️ 運行狀態:", run_str)
+
+        # 🏦 券商帳務 (背景快取，附上資料新鮮度)
+        acct = snap.account
+        if acct is not None:
+            if acct.fetched_at is None:
+                table.add_row("🏦 券商權益:", "[dim]尚未取得[/dim]", "🏦 券商部位:", "[dim]-[/dim]")
+            else:
+                age_str = f"[red]{acct.age():.0f}s 前 ⚠️[/red]" if acct.error else f"[dim]{acct.age():.0f}s 前[/dim]"
+                table.add_row("🏦 券商權益:", f"${acct.equity:,.0f} {age_str}",
+                              "🏦 券商部位:", f"{acct.position} (未實現 ${acct.unrealized_pnl:,.0f})")
         
-        # 把策略給我們的字典，動態填入兩欄式的表格裡
-        items = list(metrics.items())
+        # 把策略給我們的指標 (快照裡已轉好字串)，動態填入兩欄式的表格裡
+        items = snap.metrics
         for i in range(0, len(items), 2):
             k1, v1 = items[i]
             k2, v2 = items[i+1] if i+1 < len(items) else ("", "")
-            # 替換前：
-            # table.add_row(f"📊 {k1}:", str(v1), f"📊 {k2}:" if k2 else "", str(v2))
-            # 替換後 (讓大腦傳來的 Emoji 完美呈現)：
-            table.add_row(f"{k1}:", str(v1), f"{k2}:" if k2 else "", str(v2))
+            table.add_row(f"{k1}:", v1, f"{k2}:" if k2 else "", v2)
 
-        upper_panel = Panel(table, title="[bold yellow]🚀 TaiEx Bot V3 戰術儀表板[/bold yellow]", border_style="blue")
-        layout["upper"].update(upper_panel)
+        return Panel(table, title="[bold yellow]🚀 TaiEx Bot V3 戰術儀表板[/bold yellow]", border_style="blue")
 
+    def _build_lower_panel(self) -> Panel:
         # 🚀 視覺修復：強制只拿「最後 8 行」，確保在任何螢幕尺寸下，
         # 最新的 Live 訊息絕對不會被擠到螢幕底下隱藏起來！
-        safe_logs = list(self.interceptor.logs)[-8:] 
+        logs = self.interceptor.logs
+        safe_logs = [logs[i] for i in range(max(0, len(logs) - 8), len(logs))]
         
         log_text = Text("\n".join(safe_logs))
-        lower_panel = Panel(log_text, title="[bold white]📝 系統執行日誌 (Live)[/bold white]", border_style="green")
-        layout["lower"].update(lower_panel)
+        return Panel(log_text, title="[bold white]📝 系統執行日誌 (Live)[/bold white]", border_style="green")
+
+    def generate_layout(self) -> bool:
+        """
+        只更新有變動的區塊，回傳這一幀是否真的有東西要重畫
+        (上半部的 key = 快照版本 + 時鐘秒數；下半部的 key = Log 版本)
+        """
+        dirty = False
+        snap = self.bot.snapshot
+        clock_str = datetime.now().strftime('%H:%M:%S')
+
+        upper_key = (snap.version, clock_str)
+        if upper_key != self._drawn_upper_key:
+            self.layout["upper"].update(self._build_upper_panel(snap, clock_str))
+            self._drawn_upper_key = upper_key
+            dirty = True
+
+        log_version = self.interceptor.version
+        if log_version != self._drawn_log_version:
+            self.layout["lower"].update(self._build_lower_panel())
+            self._drawn_log_version = log_version
+            dirty = True
 
-        return layout
+        return dirty
 
     def start_ui(self, bot_thread=None):
         """啟動儀表板 (支援與背景引擎連動)"""
@@ -113,26 +257,30 @@ class DashboardUI:
         from rich.console import Console
         custom_console = Console(file=self.interceptor.original_stdout)
         
-        # 2. 啟動 Rich Live 畫面
+        # 2. 啟動 Rich Live 畫面 (關閉自動刷新，只有髒了才手動 refresh)
+        self.generate_layout()
         with Live(
-            self.generate_layout(), 
+            self.layout, 
             console=custom_console, 
-            refresh_per_second=2, 
+            auto_refresh=False,
             screen=True,
             redirect_stdout=False,   # 👈 補上這行
             redirect_stderr=False    # 👈 補上這行
         ) as live:
             try:
+                live.refresh()
                 while True:
                     # 🚀 模擬回測支援：如果背景引擎跑完死掉了，儀表板就跟著自動下班
                     if bot_thread and not bot_thread.is_alive():
                         break 
                         
-                    live.update(self.generate_layout())
-                    time.sleep(0.5)
+                    # ⏱️ 節流：每幀至少間隔 min_frame_interval，且只有版本變了才重畫
+                    if self.generate_layout():
+                        live.refresh()
+                    time.sleep(self.min_frame_interval)
             except KeyboardInterrupt:
                 pass
             finally:
                 # 3. 程式結束時，把 print 還給系統
                 sys.stdout = self.interceptor.original_stdout
-                sys.stderr = self.interceptor.original_stderr # 🚀 新增：歸還 stderr
\ No newline at end of file
+                sys.stderr = self.interceptor.original_stderr # 🚀 新增：歸還 stderr
@@ -1,8 +1,8 @@
-import pandas as pd
 import numpy as np
 from collections import deque
 from core.base_strategy import BaseStrategy
 from core.event import BarEvent, SignalEvent, SignalType, EventType
+from core.indicators import bucket_start, ma_kind
 
 class AsymMaAdxStrategy(BaseStrategy):
     """
@@ -72,8 +72,6 @@ class AsymMaAdxStrategy(BaseStrategy):
         self.cached_vol_ma = None
         self.cached_current_vol = None
 
-        self.bars_resampled = deque(maxlen=25000) 
-        self.temp_1m_bars = []                  
 
         # 防守記憶
         self.highest_price = 0.0
@@ -85,6 +83,10 @@ class AsymMaAdxStrategy(BaseStrategy):
     def on_bar(self, bar: BarEvent) -> SignalEvent:
         self.latest_price = bar.close
         current_price = bar.close
+
+        # 📐 共用指標登記處：每根 1 分 K 都要餵 (別的策略已經餵過同一根會自動跳過)
+        frame = self.indicator_frame(self.resample_min)
+        frame.update(bar)
         
         # ==========================================
         # 🛡️ 執行層：硬停損 & 移動停利
@@ -116,64 +118,25 @@ class AsymMaAdxStrategy(BaseStrategy):
         # ==========================================
         # ⚙️ 運算層：雙腦指標計算 (60分K)
         # ==========================================
-        bucket_minute = (bar.timestamp.minute // self.resample_min) * self.resample_min
-        bucket_time = bar.timestamp.replace(minute=bucket_minute, second=0, microsecond=0)
+        bucket_time = bucket_start(bar.timestamp, self.resample_min)
 
         if self.current_bucket_time != bucket_time:
-            if self.temp_1m_bars:
-                self.bars_resampled.append({
-                    'high': max(b.high for b in self.temp_1m_bars),
-                    'low': min(b.low for b in self.temp_1m_bars),
-                    'close': self.temp_1m_bars[-1].close,
-                    'volume': sum(b.volume for b in self.temp_1m_bars)
-                })
-            
-            self.temp_1m_bars = [bar]
             self.current_bucket_time = bucket_time
 
             max_window = max(self.slow_window_long, self.slow_window_short) + max(self.adx_period, self.vol_ma_period) * 2
-            if len(self.bars_resampled) >= max_window:
-                df_resampled = pd.DataFrame(self.bars_resampled)
-                
-                # 計算快線
-                if self.ma_type_fast == "EMA":
-                    self.cached_ma_fast = df_resampled['close'].ewm(span=self.fast_window, adjust=False).mean().iloc[-1]
-                else:
-                    self.cached_ma_fast = df_resampled['close'].rolling(window=self.fast_window).mean().iloc[-1]
+            n = frame.count_at(bar.timestamp)
+            if n >= max_window:
+                ind = self.indicator_keys
+                # 快線 + 雙慢線 (登記處共用，同參數只算一次)
+                self.cached_ma_fast = frame.value(ind['fast'], n)
+                self.cached_ma_slow_long = frame.value(ind['slow_long'], n)
+                self.cached_ma_slow_short = frame.value(ind['slow_short'], n)
+                self.cached_adx = frame.value(ind['adx'], n)
 
-                # 計算 雙慢線
-                if self.ma_type_slow == "EMA":
-                    self.cached_ma_slow_long = df_resampled['close'].ewm(span=self.slow_window_long, adjust=False).mean().iloc[-1]
-                    self.cached_ma_slow_short = df_resampled['close'].ewm(span=self.slow_window_short, adjust=False).mean().iloc[-1]
-                else:
-                    self.cached_ma_slow_long = df_resampled['close'].rolling(window=self.slow_window_long).mean().iloc[-1]
-                    self.cached_ma_slow_short = df_resampled['close'].rolling(window=self.slow_window_short).mean().iloc[-1]
+                # 大顆粒成交量
+                self.cached_vol_ma = frame.value(ind['vol_ma'], n)
+                self.cached_current_vol = frame.volume[n - 1]
 
-                # 計算 ADX
-                df_adx = df_resampled.copy()
-                df_adx['prev_close'] = df_adx['close'].shift(1)
-                df_adx['tr1'] = df_adx['high'] - df_adx['low']
-                df_adx['tr2'] = (df_adx['high'] - df_adx['prev_close']).abs()
-                df_adx['tr3'] = (df_adx['low'] - df_adx['prev_close']).abs()
-                df_adx['tr'] = df_adx[['tr1', 'tr2', 'tr3']].max(axis=1)
-                df_adx['up_move'] = df_adx['high'] - df_adx['high'].shift(1)
-                df_adx['down_move'] = df_adx['low'].shift(1) - df_adx['low']
-                df_adx['+dm'] = np.where((df_adx['up_move'] > df_adx['down_move']) & (df_adx['up_move'] > 0), df_adx['up_move'], 0)
-                df_adx['-dm'] = np.where((df_adx['down_move'] > df_adx['up_move']) & (df_adx['down_move'] > 0), df_adx['down_move'], 0)
-                atr = df_adx['tr'].ewm(span=self.adx_period, adjust=False).mean()
-                plus_di = 100 * (df_adx['+dm'].ewm(span=self.adx_period, adjust=False).mean() / atr)
-                minus_di = 100 * (df_adx['-dm'].ewm(span=self.adx_period, adjust=False).mean() / atr)
-                di_sum = plus_di + minus_di
-                di_sum = di_sum.replace(0, np.nan) 
-                dx = 100 * (abs(plus_di - minus_di) / di_sum)
-                self.cached_adx = dx.ewm(span=self.adx_period, adjust=False).mean().iloc[-1]
-
-                # 計算成交量
-                self.cached_vol_ma = df_resampled['volume'].rolling(window=self.vol_ma_period).mean().iloc[-1]
-                self.cached_current_vol = df_resampled['volume'].iloc[-1]
-
-        else:
-            self.temp_1m_bars.append(bar)
 
         # ==========================================
         # 🎯 戰術層：左右腦分離判斷
@@ -235,6 +198,17 @@ class AsymMaAdxStrategy(BaseStrategy):
         if signal: signal.timestamp = bar.timestamp
         return signal
 
+    def declare_indicators(self, frame) -> dict:
+        """向共用指標登記處宣告要用的指標 (快線、多/空兩條慢線、ADX、量均線)"""
+        ind = {
+            'fast': frame.require(ma_kind(self.ma_type_fast), 'close', self.fast_window),
+            'slow_long': frame.require(ma_kind(self.ma_type_slow), 'close', self.slow_window_long),
+            'slow_short': frame.require(ma_kind(self.ma_type_slow), 'close', self.slow_window_short),
+            'vol_ma': frame.require('sma', 'volume', self.vol_ma_period),
+        }
+        ind['adx'] = frame.require('adx', 'close', self.adx_period)
+        return ind
+
     def load_history_bars(self, bars_list: list):
         print(f"🧠 [Strategy] 準備消化 {len(bars_list)} 根歷史資料以計算雙核心指標...")
         orig_pos, orig_entry = getattr(self, 'position', 0), getattr(self, 'entry_price', 0.0)
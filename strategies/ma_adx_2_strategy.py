@@ -1,8 +1,8 @@
-import pandas as pd
 import numpy as np
 from collections import deque
 from core.base_strategy import BaseStrategy
 from core.event import BarEvent, SignalEvent, SignalType, EventType
+from core.indicators import bucket_start, ma_kind
 from config.settings import Settings
 
 class MaAdx2Strategy(BaseStrategy):
@@ -94,8 +94,6 @@ class MaAdx2Strategy(BaseStrategy):
         self.prev_ma_fast = None 
         self.prev_ma_slow = None
 
-        self.bars_resampled = deque(maxlen=400) # 存放壓縮好的大顆粒 K 棒
-        self.temp_1m_bars = []                  # 暫存區
 
         # 移動停利專用狀態記憶
         self.highest_price = 0.0
@@ -111,6 +109,10 @@ class MaAdx2Strategy(BaseStrategy):
         # ==========================================
         self.latest_price = bar.close
         current_price = bar.close
+
+        # 📐 共用指標登記處：每根 1 分 K 都要餵 (別的策略已經餵過同一根會自動跳過)
+        frame = self.indicator_frame(self.resample_min)
+        frame.update(bar)
         
         # 1. 永遠開啟：硬停損檢查
         if self.position != 0:
@@ -153,67 +155,33 @@ class MaAdx2Strategy(BaseStrategy):
         # ==========================================
         # ⚙️ 運算層：K 棒降維壓縮機 (將 1分K 轉成 N分K)
         # ==========================================
-        bucket_minute = (bar.timestamp.minute // self.resample_min) * self.resample_min
-        bucket_time = bar.timestamp.replace(minute=bucket_minute, second=0, microsecond=0)
+        bucket_time = bucket_start(bar.timestamp, self.resample_min)
 
         if self.current_bucket_time != bucket_time:
-            if self.temp_1m_bars:
-                self.bars_resampled.append({
-                    'high': max(b.high for b in self.temp_1m_bars),
-                    'low': min(b.low for b in self.temp_1m_bars),
-                    'close': self.temp_1m_bars[-1].close,
-                    'volume': sum(b.volume for b in self.temp_1m_bars)
-                })
-            
-            self.temp_1m_bars = [bar]
             self.current_bucket_time = bucket_time
 
-            # --- 只有換 K 棒時，才呼叫 Pandas 算指標 ---
-            if len(self.bars_resampled) >= self.slow_window + max(self.adx_period, self.vol_ma_period) * 2:
-                df_resampled = pd.DataFrame(self.bars_resampled)
-                
+            # --- 只有換 K 棒時，才去登記處拿指標 (相同參數的策略共用同一條序列，不再每根重建 DataFrame) ---
+            n = frame.count_at(bar.timestamp)
+            if n >= self.slow_window + max(self.adx_period, self.vol_ma_period) * 2:
+                ind = self.indicator_keys
+
                 # 👇 先把目前的快慢線存進 prev (變成舊的)
                 self.prev_ma_fast = self.cached_ma_fast
                 self.prev_ma_slow = self.cached_ma_slow
 
-                # 基礎動力：計算 MA (🚀 支援 SMA 與 EMA 動態切換)
-                if self.ma_type_fast == "EMA":
-                    self.cached_ma_fast = df_resampled['close'].ewm(span=self.fast_window, adjust=False).mean().iloc[-1]
-                else:
-                    self.cached_ma_fast = df_resampled['close'].rolling(window=self.fast_window).mean().iloc[-1]
-
-                if self.ma_type_slow == "EMA":
-                    self.cached_ma_slow = df_resampled['close'].ewm(span=self.slow_window, adjust=False).mean().iloc[-1]
-                else:
-                    self.cached_ma_slow = df_resampled['close'].rolling(window=self.slow_window).mean().iloc[-1]
+                # 基礎動力：MA (🚀 支援 SMA 與 EMA 動態切換)
+                self.cached_ma_fast = frame.value(ind['fast'], n)
+                self.cached_ma_slow = frame.value(ind['slow'], n)
 
-                # 模組 A：計算 ADX (如果開關打開)
+                # 模組 A：ADX (如果開關打開)
                 if self.enable_adx:
-                    df_adx = df_resampled.copy()
-                    df_adx['prev_close'] = df_adx['close'].shift(1)
-                    df_adx['tr1'] = df_adx['high'] - df_adx['low']
-                    df_adx['tr2'] = (df_adx['high'] - df_adx['prev_close']).abs()
-                    df_adx['tr3'] = (df_adx['low'] - df_adx['prev_close']).abs()
-                    df_adx['tr'] = df_adx[['tr1', 'tr2', 'tr3']].max(axis=1)
-                    df_adx['up_move'] = df_adx['high'] - df_adx['high'].shift(1)
-                    df_adx['down_move'] = df_adx['low'].shift(1) - df_adx['low']
-                    df_adx['+dm'] = np.where((df_adx['up_move'] > df_adx['down_move']) & (df_adx['up_move'] > 0), df_adx['up_move'], 0)
-                    df_adx['-dm'] = np.where((df_adx['down_move'] > df_adx['up_move']) & (df_adx['down_move'] > 0), df_adx['down_move'], 0)
-                    atr = df_adx['tr'].ewm(span=self.adx_period, adjust=False).mean()
-                    plus_di = 100 * (df_adx['+dm'].ewm(span=self.adx_period, adjust=False).mean() / atr)
-                    minus_di = 100 * (df_adx['-dm'].ewm(span=self.adx_period, adjust=False).mean() / atr)
-                    di_sum = plus_di + minus_di
-                    di_sum = di_sum.replace(0, np.nan) 
-                    dx = 100 * (abs(plus_di - minus_di) / di_sum)
-                    self.cached_adx = dx.ewm(span=self.adx_period, adjust=False).mean().iloc[-1]
-
-                # 模組 B：計算成交量均線 (如果開關打開)
-                if self.enable_vol_filter and len(df_resampled) >= self.vol_ma_period:
-                    self.cached_vol_ma = df_resampled['volume'].rolling(window=self.vol_ma_period).mean().iloc[-1]
-                    self.cached_current_vol = df_resampled['volume'].iloc[-1]
+                    self.cached_adx = frame.value(ind['adx'], n)
+
+                # 模組 B：成交量均線 (如果開關打開)
+                if self.enable_vol_filter and n >= self.vol_ma_period:
+                    self.cached_vol_ma = frame.value(ind['vol_ma'], n)
+                    self.cached_current_vol = frame.volume[n - 1]
 
-        else:
-            self.temp_1m_bars.append(bar)
 
 
         # ==========================================
@@ -346,6 +314,16 @@ class MaAdx2Strategy(BaseStrategy):
             )
         return None
 
+    def declare_indicators(self, frame) -> dict:
+        """向共用指標登記處宣告要用的指標 (大顆粒 K 棒上的快慢線 / ADX / 量均線)"""
+        ind = {
+            'fast': frame.require(ma_kind(self.ma_type_fast), 'close', self.fast_window),
+            'slow': frame.require(ma_kind(self.ma_type_slow), 'close', self.slow_window),
+        }
+        if self.enable_adx: ind['adx'] = frame.require('adx', 'close', self.adx_period)
+        if self.enable_vol_filter: ind['vol_ma'] = frame.require('sma', 'volume', self.vol_ma_period)
+        return ind
+
     def load_history_bars(self, bars_list: list):
         """將歷史 K 棒餵給大腦，強制進行指標暖機計算"""
         print(f"🧠 [Strategy] 準備消化 {len(bars_list)} 根歷史資料以計算指標...")
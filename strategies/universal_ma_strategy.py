@@ -1,8 +1,8 @@
-import pandas as pd
 import numpy as np
 from collections import deque
 from core.base_strategy import BaseStrategy
 from core.event import BarEvent, SignalEvent, SignalType, EventType
+from core.indicators import bucket_start, ma_kind
 
 class UniversalMaStrategy(BaseStrategy):
     """
@@ -60,8 +60,6 @@ class UniversalMaStrategy(BaseStrategy):
         self.flash_crash_vol_multiplier = flash_crash_vol_multiplier
         
         # --- 快取與記憶體 ---
-        self.bars_resampled = deque(maxlen=1000) 
-        self.temp_1m_bars = []                  
         self.current_bucket_time = None 
         
         # 專門給斷路器用的「1分鐘微觀均量」記憶體
@@ -77,6 +75,10 @@ class UniversalMaStrategy(BaseStrategy):
     def on_bar(self, bar: BarEvent) -> SignalEvent:
         self.latest_price = bar.close
         current_price = bar.close
+
+        # 📐 共用指標登記處：每根 1 分 K 都要餵 (別的策略已經餵過同一根會自動跳過)
+        frame = self.indicator_frame(self.resample_min)
+        frame.update(bar)
         
         # 記錄 1 分鐘的微觀成交量，供斷路器使用
         self.min_vol_history.append(bar.volume)
@@ -106,94 +108,35 @@ class UniversalMaStrategy(BaseStrategy):
                         self.save_state()
                         return sig
 
-            # [防禦 B] 🧱 硬停損
-            if self.enable_hard_stop:
-                pnl = (current_price - self.entry_price) if self.position > 0 else (self.entry_price - current_price)
-                if pnl <= -self.stop_loss:
-                    sig = SignalEvent(type=EventType.SIGNAL, symbol=bar.symbol, signal_type=SignalType.FLATTEN, reason=f"🩸 硬停損觸發 (-{self.stop_loss:.0f} pts)")
-                    sig.timestamp = bar.timestamp
-                    self.save_state()
-                    return sig
-
-            # [防禦 C] 🛡️ 移動停利
-            if self.enable_trailing_stop:
-                if self.position > 0: 
-                    self.highest_price = max(self.highest_price, bar.high)
-                    if (self.highest_price - self.entry_price) >= self.trailing_trigger:
-                        if current_price <= (self.highest_price - self.trailing_dist):
-                            sig = SignalEvent(type=EventType.SIGNAL, symbol=bar.symbol, signal_type=SignalType.FLATTEN, reason=f"💰 多單移動停利！(鎖定於 {current_price})")
-                            sig.timestamp = bar.timestamp
-                            self.save_state()
-                            return sig
-                            
-                elif self.position < 0: 
-                    self.lowest_price = min(self.lowest_price, bar.low)
-                    if (self.entry_price - self.lowest_price) >= self.trailing_trigger:
-                        if current_price >= (self.lowest_price + self.trailing_dist):
-                            sig = SignalEvent(type=EventType.SIGNAL, symbol=bar.symbol, signal_type=SignalType.FLATTEN, reason=f"💰 空單移動停利！(鎖定於 {current_price})")
-                            sig.timestamp = bar.timestamp
-                            self.save_state()
-                            return sig
+            # [防禦 B/C] 🧱 硬停損 + 🛡️ 移動停利
+            sig = self._check_exits(current_price, bar.high, bar.low, bar.symbol, bar.timestamp)
+            if sig:
+                self.save_state()
+                return sig
 
         # ==========================================
         # ⚙️ 2. 運算層：指標計算 (60分K壓縮)
         # ==========================================
-        bucket_minute = (bar.timestamp.minute // self.resample_min) * self.resample_min
-        bucket_time = bar.timestamp.replace(minute=bucket_minute, second=0, microsecond=0)
+        bucket_time = bucket_start(bar.timestamp, self.resample_min)
 
         if self.current_bucket_time != bucket_time:
-            if self.temp_1m_bars:
-                self.bars_resampled.append({
-                    'high': max(b.high for b in self.temp_1m_bars),
-                    'low': min(b.low for b in self.temp_1m_bars),
-                    'close': self.temp_1m_bars[-1].close,
-                    'volume': sum(b.volume for b in self.temp_1m_bars)
-                })
-            self.temp_1m_bars = [bar]
             self.current_bucket_time = bucket_time
 
             max_window = max(self.slow_window_long, self.slow_window_short) + max(self.adx_period, self.vol_ma_period) * 2
-            if len(self.bars_resampled) >= max_window:
-                df_resampled = pd.DataFrame(self.bars_resampled)
-                
-                # 計算 MA
-                if self.ma_type_fast == "EMA":
-                    self.cached_ma_fast = df_resampled['close'].ewm(span=self.fast_window, adjust=False).mean().iloc[-1]
-                else:
-                    self.cached_ma_fast = df_resampled['close'].rolling(window=self.fast_window).mean().iloc[-1]
-
-                if self.ma_type_slow == "EMA":
-                    self.cached_ma_slow_long = df_resampled['close'].ewm(span=self.slow_window_long, adjust=False).mean().iloc[-1]
-                    self.cached_ma_slow_short = df_resampled['close'].ewm(span=self.slow_window_short, adjust=False).mean().iloc[-1]
-                else:
-                    self.cached_ma_slow_long = df_resampled['close'].rolling(window=self.slow_window_long).mean().iloc[-1]
-                    self.cached_ma_slow_short = df_resampled['close'].rolling(window=self.slow_window_short).mean().iloc[-1]
-
-                # 計算 ADX
+            n = frame.count_at(bar.timestamp)
+            if n >= max_window:
+                ind = self.indicator_keys
+                # 快線 + 雙慢線 (登記處共用，同參數只算一次)
+                self.cached_ma_fast = frame.value(ind['fast'], n)
+                self.cached_ma_slow_long = frame.value(ind['slow_long'], n)
+                self.cached_ma_slow_short = frame.value(ind['slow_short'], n)
                 if self.enable_adx:
-                    df_adx = df_resampled.copy()
-                    df_adx['prev_close'] = df_adx['close'].shift(1)
-                    df_adx['tr1'] = df_adx['high'] - df_adx['low']
-                    df_adx['tr2'] = (df_adx['high'] - df_adx['prev_close']).abs()
-                    df_adx['tr3'] = (df_adx['low'] - df_adx['prev_close']).abs()
-                    df_adx['tr'] = df_adx[['tr1', 'tr2', 'tr3']].max(axis=1)
-                    df_adx['up_move'] = df_adx['high'] - df_adx['high'].shift(1)
-                    df_adx['down_move'] = df_adx['low'].shift(1) - df_adx['low']
-                    df_adx['+dm'] = np.where((df_adx['up_move'] > df_adx['down_move']) & (df_adx['up_move'] > 0), df_adx['up_move'], 0)
-                    df_adx['-dm'] = np.where((df_adx['down_move'] > df_adx['up_move']) & (df_adx['down_move'] > 0), df_adx['down_move'], 0)
-                    atr = df_adx['tr'].ewm(span=self.adx_period, adjust=False).mean()
-                    plus_di = 100 * (df_adx['+dm'].ewm(span=self.adx_period, adjust=False).mean() / atr)
-                    minus_di = 100 * (df_adx['-dm'].ewm(span=self.adx_period, adjust=False).mean() / atr)
-                    di_sum = plus_di + minus_di
-                    di_sum = di_sum.replace(0, np.nan) 
-                    dx = 100 * (abs(plus_di - minus_di) / di_sum)
-                    self.cached_adx = dx.ewm(span=self.adx_period, adjust=False).mean().iloc[-1]
+                    self.cached_adx = frame.value(ind['adx'], n)
+
+                # 大顆粒成交量
+                self.cached_vol_ma = frame.value(ind['vol_ma'], n)
+                self.cached_current_vol = frame.volume[n - 1]
 
-                # 計算 60分K 大顆粒成交量
-                self.cached_vol_ma = df_resampled['volume'].rolling(window=self.vol_ma_period).mean().iloc[-1]
-                self.cached_current_vol = df_resampled['volume'].iloc[-1]
-        else:
-            self.temp_1m_bars.append(bar)
 
         # ==========================================
         # 🎯 3. 戰術層：雙向進場邏輯判定
@@ -244,6 +187,55 @@ class UniversalMaStrategy(BaseStrategy):
         self.save_state() 
         return signal
 
+    def _check_exits(self, current_price, high, low, symbol, timestamp) -> SignalEvent:
+        """硬停損 + 移動停利：on_bar 用 1 分 K 檢查，on_tick 用每一筆成交價檢查 (斷路器看的是整根 K 棒，只在 on_bar)"""
+        # [防禦 B] 🧱 硬停損
+        if self.enable_hard_stop:
+            pnl = (current_price - self.entry_price) if self.position > 0 else (self.entry_price - current_price)
+            if pnl <= -self.stop_loss:
+                sig = SignalEvent(type=EventType.SIGNAL, symbol=symbol, signal_type=SignalType.FLATTEN, reason=f"🩸 硬停損觸發 (-{self.stop_loss:.0f} pts)")
+                sig.timestamp = timestamp
+                return sig
+
+        # [防禦 C] 🛡️ 移動停利
+        if self.enable_trailing_stop:
+            if self.position > 0: 
+                self.highest_price = max(self.highest_price, high)
+                if (self.highest_price - self.entry_price) >= self.trailing_trigger:
+                    if current_price <= (self.highest_price - self.trailing_dist):
+                        sig = SignalEvent(type=EventType.SIGNAL, symbol=symbol, signal_type=SignalType.FLATTEN, reason=f"💰 多單移動停利！(鎖定於 {current_price})")
+                        sig.timestamp = timestamp
+                        return sig
+                        
+            elif self.position < 0: 
+                self.lowest_price = min(self.lowest_price, low)
+                if (self.entry_price - self.lowest_price) >= self.trailing_trigger:
+                    if current_price >= (self.lowest_price + self.trailing_dist):
+                        sig = SignalEvent(type=EventType.SIGNAL, symbol=symbol, signal_type=SignalType.FLATTEN, reason=f"💰 空單移動停利！(鎖定於 {current_price})")
+                        sig.timestamp = timestamp
+                        return sig
+
+        return None
+
+    def on_tick(self, tick) -> SignalEvent:
+        """盤中逐筆防禦：停損/停利不用等 1 分 K 收盤 (沒部位時直接跳過)"""
+        if self.position == 0: return None
+        self.latest_price = tick.price
+        sig = self._check_exits(tick.price, tick.price, tick.price, tick.symbol, tick.timestamp)
+        if sig: self.save_state()
+        return sig
+
+    def declare_indicators(self, frame) -> dict:
+        """向共用指標登記處宣告要用的指標 (快線、多/空兩條慢線、ADX、量均線)"""
+        ind = {
+            'fast': frame.require(ma_kind(self.ma_type_fast), 'close', self.fast_window),
+            'slow_long': frame.require(ma_kind(self.ma_type_slow), 'close', self.slow_window_long),
+            'slow_short': frame.require(ma_kind(self.ma_type_slow), 'close', self.slow_window_short),
+            'vol_ma': frame.require('sma', 'volume', self.vol_ma_period),
+        }
+        if self.enable_adx: ind['adx'] = frame.require('adx', 'close', self.adx_period)
+        return ind
+
     def load_history_bars(self, bars_list: list):
         print(f"🧠 [Strategy] 消化 {len(bars_list)} 根歷史資料暖機中...")
         orig_pos, orig_entry = getattr(self, 'position', 0), getattr(self, 'entry_price', 0.0)
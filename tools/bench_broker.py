@@ -0,0 +1,278 @@
+import os
+import io
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import contextlib
+
+# 💡 導航修正：確保能找到 config 資料夾
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 🧪 壓測一律打本機假券商，Telegram 也關掉，絕對不碰真的帳戶
+os.environ.setdefault("SHIOAJI_API_KEY", "bench")
+os.environ.setdefault("SHIOAJI_SECRET_KEY", "bench")
+os.environ["TELEGRAM_TOKEN"] = "bench-token"
+os.environ["TELEGRAM_CHAT_ID"] = "" # 沒有 chat_id，指揮官自動停用
+
+from config.settings import Settings
+from core.base_strategy import BaseStrategy
+from core.engine import BotEngine
+from core.recorder import TradeRecorder
+from core.event import SignalEvent, SignalType, OrderStatus
+from modules.mock_shioaji import MockShioaji
+from modules.real_executor import RealExecutor
+from modules.shioaji_feeder import ShioajiFeeder
+from modules.position_reconciler import PositionReconciler
+from modules.account_snapshot import AccountSnapshotService
+
+class FlipStrategy(BaseStrategy):
+    """壓測專用：每 N 根 K 棒就多空反手一次，保證持續有單可下"""
+    def __init__(self, every=1):
+        super().__init__(name="Bench Flip")
+        self.every = max(1, every)
+        self.bar_count = 0
+
+    def on_bar(self, bar):
+        self.bar_count += 1
+        if self.bar_count % self.every: return None
+        sig = SignalType.SHORT if self.position > 0 else SignalType.LONG
+        return SignalEvent(symbol=bar.symbol, signal_type=sig, strength=1, reason="Bench Flip")
+
+    def get_ui_dict(self):
+        return {"Bars": self.bar_count}
+
+    def save_state(self):
+        pass # 壓測不寫記憶卡 (data/states/)
+
+def legacy_order_callback(bot, executor, sync_delay=1.5):
+    """舊版 main_live 的對帳方式 (每筆成交都開一條執行緒，睡一下再查 list_positions)，留著對照用"""
+    def on_order_event(update_info, update_events):
+        status_str = str(getattr(update_info, 'status', update_info))
+        if "Filled" in status_str or "Deal" in status_str:
+            def _delayed_sync():
+                time.sleep(sync_delay)
+                try:
+                    real_pos = executor.get_position()
+                    bot.strategy.set_position(real_pos)
+                    executor.current_position = real_pos
+                except Exception as e:
+                    print(f"❌ [同步回報失敗] {e}")
+            threading.Thread(target=_delayed_sync, daemon=True).start()
+    return on_order_event
+
+def _pct(values, p):
+    if not values: return float('nan')
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[idx]
+
+def _fmt_ms(values):
+    if not values: return "N/A"
+    return (f"p50={_pct(values, 50) * 1e3:.2f}ms  p95={_pct(values, 95) * 1e3:.2f}ms  "
+            f"max={max(values) * 1e3:.2f}ms  avg={statistics.mean(values) * 1e3:.2f}ms")
+
+class ThreadSampler:
+    """背景取樣目前執行緒數量，抓出對帳小工人的最高峰"""
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+def broker_position(api, executor):
+    """直接讀假券商帳本 (不算進 API 呼叫次數)"""
+    contract = executor._get_contract()
+    return int(api._positions.get(contract.code, [0, 0.0])[0]) if contract else 0
+
+def in_flight(executor):
+    """還在送單路上、交易所還沒確認的委託 (已確認、掛著等成交的限價單不算)"""
+    manager = executor.order_manager
+    if not manager: return False
+    return any(o.status in (OrderStatus.PENDING, OrderStatus.SUBMITTED) for o in manager.open_orders())
+
+def wait_converged(api, executor, bot, timeout, thread_baseline):
+    """
+    等「委託全部結束 + 回報送完 + 對帳小工人全部下班 + 影子帳本/策略/券商三方一致」，
+    回傳花了多久 (秒)，逾時回傳 None
+    """
+    t0 = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        real = broker_position(api, executor)
+        reconciler = getattr(bot, 'reconciler', None)
+        idle = (not api._timers and threading.active_count() <= thread_baseline
+                and not (reconciler and reconciler._dirty)
+                and not in_flight(executor))
+        # 影子帳本對齊券商；策略看的是「成交 + 在途 (含掛著沒成交的限價單)」
+        if idle and executor.current_position == real and bot.strategy.position == executor.expected_position:
+            return time.perf_counter() - t0
+        time.sleep(0.01)
+    return None
+
+def run_phase(name, api, executor, bot, action, settle_timeout):
+    calls_before = dict(api.calls)
+    orders_before = len(api.order_log)
+    ticks_before = len(api.tick_block)
+    manager = executor.order_manager
+    managed_before = set(manager.orders) if manager else set()
+    sampler = ThreadSampler().start()
+    thread_baseline = threading.active_count()
+
+    t0 = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - t0
+    converge = wait_converged(api, executor, bot, settle_timeout, thread_baseline)
+    sampler.stop()
+
+    orders = api.order_log[orders_before:]
+    if manager:
+        # 非同步送單：從策略送出委託 (仍在 Tick 回呼裡) 到 place_order 回傳
+        tick_to_order = [o.submitted_at - o.created_at for k, o in list(manager.orders.items())
+                         if k not in managed_before and o.submitted_at]
+    else:
+        tick_to_order = [recv - t_tick for recv, t_tick, *_ in orders if t_tick is not None]
+    calls = {k: api.calls[k] - calls_before.get(k, 0) for k in api.calls}
+    return {
+        "name": name,
+        "elapsed": elapsed,
+        "orders": len(orders),
+        "tick_to_order": tick_to_order,
+        "tick_block": api.tick_block[ticks_before:],
+        "calls": calls,
+        "thread_peak": sampler.peak,
+        "converge": converge,
+        "final": (executor.current_position, bot.strategy.position, broker_position(api, executor)),
+        "resting": len(executor.order_manager.open_orders()) if executor.order_manager else 0,
+    }
+
+def print_phase(r):
+    print(f"🔹 {r['name']} | 推送耗時 {r['elapsed']:.2f}s | 下單 {r['orders']} 筆")
+    print(f"   訊號 -> place_order 完成: {_fmt_ms(r['tick_to_order'])}")
+    print(f"   Tick 回呼阻塞: {_fmt_ms(r['tick_block'])}")
+    print(f"   API 呼叫: place_order={r['calls'].get('place_order', 0)}  "
+          f"list_positions={r['calls'].get('list_positions', 0)}  margin={r['calls'].get('margin', 0)}")
+    print(f"   執行緒最高峰: {r['thread_peak']}")
+    conv = f"{r['converge']:.2f}s" if r['converge'] is not None else "逾時 (未對齊)"
+    shadow, strat, real = r['final']
+    print(f"   對帳收斂: {conv} | 影子={shadow} 策略={strat} 券商={real} | 掛單未成交 {r['resting']} 張")
+
+def bench_commands(api, bot, count):
+    """/status + /balance 各打 count 次：量測指令處理時間與額外打了幾次券商 API"""
+    before = dict(api.calls)
+    costs = []
+    for _ in range(count):
+        for cb in (bot.commander.get_status_cb, bot.commander.get_balance_cb):
+            t = time.perf_counter()
+            cb()
+            costs.append(time.perf_counter() - t)
+    calls = {k: api.calls[k] - before.get(k, 0) for k in ("list_positions", "margin")}
+    return costs, calls
+
+def main():
+    parser = argparse.ArgumentParser(description="券商路徑離線壓測 (假永豐 API)")
+    parser.add_argument("--rate", type=float, default=20.0, help="穩態階段 Tick 頻率 (筆/秒)")
+    parser.add_argument("--steady-seconds", type=float, default=3.0, help="穩態階段持續秒數")
+    parser.add_argument("--burst", type=int, default=200, help="爆量階段一口氣灌幾筆 Tick")
+    parser.add_argument("--flip-every", type=int, default=1, help="策略每幾根 K 棒反手一次")
+    parser.add_argument("--volatility", type=float, default=0.0,
+                        help="Tick 隨機漫步幅度 (點)；0 代表策略用收盤價掛的限價單一定成交，>0 會有掛著不成交的單")
+    parser.add_argument("--ack-delay", type=float, default=0.02, help="委託回報延遲 (秒)")
+    parser.add_argument("--fill-delay", type=float, default=0.08, help="成交回報延遲 (秒)")
+    parser.add_argument("--partial-lots", type=int, default=0, help=">0 時每次最多成交幾口")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="list_positions / margin 往返延遲 (秒)")
+    parser.add_argument("--legacy", action="store_true", help="對照組：舊版「睡一下再查」對帳 + 指令直接查券商")
+    parser.add_argument("--sync-delay", type=float, default=1.5, help="舊版對帳等待 (秒)")
+    parser.add_argument("--sync-orders", action="store_true", help="關閉非同步送單 (在 K 棒執行緒上直接 place_order)")
+    parser.add_argument("--serial-reversal", action="store_true", help="反手時等平倉腳成交才送開倉腳")
+    parser.add_argument("--place-latency", type=float, default=0.0, help="place_order 本身的往返延遲 (秒)")
+    parser.add_argument("--commands", type=int, default=20, help="/status 與 /balance 各查詢幾次")
+    parser.add_argument("--timeout", type=float, default=30.0, help="等待對帳收斂上限 (秒)")
+    parser.add_argument("--verbose", action="store_true", help="顯示引擎/執行器原本的輸出")
+    args = parser.parse_args()
+
+    # 📜 RealExecutor 實戰模式會檢查憑證檔是否存在，給它一個假的
+    cert = tempfile.NamedTemporaryFile(suffix=".pfx", delete=False)
+    cert.close()
+    Settings.SHIOAJI_CERT_PATH = cert.name
+
+    # 每筆 Tick 前進 60 秒 => 每筆 Tick 都會收一根 1 分 K，訊號密度拉到最高
+    api = MockShioaji(volatility=args.volatility, ack_delay=args.ack_delay, fill_delay=args.fill_delay,
+                      partial_fill_lots=args.partial_lots, api_latency=args.api_latency,
+                      place_latency=args.place_latency,
+                      sim_seconds_per_tick=60, seed=42)
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        executor = RealExecutor(api, dry_run=False, async_orders=not args.sync_orders,
+                                parallel_reversal=not args.serial_reversal)
+        feeder = ShioajiFeeder(api)
+        symbol = getattr(Settings, "TARGET_CONTRACT", "TMF202603")
+        # 交易紀錄寫到暫存資料夾，壓測的幾萬筆反手單不會混進 data/ 的真實 trade_log.csv
+        recorder = TradeRecorder(base_dir=tempfile.mkdtemp(prefix="bench_broker_"))
+        bot = BotEngine(strategy=FlipStrategy(args.flip_every), feeder=feeder, executor=executor,
+                        symbol=symbol, enable_telegram=False, recorder=recorder)
+        if args.legacy:
+            api.set_order_callback(legacy_order_callback(bot, executor, sync_delay=args.sync_delay))
+        else:
+            account_service = AccountSnapshotService(executor, interval=30.0, on_update=bot.publish_snapshot)
+            bot.account_service = account_service
+            account_service.refresh_now()
+            account_service.start()
+            reconciler = PositionReconciler(bot, executor, notify=False, on_deal=account_service.request_refresh)
+            reconciler.reset(0)
+            bot.reconciler = reconciler
+
+            def on_order_event(stat, msg):
+                executor.on_order_event(stat, msg)
+                reconciler.on_order_event(stat, msg)
+            api.set_order_callback(on_order_event)
+        feeder.connect()
+        feeder.subscribe(symbol)
+
+        def steady():
+            api.start_ticks(rate=args.rate)
+            time.sleep(args.steady_seconds)
+            api.stop_ticks()
+
+        results = [
+            run_phase(f"穩態 {args.rate:.0f} 筆/秒 x {args.steady_seconds:.0f}s", api, executor, bot, steady, args.timeout),
+            run_phase(f"爆量 {args.burst} 筆", api, executor, bot, lambda: api.emit_ticks(args.burst), args.timeout),
+        ]
+        cmd_costs, cmd_calls = bench_commands(api, bot, args.commands)
+
+    print("=" * 60)
+    print(f"🧪 券商路徑壓測 | ack {args.ack_delay * 1e3:.0f}ms | fill {args.fill_delay * 1e3:.0f}ms "
+          f"| 送單 {args.place_latency * 1e3:.0f}ms | 查詢 {args.api_latency * 1e3:.0f}ms "
+          f"| {'同步' if args.sync_orders else '非同步'}送單 | 對帳: {'舊版 sleep+poll' if args.legacy else 'PositionReconciler'}")
+    print("=" * 60)
+    for r in results:
+        print_phase(r)
+    print(f"🔹 指令 /status + /balance x {args.commands}: {_fmt_ms(cmd_costs)}")
+    print(f"   額外券商呼叫: list_positions={cmd_calls['list_positions']}  margin={cmd_calls['margin']}")
+    print(f"📊 假券商累計呼叫: {dict(api.calls)}")
+    if not args.legacy:
+        print(f"📊 對帳員統計: {reconciler.stats} | 帳務快取刷新 {account_service.fetch_count} 次")
+        reconciler.stop()
+        account_service.stop()
+
+    api.logout()
+    os.unlink(cert.name)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# 💡 導航修正：確保能找到 config 資料夾
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 🧪 壓測一律打本機假伺服器，絕對不碰真的 Telegram
+os.environ["TELEGRAM_TOKEN"] = "bench-token"
+os.environ["TELEGRAM_CHAT_ID"] = "10000"
+os.environ.setdefault("SHIOAJI_API_KEY", "bench")
+os.environ.setdefault("SHIOAJI_SECRET_KEY", "bench")
+
+from modules.mock_telegram_server import MockTelegramServer
+from modules.commander import TelegramCommander
+
+def _pct(values, p):
+    if not values: return float('nan')
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[idx]
+
+def _fmt_ms(values):
+    if not values: return "N/A"
+    return (f"p50={_pct(values, 50) * 1e3:.1f}ms  p95={_pct(values, 95) * 1e3:.1f}ms  "
+            f"max={max(values) * 1e3:.1f}ms  avg={statistics.mean(values) * 1e3:.1f}ms")
+
+def bench_commands(server, commander, count, interval, timeout):
+    """上行壓測：注入指令 -> 量測到 callback 被呼叫的延遲"""
+    hits = {}
+
+    def on_status():
+        hits[commander.last_update_id] = time.perf_counter()
+        return "bench-status-ok"
+
+    commander.get_status_cb = on_status
+    ids = server.storm(count, text="/status", interval=interval)
+
+    deadline = time.monotonic() + timeout
+    while len(hits) < len(ids) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    latencies = [hits[i] - server.inject_times[i] for i in ids if i in hits]
+    return latencies, len(ids) - len(latencies)
+
+def bench_outbound(server, commander, count, timeout):
+    """下行壓測：引擎端狂發通知 -> 量測呼叫端卡多久 + 全部送達要多久"""
+    before = len(server.sent_messages)
+    enqueue_costs = []
+    t0 = time.perf_counter()
+    for i in range(count):
+        t = time.perf_counter()
+        commander.send_message(f"bench-msg-{i}")
+        enqueue_costs.append(time.perf_counter() - t)
+
+    deadline = time.monotonic() + timeout
+    delivered = 0
+    while time.monotonic() < deadline:
+        texts = server.received_texts()[before:]
+        delivered = sum(part.startswith("bench-msg-") for txt in texts for part in txt.split("\n\n"))
+        if delivered >= count: break
+        time.sleep(0.02)
+    elapsed = time.perf_counter() - t0
+    requests_made = len(server.sent_messages) - before
+    return enqueue_costs, delivered, requests_made, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="TelegramCommander 離線壓測 (本機假 Bot API)")
+    parser.add_argument("--latency", type=float, default=0.05, help="假伺服器每個請求延遲 (秒)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="額外隨機延遲上限 (秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回 500 的機率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="回 429 的機率")
+    parser.add_argument("--commands", type=int, default=50, help="注入幾則指令")
+    parser.add_argument("--command-interval", type=float, default=0.02, help="指令注入間隔 (秒)")
+    parser.add_argument("--messages", type=int, default=500, help="下行通知數量")
+    parser.add_argument("--min-send-interval", type=float, default=1.0, help="指揮官每則訊息最小間隔 (秒)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="每個階段最長等待 (秒)")
+    args = parser.parse_args()
+
+    server = MockTelegramServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                rate_limit_rate=args.rate_limit_rate, retry_after=1, seed=42).start()
+    # 佇列開得比下行通知數量大：壓測量的是郵差的吞吐，不是佇列塞爆丟訊息
+    commander = TelegramCommander(api_base=server.url, min_send_interval=args.min_send_interval,
+                                  max_queue=max(200, args.messages + args.commands))
+    commander.startup_time = 0 # 假伺服器的訊息時間都是「現在」，不需要防殭屍過濾
+    commander.start_listening()
+
+    print("=" * 60)
+    print(f"🧪 Commander 壓測 | 假伺服器: {server.url}")
+    print(f"   延遲 {args.latency * 1e3:.0f}ms (+{args.jitter * 1e3:.0f}ms) | 500 機率 {args.error_rate:.0%} | 429 機率 {args.rate_limit_rate:.0%}")
+    print("=" * 60)
+
+    latencies, missing = bench_commands(server, commander, args.commands, args.command_interval, args.timeout)
+    print(f"📩 指令 -> Callback 延遲 ({len(latencies)}/{args.commands} 則, 遺失 {missing}):")
+    print(f"   {_fmt_ms(latencies)}")
+
+    # 先讓指令回覆送完，避免干擾下行量測
+    time.sleep(args.min_send_interval * 2)
+
+    costs, delivered, requests_made, elapsed = bench_outbound(server, commander, args.messages, args.timeout)
+    print(f"📮 下行通知 {args.messages} 則:")
+    print(f"   呼叫端卡住時間 (send_message): {_fmt_ms(costs)}")
+    print(f"   送達 {delivered}/{args.messages} 則 | 實際 HTTP 請求 {requests_made} 次 | 耗時 {elapsed:.2f}s "
+          f"| 吞吐 {delivered / elapsed if elapsed > 0 else 0:.1f} 則/秒")
+    print(f"📊 伺服器統計: {server.stats}")
+
+    commander.stop(timeout=args.timeout)
+    server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+import io
+
+# 💡 導航修正：確保能找到 config 資料夾
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["TELEGRAM_TOKEN"] = "bench-token"
+os.environ["TELEGRAM_CHAT_ID"] = "" # 沒有 chat_id，指揮官自動停用
+os.environ.setdefault("SHIOAJI_API_KEY", "bench")
+os.environ.setdefault("SHIOAJI_SECRET_KEY", "bench")
+
+import numpy as np
+from core.tick_store import TickStore, TICK_DTYPE, to_ns
+from core.engine import BotEngine
+from modules.mock_feeder import TickReplayFeeder
+from modules.mock_executor import MockExecutor
+from strategies.universal_ma_strategy import UniversalMaStrategy
+from datetime import datetime, timedelta
+
+def make_ticks(days, ticks_per_day, seed=7, start_price=20000.0):
+    """產生假 Tick (隨機漫步，日盤 08:45 ~ 13:45 均勻分佈)"""
+    rng = np.random.default_rng(seed)
+    session_ns = 5 * 3600 * 1_000_000_000
+    day0 = datetime(2025, 1, 6, 8, 45)
+    price = start_price
+    for d in range(days):
+        recs = np.zeros(ticks_per_day, dtype=TICK_DTYPE)
+        base = to_ns(day0 + timedelta(days=d))
+        recs["ts"] = base + np.sort(rng.integers(0, session_ns, ticks_per_day))
+        walk = price + np.cumsum(rng.choice([-1.0, 0.0, 1.0], ticks_per_day))
+        price = float(walk[-1])
+        recs["price"] = walk
+        recs["volume"] = rng.integers(1, 6, ticks_per_day)
+        recs["bid"] = walk - 1
+        recs["ask"] = walk + 1
+        yield recs
+
+def main():
+    parser = argparse.ArgumentParser(description="逐筆回放壓測 (TickStore -> TickReplayFeeder -> Engine)")
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--ticks-per-day", type=int, default=200_000)
+    parser.add_argument("--root", default=None, help="Tick 資料夾 (預設用暫存資料夾產生假資料)")
+    parser.add_argument("--symbol", default="TMF")
+    args = parser.parse_args()
+
+    tmp = None
+    root = args.root
+    if root is None:
+        tmp = tempfile.TemporaryDirectory()
+        root = tmp.name
+        store = TickStore(root)
+        t0 = time.perf_counter()
+        for recs in make_ticks(args.days, args.ticks_per_day):
+            store.write(args.symbol, recs)
+        print(f"📝 產生 {args.days * args.ticks_per_day:,} 筆假 Tick: {time.perf_counter() - t0:.2f}s")
+
+    strategy = UniversalMaStrategy(fast_window=5, resample=5, filter_point=2.0, slow_window_long=20, slow_window_short=20,
+                                   enable_adx=False, enable_vol_long=False, stop_loss=30.0, trailing_trigger=20.0, trailing_dist=10.0)
+    strategy.save_state = lambda: None # 壓測不寫記憶卡
+    feeder = TickReplayFeeder(args.symbol, root=root)
+    executor = MockExecutor(initial_capital=1000000)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = BotEngine(strategy, feeder, executor, symbol=args.symbol, enable_telegram=False)
+        bot.sync_warmup_data_from_api = lambda: None
+        feeder.connect()
+        feeder.subscribe(args.symbol)
+        feeder.running = True
+        t0 = time.perf_counter()
+        feeder._run_loop() # 直接在前景跑，量純回放吞吐
+        elapsed = time.perf_counter() - t0
+
+    n = feeder.replayed
+    print(f"⚡ 回放 {n:,} 筆 / {elapsed:.2f}s = {n / elapsed * 60 / 1e6:.2f}M 筆/分鐘")
+    print(f"📊 交易 {len(executor.trades)} 筆，損益 ${executor.total_pnl:,.0f}")
+    if tmp: tmp.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,26 @@
-import pandas as pd
+import sys
 import os
 
-def slice_history_by_date(input_csv, output_csv, start_date, end_date):
+# 💡 導航修正：確保能找到 core / config 資料夾
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.bar_store import BarStore, RegimeCatalog
+
+def slice_history_by_date(input_csv, output_csv, start_date, end_date, root="data/bars"):
     """
-    歷史資料時光切割機
-    將巨大的 CSV 歷史檔，依照指定日期區間切出「純牛市」、「純熊市」等測試集。
+    歷史資料時光切割機 (匯出版)
+    大部分情況不需要再切檔：最佳化器 / 回測直接吃 "regime:名稱" 或 "bars:商品|起|訖" 就好。
+    真的需要一份 CSV 給外部工具時才用這個：CSV 只會轉進資料庫一次，之後每次切割都是二分搜尋 + 只寫出這一段。
     """
-    print(f"🔪 [Slicer] 正在載入巨大歷史檔案: {input_csv} ...")
-    
     if not os.path.exists(input_csv):
         print(f"❌ 找不到檔案 {input_csv}，請確認路徑！")
         return
 
-    df = pd.read_csv(input_csv)
-    
-    # 確保有時間欄位並轉為 datetime 格式
-    if 'datetime' not in df.columns:
-        print("❌ CSV 中找不到 'datetime' 欄位！")
-        return
-        
-    df['datetime'] = pd.to_datetime(df['datetime'])
-    
-    # 開始切割
+    store = BarStore(root)
+    symbol = store.ensure_csv(input_csv)
+
     print(f"✂️ 正在精準切割區間：{start_date} 到 {end_date}")
-    mask = (df['datetime'] >= start_date) & (df['datetime'] <= end_date)
-    df_sliced = df.loc[mask]
+    df_sliced = store.frame(symbol, start_date, end_date)
     
     if df_sliced.empty:
         print("⚠️ 警告：這個日期區間內沒有任何資料！")
@@ -35,34 +31,41 @@ def slice_history_by_date(input_csv, output_csv, start_date, end_date):
         print(f"💾 已儲存至專屬戰場：{output_csv}")
         print("-" * 50)
 
+def register_regime(catalog, name, start_date, end_date, symbol="MTX", note=""):
+    """
+    在區間目錄登記一個歷史修羅場 (只記起訖時間，瞬間完成，不複製任何資料)
+    之後最佳化器的 HISTORY_FILE 寫 "regime:名稱" 就能直接回測這一段
+    """
+    catalog.add(name, symbol, start_date, end_date, note=note)
+    n = len(catalog.slice(name))
+    print(f"🌍 [{name}] {symbol} {start_date} ~ {end_date}：{n:,} 根 K 棒" + ("" if n else " (⚠️ 區間內沒有資料)"))
+
 if __name__ == "__main__":
+    from config.settings import Settings
+
     # 預設的輸入檔案 (請改成你用 downloader 抓下來的大檔案名稱)
     SOURCE_FILE = "data/history/MTX_History_Huge.csv"
+
+    # 1. 大檔案只轉進資料庫一次 (CSV 有更新才會重轉)
+    store = BarStore(Settings.BAR_DIR)
+    if os.path.exists(SOURCE_FILE):
+        store.ensure_csv(SOURCE_FILE, symbol="MTX")
+    elif not store.exists("MTX"):
+        print(f"❌ 找不到 {SOURCE_FILE}，資料庫裡也還沒有 MTX")
+        sys.exit(1)
+    catalog = RegimeCatalog(store)
     
     # ==========================================
-    # 🌍 在這裡定義你要切出來的歷史修羅場！
+    # 🌍 在這裡定義你要的歷史修羅場！(只登記起訖時間，不再各存一份 CSV)
     # ==========================================
     
     # 1. 2022年 暴力升息緩跌熊市 (測試空單能不能抱住波段)
-    slice_history_by_date(
-        SOURCE_FILE, 
-        "data/history/MTX_2022_Bear.csv", 
-        start_date="2022-01-01", 
-        end_date="2022-10-31"
-    )
+    register_regime(catalog, "MTX_2022_Bear", "2022-01-01", "2022-10-31", note="2022年 暴力升息緩跌熊市")
     
     # 2. 2023年 盤整洗盤區 (測試防護網夠不夠堅固，會不會被雙巴)
-    slice_history_by_date(
-        SOURCE_FILE, 
-        "data/history/MTX_2023_Chop.csv", 
-        start_date="2023-01-01", 
-        end_date="2023-05-31"
-    )
+    register_regime(catalog, "MTX_2023_Chop", "2023-01-01", "2023-05-31", note="2023年 盤整洗盤區")
 
     # 3. 2020年 疫情 V 轉極端市 (壓力測試最高殿堂)
-    slice_history_by_date(
-        SOURCE_FILE, 
-        "data/history/MTX_2020_Crash.csv", 
-        start_date="2020-02-01", 
-        end_date="2020-05-31"
-    )
\ No newline at end of file
+    register_regime(catalog, "MTX_2020_Crash", "2020-02-01", "2020-05-31", note="2020年 疫情 V 轉極端市")
+
+    print(f"📚 目前所有區間: {', '.join(catalog.names())}")
@@ -1,22 +1,30 @@
 import os
 import sys
-import pandas as pd
-import shioaji as sj
+import argparse
 
 # 💡 導航修正 (確保能讀到 config)
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.settings import Settings
+from core.bar_store import BarStore, append_csv
+from modules.kbar_downloader import ChunkedKbarDownloader
+from core.data_quality import store_report, csv_report
 
-def download_huge_history():
+def download_huge_history(start_date="2021-01-01", end_date="2024-12-31", symbol="MTX",
+                          workers=4, chunk_days=30, csv_path="data/history/MTX_History_Huge.csv", mock=False):
     print("==========================================")
     print("🚀 TaiEx Bot V3 - 小台指(MXF) 重型歷史挖礦機")
     print("==========================================")
-    
-    api = sj.Shioaji()
+
+    if mock:
+        from modules.mock_shioaji import MockShioaji
+        api = MockShioaji(api_latency=0.2, kbars_fail_rate=0.1)
+    else:
+        import shioaji as sj
+        api = sj.Shioaji()
     print("🔌 正在連線 Shioaji API...")
     try:
         api.login(
-            api_key=Settings.SHIOAJI_API_KEY, 
+            api_key=Settings.SHIOAJI_API_KEY,
             secret_key=Settings.SHIOAJI_SECRET_KEY
         )
     except Exception as e:
@@ -32,45 +40,33 @@ def download_huge_history():
         api.logout()
         return
 
-    # 2. 設定你要的大範圍時間 (2021 到 2024 年底)
-    start_date = "2021-01-01"
-    end_date = "2024-12-31"
-    
-    print(f"🔄 正在向永豐主機請求 K 棒 (從 {start_date} 到 {end_date})...")
-    print("⏳ 資料量極大(約30萬筆)，這可能需要 1~3 分鐘，請耐心等候不要關閉程式！")
-    
-    # 3. 呼叫 API 下載
-    kbars = api.kbars(
-        contract=contract, 
-        start=start_date, 
-        end=end_date
-    )
-    
-    df = pd.DataFrame({**kbars})
-    if df.empty:
-        print("⚠️ 下載失敗，找不到資料。")
-        api.logout()
-        return
-
-    # 4. 欄位格式化 (統一轉成你的回測引擎看得懂的格式)
-    df['ts'] = pd.to_datetime(df['ts'])
-    df.rename(columns={
-        'ts': 'datetime', 
-        'Open': 'open', 'High': 'high', 'Low': 'low', 
-        'Close': 'close', 'Volume': 'volume'
-    }, inplace=True)
-    
-    df = df[['datetime', 'open', 'high', 'low', 'close', 'volume']]
+    # 2. 分段平行下載，每段抓完就存檢查點，依序串流接進資料庫 (中斷後重跑會續傳)
+    store = BarStore(Settings.BAR_DIR)
+    downloader = ChunkedKbarDownloader(api, store, max_workers=workers, chunk_days=chunk_days)
+    stats = downloader.download(contract, symbol, start_date, end_date)
+    api.logout()
 
-    # 5. 確保資料夾存在並存檔
-    csv_path = "data/history/MTX_History_Huge.csv"
-    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-    
-    df.to_csv(csv_path, index=False)
-    print(f"✅ 挖礦完成！成功下載 {len(df)} 筆小台指 1 分鐘 K 棒。")
-    print(f"💾 終極修羅場檔案已儲存至: {csv_path}")
+    if stats["failed"]:
+        print("⚠️ 還有段落沒下載完，先不更新 CSV。")
+        return
 
-    api.logout()
+    # 3. CSV 只接新的尾巴 (舊工具 / data_slicer 照樣讀得到)
+    if csv_path:
+        added = append_csv(csv_path, store.load(symbol))
+        print(f"💾 {csv_path} 新增 {added} 根")
+    # 4. 健檢 (報告存在資料旁邊，回測開檔直接讀)
+    store_report(store, symbol)
+    if csv_path: csv_report(csv_path)
+    print(f"✅ 挖礦完成！資料庫 {store.path_for(symbol)} 共 {store.manifest().get(symbol, {}).get('rows', 0)} 根 1 分鐘 K 棒。")
 
 if __name__ == "__main__":
-    download_huge_history()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="分段平行下載小台指歷史 1 分 K (可續傳)")
+    parser.add_argument("--start", default="2021-01-01")
+    parser.add_argument("--end", default="2024-12-31")
+    parser.add_argument("--symbol", default="MTX", help="資料庫裡的商品名稱")
+    parser.add_argument("--workers", type=int, default=4, help="同時下載幾段")
+    parser.add_argument("--chunk-days", type=int, default=30, help="每段幾天")
+    parser.add_argument("--csv", default="data/history/MTX_History_Huge.csv", help="同步更新的 CSV (空字串 = 不寫)")
+    parser.add_argument("--mock", action="store_true", help="用本機假永豐 API (不連線，測試用)")
+    args = parser.parse_args()
+    download_huge_history(args.start, args.end, args.symbol, args.workers, args.chunk_days, args.csv, args.mock)
@@ -1,57 +1,87 @@
 import sys
 import os
-import pandas as pd
 import glob
+import pandas as pd
 
 # 💡 導航修正：確保能找到 config 資料夾
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def merge_tmf_history(product_prefix="TMF"):
+from core.bar_store import BarStore, bars_from_dataframe, bars_to_dataframe
+from core.continuous import ContinuousBuilder
+from core.data_quality import store_report, csv_report
+
+def merge_tmf_history(product_prefix="TMF", root="data/bars", roll="volume", adjust="difference"):
+    """
+    月合約檔 -> 資料庫分區 -> 連續月合約
+    1. 每個 {product}2026XX_1min.csv 對應一個合約分區；CSV 比分區新才讀，而且只接比分區最後一根還新的 K 棒
+    2. 全回放序列 ({product}_FULL_REPLAY) 交給 core/continuous.py：每天只取近月 (依成交量或結算日換月)，
+       換月前的價格做價差調整，不再把重疊的月份混在一起 (舊版 keep='last' 會在換月時跳空好幾百點)
+       各月份分區都沒變就不重建
+    3. 同一條序列也輸出到 data/history/{product}_FULL_REPLAY.csv，舊工具照樣能讀
+    """
     history_dir = "data/history"
     # 搜尋所有 TMF2026XX_1min.csv 格式的檔案
     file_pattern = os.path.join(history_dir, f"{product_prefix}2026*_1min.csv")
-    all_files = glob.glob(file_pattern)
-    
+    all_files = sorted(glob.glob(file_pattern))
+
     if not all_files:
         print(f"❌ 在 {history_dir} 找不到任何符合 {product_prefix} 的 CSV 檔案。")
         return
 
-    print(f"📚 發現 {len(all_files)} 個檔案，準備開始大合併...")
-    
-    li = []
+    store = BarStore(root)
+    print(f"📚 發現 {len(all_files)} 個檔案，檢查哪些有新資料...")
+
+    # 1. 月合約 CSV -> 合約分區 (沒變過的檔案連打開都不用)
+    contracts = []
     for filename in all_files:
+        contract = os.path.basename(filename).replace("_1min.csv", "")
+        contracts.append(contract)
+        bar_path = store.path_for(contract)
+        if os.path.exists(bar_path) and os.path.getmtime(bar_path) >= os.path.getmtime(filename):
+            continue
         print(f"📖 讀取中: {os.path.basename(filename)}")
-        df = pd.read_csv(filename)
-        
-        # 💡 下載器已經改好名字了，這裡直接確保 Time 是日期格式
-        if 'Time' in df.columns:
-            df['Time'] = pd.to_datetime(df['Time'])
-            li.append(df)
-        else:
-            print(f"⚠️ 警告：檔案 {filename} 裡面找不到 'Time' 欄位，跳過此檔案。")
-
-    # 1. 垂直合併所有 DataFrame
-    full_df = pd.concat(li, axis=0, ignore_index=True)
-
-    # 2. 💡 關鍵：排序與去重
-    # 因為不同月份合約在時間上會有大量重疊，我們保留最新的數據
-    print("🧹 正在進行資料清洗 (排序與移除重複時間)...")
-    full_df = full_df.sort_values(by='Time')
-    
-    # 如果時間相同，保留最後出現的一筆 (通常是越晚下載的越準)
-    full_df = full_df.drop_duplicates(subset=['Time'], keep='last')
-    
-    # 3. 儲存成果
+        try:
+            added = store.append(contract, bars_from_dataframe(pd.read_csv(filename)))
+        except ValueError as e:
+            print(f"⚠️ 警告：檔案 {filename} {e}，跳過此檔案。")
+            continue
+        print(f"   ➕ {contract}: 新增 {added} 根")
+
+    # 2. 各合約分區 -> 連續月合約 (換月 + 價差調整，串流寫入)
+    replay = f"{product_prefix}_FULL_REPLAY"
     output_path = f"data/history/{product_prefix}_FULL_REPLAY.csv"
-    full_df.to_csv(output_path, index=False)
-    
+    contracts = [c for c in contracts if store.exists(c)]
+    built = os.path.getmtime(store.path_for(replay)) if store.exists(replay) and os.path.exists(output_path) else 0
+    if all(os.path.getmtime(store.path_for(c)) <= built for c in contracts): # 下載器也會直接接到合約分區，所以看分區的時間
+        print("✅ 各月份都沒有新資料，連續月合約不用重建。")
+        return
+
+    print(f"🔗 建立連續月合約 (換月: {roll}，價差調整: {adjust})...")
+    builder = ContinuousBuilder(store, contracts, roll=roll, adjust=adjust)
+    rows = builder.build(replay)
+
+    # 3. 儲存成果 (一塊一塊寫 CSV，不會整條序列一起放進 DataFrame)
+    tmp = output_path + ".tmp"
+    bars = store.load(replay)
+    for s in range(0, max(len(bars), 1), builder.block_size):
+        bars_to_dataframe(bars[s:s + builder.block_size]).to_csv(tmp, mode="w" if s == 0 else "a", header=s == 0, index=False)
+    os.replace(tmp, output_path)
+    info = store.manifest().get(replay, {})
+
     print(f"---")
-    print(f"✅ 合併成功！")
-    print(f"📍 最終檔案: {output_path}")
-    print(f"⏳ 時間起點: {full_df['Time'].min()}")
-    print(f"⏳ 時間終點: {full_df['Time'].max()}")
-    print(f"📊 總共累積 {len(full_df)} 根 1 分鐘 K 棒")
+    print(f"✅ 合併成功！(換月 {len(builder.rolls)} 次)")
+    print(f"📍 最終檔案: {store.path_for(replay)} / {output_path}")
+    print(f"⏳ 時間起點: {info.get('first')}")
+    print(f"⏳ 時間終點: {info.get('last')}")
+    print(f"📊 總共累積 {rows} 根 1 分鐘 K 棒")
+
+    # 4. 健檢 (各月份分區 + 連續序列；沒變過的分區直接沿用舊報告)
+    for contract in contracts:
+        store_report(store, contract)
+    store_report(store, replay)
+    csv_report(output_path)
 
 if __name__ == "__main__":
+    from config.settings import Settings
     # 如果你想合併其他商品，只需改這裡，例如 "MTX"
-    merge_tmf_history("TMF")
\ No newline at end of file
+    merge_tmf_history("TMF", root=Settings.BAR_DIR)
@@ -1,5 +1,10 @@
 import pandas as pd
 import os
+import sys
+
+# 💡 導航修正：確保能找到 core 資料夾
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.data_quality import csv_report
 
 def rescue_history_data():
     file_path = "data/history/TMF_History.csv"
@@ -40,6 +45,7 @@ def rescue_history_data():
     df.to_csv(file_path, index=False)
     
     print(f"✅ 修復完成！目前欄位: {list(df.columns)}")
+    csv_report(file_path, rescan=True) # 欄位修好了，順便重新健檢 (缺口 / 重複 / 異常 K 棒)
 
 if __name__ == "__main__":
     rescue_history_data()
\ No newline at end of file
@@ -2,6 +2,9 @@ import pandas as pd
 import sys
 import os
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.analytics import compute_metrics
+
 def analyze_log(log_path):
     print(f"📊 [Stat Analyzer] 正在分析: {log_path} ...")
     
@@ -25,37 +28,22 @@ def analyze_log(log_path):
             print("⚠️ Log 中沒有發現已實現損益 (Real_PnL 全為 0)")
             return
 
-        # 4. 計算統計數據
-        total_pnl = trades['Real_PnL'].sum()
-        win_trades = trades[trades['Real_PnL'] > 0]
-        loss_trades = trades[trades['Real_PnL'] <= 0]
-        
-        win_count = len(win_trades)
-        loss_count = len(loss_trades)
-        total_count = len(trades)
-        
-        win_rate = (win_count / total_count * 100) if total_count > 0 else 0
-        avg_win = win_trades['Real_PnL'].mean() if win_count > 0 else 0
-        avg_loss = loss_trades['Real_PnL'].mean() if loss_count > 0 else 0
-        pf = abs(avg_win / avg_loss) if avg_loss != 0 else 0
-        
-        # 5. 計算權益曲線與回撤 (Drawdown)
-        df['Cumulative_PnL'] = df['Real_PnL'].cumsum()
-        df['Peak'] = df['Cumulative_PnL'].cummax()
-        df['Drawdown'] = df['Cumulative_PnL'] - df['Peak']
-        max_dd = df['Drawdown'].min()
+        # 4. 計算統計數據 (與最佳化器 / 回測報告共用 core/analytics 的算法)
+        m = compute_metrics(trades['Real_PnL'].to_numpy())
 
-        # 6. 輸出報告
+        # 5. 輸出報告 (回撤以逐筆平倉損益累積計算，起點 0 也算高點)
         print("\n" + "="*40)
         print("🏆 V3 策略績效報告")
         print("="*40)
-        print(f"💰 總損益: ${total_pnl:,.0f} TWD")
-        print(f"🔢 交易筆數: {total_count} 筆")
-        print(f"📈 勝率: {win_rate:.2f}%")
-        print(f"⚖️ 獲利因子 (PF): {pf:.2f}")
-        print(f"💵 平均獲利: ${avg_win:,.0f}")
-        print(f"💸 平均虧損: ${avg_loss:,.0f}")
-        print(f"📉 最大回撤 (Max DD): ${max_dd:,.0f}")
+        print(f"💰 總損益: ${m['net_pnl']:,.0f} TWD")
+        print(f"🔢 交易筆數: {m['trades']} 筆")
+        print(f"📈 勝率: {m['win_rate']:.2f}%")
+        print(f"⚖️ 獲利因子 (PF): {m['profit_factor']:.2f}")
+        print(f"🎯 盈虧比 (均賺/均賠): {m['payoff_ratio']:.2f}")
+        print(f"💵 平均獲利: ${m['avg_win']:,.0f}")
+        print(f"💸 平均虧損: ${m['avg_loss']:,.0f}")
+        print(f"📉 最大回撤 (Max DD): ${-m['max_drawdown']:,.0f}")
+        print(f"📐 Sharpe / Sortino (逐筆): {m['sharpe']:.2f} / {m['sortino']:.2f}")
         print("="*40 + "\n")
 
     except Exception as e:
@@ -1,22 +1,26 @@
 import os
 import sys
-import pandas as pd
 import shioaji as sj
 from datetime import datetime, timedelta
 
 # 💡 導航修正
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.settings import Settings
+from core.bar_store import BarStore, bars_from_kbars, append_csv, csv_last_ts
+from core.data_quality import store_report, csv_report
+from core.tick_store import from_ns
 
 class UniversalDownloader:
     """
     TaiEx Bot V3 智慧歷史資料下載器
-    功能：自動比對現有 CSV，只下載缺少的資料並接合去重。
+    功能：只下載缺少的資料，新的尾巴同時接到資料庫分區 (core/bar_store.py) 與 TMF_History.csv
+    (不再整份 CSV 讀進來、合併、排序、重寫，每天更新的成本只跟新資料量有關)
     """
     def __init__(self):
         self.api = sj.Shioaji()
         self.target_contract = getattr(Settings, "TARGET_CONTRACT", "TMF202603")
         self.csv_path = "data/history/TMF_History.csv"
+        self.store = BarStore(Settings.BAR_DIR) # 每個合約一個分區，只往後接
         
         # 確保資料夾存在
         os.makedirs(os.path.dirname(self.csv_path), exist_ok=True)
@@ -55,28 +59,13 @@ class UniversalDownloader:
             self.api.logout()
             return
 
-        # 2. 判斷起始時間 (Smart Append)
+        # 2. 判斷起始時間 (Smart Append)：只看資料庫分區的最後一根 + CSV 檔尾，不再整份讀進來
         start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d") # 預設抓 30 天
-        existing_df = pd.DataFrame()
-        
-        if os.path.exists(self.csv_path):
-            try:
-                existing_df = pd.read_csv(self.csv_path)
-                
-                # 💡 [修復關鍵] 在合併前，強制把舊 CSV 的標題全部轉成小寫並清理
-                existing_df.columns = existing_df.columns.str.strip().str.lower()
-                
-                # 相容舊版的 time
-                if 'time' in existing_df.columns:
-                    existing_df.rename(columns={'time': 'datetime'}, inplace=True)
-                
-                if 'datetime' in existing_df.columns:
-                    existing_df['datetime'] = pd.to_datetime(existing_df['datetime'])
-                    last_time = existing_df['datetime'].max()
-                    start_date = (last_time - timedelta(days=1)).strftime("%Y-%m-%d")
-                    print(f"📂 發現現有資料，最後時間: {last_time}。將從 {start_date} 開始回補。")
-            except Exception as e:
-                print(f"⚠️ 讀取現有 CSV 失敗 ({e})，將重新下載。")
+        known = [t for t in (self.store.last_ts(self.target_contract), csv_last_ts(self.csv_path)) if t is not None]
+        if known:
+            last_time = from_ns(min(known)) # 兩邊都要補齊，從比較舊的那邊開始
+            start_date = (last_time - timedelta(days=1)).strftime("%Y-%m-%d")
+            print(f"📂 發現現有資料，最後時間: {last_time}。將從 {start_date} 開始回補。")
 
         # 3. 呼叫 API 下載
         print(f"🔄 正在下載 K 棒 (從 {start_date} 到今日)...")
@@ -86,40 +75,23 @@ class UniversalDownloader:
             end=datetime.now().strftime("%Y-%m-%d")
         )
         
-        new_df = pd.DataFrame({**kbars})
-        if new_df.empty:
+        records = bars_from_kbars(kbars)
+        if len(records) == 0:
             print("⚠️ 找不到任何新資料 (可能是休市或尚未開盤)。")
             self.api.logout()
             return
+        print(f"📥 成功下載 {len(records)} 筆資料。")
 
-        # 4. 欄位格式化
-        new_df['ts'] = pd.to_datetime(new_df['ts'])
-        new_df.rename(columns={
-            'ts': 'datetime', 
-            'Open': 'open', 'High': 'high', 'Low': 'low', 
-            'Close': 'close', 'Volume': 'volume'
-        }, inplace=True)
-        
-        # 只保留我們需要的欄位
-        new_df = new_df[['datetime', 'open', 'high', 'low', 'close', 'volume']]
-        print(f"📥 成功下載 {len(new_df)} 筆新資料。")
-
-        # 5. 合併與去重 (Merge & Drop Duplicates)
-        if not existing_df.empty:
-            final_df = pd.concat([existing_df, new_df], ignore_index=True)
-            # 以 datetime 為準，去除重複的 K 棒 (保留最後抓到的最新資料)
-            final_df.drop_duplicates(subset=['datetime'], keep='last', inplace=True)
-        else:
-            final_df = new_df
-
-        # 確保照時間排序
-        final_df.sort_values('datetime', inplace=True)
-        final_df.reset_index(drop=True, inplace=True)
+        # 4. 只寫新的尾巴 (重疊的部分用最後一根的時間去重)
+        added = self.store.append(self.target_contract, records)
+        csv_added = append_csv(self.csv_path, records)
+        rows = self.store.manifest().get(self.target_contract, {}).get("rows", 0)
+        print(f"✅ 更新完成！資料庫分區 {self.target_contract} 新增 {added} 根 (共 {rows} 根)，CSV 新增 {csv_added} 根。")
+        print(f"   => 儲存路徑: {self.store.path_for(self.target_contract)} / {self.csv_path}")
 
-        # 6. 存檔
-        final_df.to_csv(self.csv_path, index=False)
-        print(f"✅ 更新完成！目前資料庫共有 {len(final_df)} 筆 K 棒。")
-        print(f"   => 儲存路徑: {self.csv_path}")
+        # 5. 資料有變就重新健檢一次 (報告存在資料旁邊，引擎暖機 / 回測直接讀)
+        store_report(self.store, self.target_contract)
+        csv_report(self.csv_path)
 
         self.api.logout()
 
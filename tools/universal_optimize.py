@@ -1,4 +1,5 @@
 import itertools
+import numpy as np
 import pandas as pd
 import sys
 import os
@@ -9,10 +10,44 @@ import multiprocessing
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.settings import Settings
-from modules.mock_feeder import CsvHistoryFeeder
+from modules.mock_feeder import CsvHistoryFeeder, BarStoreFeeder
 from modules.mock_executor import MockExecutor
 from core.engine import BotEngine
 from core.recorder import TradeRecorder
+from core.indicators import IndicatorRegistry
+from core.bar_store import BarStore, is_store_source, open_source, resolve_source, bars_spec
+from core.analytics import compute_metrics, trades_to_arrays, format_holding, curve_metrics
+from core.data_quality import source_report, describe
+
+# 📐 每個工人行程各一份：同一個資料檔跑過的大顆粒 K 棒/指標，後面的組合直接查表
+# 主程式預先算好的 (precompute_indicators) 會在工人啟動時直接放進來
+_SHARED_INDICATORS = {}
+_PRELOADED_BARS = {}   # 資料來源 -> 已解析好的 DataFrame (CSV) 或 memmap 區間 (資料庫)
+
+def _init_worker(history_file, registry, df):
+    """工人行程啟動時收下主程式預先算好的指標矩陣與 K 棒"""
+    if registry is not None:
+        _SHARED_INDICATORS[history_file] = registry
+    if df is not None:
+        _PRELOADED_BARS[history_file] = df
+
+def _make_feeder(history_file):
+    """資料來源是資料庫區間 (regime:/bars:) 就直接回放 memmap；否則照舊讀 CSV"""
+    if is_store_source(history_file):
+        return BarStoreFeeder(history_file, speed=0, records=_PRELOADED_BARS.get(history_file))
+    return CsvHistoryFeeder(history_file, speed=0, df=_PRELOADED_BARS.get(history_file))
+
+def _bar_columns(bars):
+    """DataFrame 或 BAR_DTYPE 紀錄 -> (時間, high, low, close, volume) 欄位陣列 (紀錄陣列的欄位是視圖，不複製)"""
+    if isinstance(bars, pd.DataFrame):
+        return [bars[c].values for c in ('datetime', 'high', 'low', 'close', 'volume')]
+    return [bars['ts'].view('datetime64[ns]')] + [bars[c] for c in ('high', 'low', 'close', 'volume')]
+
+def _shared_indicators(history_file):
+    reg = _SHARED_INDICATORS.get(history_file)
+    if reg is None:
+        reg = _SHARED_INDICATORS[history_file] = IndicatorRegistry()
+    return reg
 
 def evaluate_single_combo(args):
     """
@@ -29,74 +64,34 @@ def evaluate_single_combo(args):
     try:
         # 1. 準備組件
         strategy = strategy_class(**params)
+        strategy.bind_indicators(_shared_indicators(history_file))
+        strategy.save_state = lambda: None # 回測不寫記憶卡 (每根 K 棒寫一次 JSON 比策略本身還慢，多工人還會搶同一個檔)
         executor = MockExecutor(initial_capital=1000000)
         # speed=0 代表極速回測，不等待
-        feeder = CsvHistoryFeeder(history_file, speed=0) 
+        feeder = _make_feeder(history_file)
         
         # 2. 組裝引擎 (關閉 Telegram 避免干擾)
         bot = BotEngine(strategy, feeder, executor, symbol="TMF", enable_telegram=False)
         
-        # 3. 開跑！
-        bot.start()
+        # 3. 開跑！(直接在前景回放，不用等引擎主迴圈每秒輪詢一次)
+        feeder.connect()
+        feeder.running = True
+        feeder._run_loop()
         
         # 4. 期末強制結算
         bot.inject_flatten_signal(reason="期末結算")
         
-        # 5. 計算成績單
-        trades_list = getattr(executor, 'trades', [])
-        total_trades = len(trades_list)
-        win_count = getattr(executor, 'win_count', 0)
-        win_rate = (win_count / total_trades * 100) if total_trades > 0 else 0
-        total_pnl = getattr(executor, 'total_pnl', 0)
-        
-        # 🛡️ 升級：照妖鏡雷達 (多空分離 + 持倉時間版)
-        long_pnl = 0
-        short_pnl = 0
-        total_holding_minutes = 0
-        valid_time_records = 0
-        
-        current_pnl = 0
-        peak_pnl = 0
-        max_drawdown = 0
-        
-        # 掃描每一筆交易紀錄
-        for t in trades_list:
-            if isinstance(t, dict):
-                pnl_value = float(t.get('pnl', 0.0))
-                direction = str(t.get('direction', ''))
-                entry_t = t.get('entry_time')
-                exit_t = t.get('exit_time')
-                
-                # 分離多空損益
-                if direction == 'LONG': long_pnl += pnl_value
-                elif direction == 'SHORT': short_pnl += pnl_value
-                
-                # 計算持倉時間
-                if entry_t and exit_t:
-                    duration = exit_t - entry_t
-                    total_holding_minutes += duration.total_seconds() / 60.0
-                    valid_time_records += 1
-            else:
-                pnl_value = float(t) # 為了相容舊帳本
-                
-            # 計算落袋最大回撤 (Trade-Close MDD)
-            current_pnl += pnl_value
-            if current_pnl > peak_pnl:
-                peak_pnl = current_pnl  
-            drawdown = peak_pnl - current_pnl 
-            if drawdown > max_drawdown:
-                max_drawdown = drawdown 
-                
+        # 5. 計算成績單 (core/analytics 一次向量化算完：多空分離 + 持倉時間 + 落袋最大回撤)
+        m = compute_metrics(*trades_to_arrays(getattr(executor, 'trades', [])))
+        total_pnl = getattr(executor, 'total_pnl', 0) # 帳本總損益 (含開倉手續費，逐筆 pnl 只記平倉那一段)
+        max_drawdown = m['max_drawdown']
+        # 盯市權益曲線 (含持倉中的浮動虧損)：抓得到落袋 MDD 看不到的「抱單回吐」
+        curve = executor.equity_curve
+        ts, eq = curve.arrays()
+        mtm = curve_metrics(eq, ts)
         # 計算風報比
         reward_risk_ratio = round((total_pnl / max_drawdown), 2) if max_drawdown > 0 else float('inf')
 
-        # 計算平均持倉時間格式化
-        avg_holding_time = (total_holding_minutes / valid_time_records) if valid_time_records > 0 else 0
-        if avg_holding_time > 60:
-            holding_str = f"{int(avg_holding_time//60)}h {int(avg_holding_time%60)}m"
-        else:
-            holding_str = f"{int(avg_holding_time)}m"
-
         sys.stdout = original_stdout
         devnull.close()
         
@@ -105,11 +100,13 @@ def evaluate_single_combo(args):
             '總淨利': int(total_pnl),
             'MDD(最大回撤)': int(max_drawdown),
             '風報比': reward_risk_ratio,
-            '多單獲利': int(long_pnl),
-            '空單獲利': int(short_pnl),
-            '平均持倉': holding_str,
-            '交易次數': total_trades,
-            '勝率(%)': round(win_rate, 2)
+            'MTM回撤': int(curve.max_drawdown),
+            'Sharpe': round(mtm['sharpe'], 2),
+            '多單獲利': int(m['long_pnl']),
+            '空單獲利': int(m['short_pnl']),
+            '平均持倉': format_holding(m['avg_holding_min']),
+            '交易次數': m['trades'],
+            '勝率(%)': round(m['win_rate'], 2)
         }
         
     except Exception as e:
@@ -117,40 +114,70 @@ def evaluate_single_combo(args):
         devnull.close()
         return {
             '參數組合': str(params), '總淨利': 0, 'MDD(最大回撤)': 0,
-            '風報比': 0, '多單獲利': 0, '空單獲利': 0, '平均持倉': '0m',
+            '風報比': 0, 'MTM回撤': 0, 'Sharpe': 0, '多單獲利': 0, '空單獲利': 0, '平均持倉': '0m',
             '交易次數': 0, '勝率(%)': 0, 'Error': str(e)
         }
     
 def split_data_for_oos(history_file: str, train_ratio=0.7):
-    """資料切割機：將歷史 CSV 切成 70% 訓練集與 30% 盲測集"""
+    """
+    資料切割機：將歷史資料切成 70% 訓練集與 30% 盲測集
+    只在資料庫 (core/bar_store.py) 裡用二分搜尋找切點，回傳兩個資料來源字串 (bars:商品|起|訖)，不再另存兩份 CSV
+    history_file 可以是 CSV (第一次會轉進資料庫) 或 regime:/bars: 資料來源
+    """
     print(f"🔪 [OOS] 準備切割歷史資料: {history_file}")
-    df = pd.read_csv(history_file)
-    
-    # 確保照時間排序，避免切錯
-    if 'datetime' in df.columns:
-        df['datetime'] = pd.to_datetime(df['datetime'])
-        df.sort_values('datetime', inplace=True)
-         
-    split_idx = int(len(df) * train_ratio)
-    df_is = df.iloc[:split_idx]  # In-Sample (訓練用)
-    df_oos = df.iloc[split_idx:] # Out-of-Sample (盲測用)
-    
-    is_file = history_file.replace('.csv', '_IS.csv')
-    oos_file = history_file.replace('.csv', '_OOS.csv')
-    
-    df_is.to_csv(is_file, index=False)
-    df_oos.to_csv(oos_file, index=False)
-    
-    print(f"📊 總資料量: {len(df)} 筆")
-    print(f"🏋️ 訓練集 (In-Sample): {len(df_is)} 筆 -> 供 Optimizer 尋優")
-    print(f"🕵️ 盲測集 (Out-of-Sample): {len(df_oos)} 筆 -> 供終極驗證")
+    store = BarStore(Settings.BAR_DIR)
+    if is_store_source(history_file):
+        symbol, start, end = resolve_source(history_file, store)
+    else:
+        symbol, start, end = store.ensure_csv(history_file), None, None
+    lo, hi = store.locate(symbol, start, end)
+    ts = store.load(symbol)['ts']
+
+    split_idx = lo + int((hi - lo) * train_ratio)
+    if split_idx <= lo or split_idx >= hi:
+        raise ValueError(f"資料太少無法切割 ({hi - lo} 筆, train_ratio={train_ratio})")
+    as_time = lambda i: np.datetime64(int(ts[i]), 'ns')
+    is_file = bars_spec(symbol, as_time(lo), as_time(split_idx - 1))   # In-Sample (訓練用)
+    oos_file = bars_spec(symbol, as_time(split_idx), as_time(hi - 1))  # Out-of-Sample (盲測用)
+
+    print(f"📊 總資料量: {hi - lo} 筆")
+    print(f"🏋️ 訓練集 (In-Sample): {split_idx - lo} 筆 -> 供 Optimizer 尋優 ({is_file})")
+    print(f"🕵️ 盲測集 (Out-of-Sample): {hi - split_idx} 筆 -> 供終極驗證 ({oos_file})")
     print("-" * 50)
     
     return is_file, oos_file
 
-def run_grid_search(strategy_class, param_grid: dict, history_file: str):
+def precompute_indicators(strategy_class, combos, bars):
+    """
+    📐 預先算好整個網格要用的指標矩陣 (每個資料檔只做一次)
+    1. 每組參數向指標登記處宣告它要的指標，相同 (resample, 種類, 窗口) 自動合併
+    2. 每種 resample 只壓縮一次大 K 棒 (向量化)，每條指標序列只算一次
+    3. 凍結成 numpy 陣列交給所有工人，各組合回測時只剩進出場邏輯要跑
+    指標工作量從 O(組合數) 變成 O(不重複參數數)；策略沒有宣告指標就回傳 None (照舊各自計算)
+    """
+    from core.base_strategy import BaseStrategy
+    if getattr(strategy_class, 'declare_indicators', None) is BaseStrategy.declare_indicators:
+        return None
+
+    registry = IndicatorRegistry()
+    for params in combos:
+        strategy = strategy_class(**params)
+        strategy.bind_indicators(registry)
+        strategy.indicator_frame(strategy.resample_min)
+
+    columns = _bar_columns(bars)
+    for frame in registry.frames.values():
+        frame.load(*columns)
+        frame.freeze()
+
+    for resample, (bars, series) in sorted(registry.stats().items()):
+        print(f"📐 [預算指標] {resample} 分K: {bars} 根 x {series} 條指標序列")
+    return registry
+
+def run_grid_search(strategy_class, param_grid: dict, history_file: str, sort_by='總淨利'):
     """
     🔥 多核心極速網格搜索最佳化器 (Multi-Core Grid Search Optimizer)
+    sort_by: 排行榜依哪一欄排序 (例如 'Sharpe' 或 '風報比' 做風險調整後排名)
     """
     print(f"🔍 啟動最佳化引擎: 測試 {strategy_class.__name__} ...")
     
@@ -161,6 +188,18 @@ def run_grid_search(strategy_class, param_grid: dict, history_file: str):
     total_tasks = len(combinations)
     print(f"📊 總共需要測試 {total_tasks} 組參數組合")
 
+    # 1.5 資料只讀一次、指標只算一次 (所有組合共用)
+    if is_store_source(history_file):
+        df = open_source(history_file, Settings.BAR_DIR) # memmap 區間，工人直接共用
+        report, start, end = source_report(history_file, Settings.BAR_DIR)
+        print(f"🩺 資料健檢: {describe(report, start, end)}")
+    else:
+        loader = CsvHistoryFeeder(history_file, speed=0)
+        loader.connect()
+        df = loader.df
+    df = df if df is not None and len(df) else None
+    registry = precompute_indicators(strategy_class, [dict(zip(keys, c)) for c in combinations], df) if df is not None else None
+
     # 2. 把任務打包，準備發給工人
     tasks = []
     for combo in combinations:
@@ -181,7 +220,8 @@ def run_grid_search(strategy_class, param_grid: dict, history_file: str):
 
     # 建立多核心資源池
     try: # 👈 加上這行，開始監聽緊急停止信號
-        with multiprocessing.Pool(processes=use_cores) as pool:
+        with multiprocessing.Pool(processes=use_cores, initializer=_init_worker,
+                                  initargs=(history_file, registry, df)) as pool:
             # imap_unordered 是一個超強的方法：哪個核心先做完，就先交卷，不用照順序等
             for i, result in enumerate(pool.imap_unordered(evaluate_single_combo, tasks)):
                 
@@ -211,8 +251,8 @@ def run_grid_search(strategy_class, param_grid: dict, history_file: str):
         print("⚠️ 警告：沒有任何成功的測試結果！")
         return None
 
-    # 依據淨利由高到低排序
-    df_results = df_results.sort_values(by='總淨利', ascending=False).reset_index(drop=True)
+    # 依據淨利 (或指定欄位) 由高到低排序
+    df_results = df_results.sort_values(by=sort_by, ascending=False).reset_index(drop=True)
     
     print("\n" + "="*50)
     print(f"🏆 {strategy_class.__name__} 最佳化排行榜 (Top 20)")
@@ -272,7 +312,7 @@ if __name__ == "__main__":
     elif choice == '2':
         from strategies.ma_adx_2_strategy import MaAdx2Strategy
         strate = MaAdx2Strategy
-        HISTORY_FILE = "data/history/MTX_2022_Bear.csv"
+        HISTORY_FILE = "regime:MTX_2022_Bear" # 資料庫命名區間 (tools/data_slicer.py 建立)
         # 🚀 擴大網格：讓最佳化器去尋找最佳空軍參數！
         param_grid = {
             'fast_window': [5, 10, 15],      # 測極短的快線
@@ -297,7 +337,7 @@ if __name__ == "__main__":
     elif choice == '3':
         from strategies.asym_ma_adx_strategy import AsymMaAdxStrategy
         strate = AsymMaAdxStrategy
-        HISTORY_FILE = "data/history/MTX_History_Huge.csv"
+        HISTORY_FILE = "bars:MTX" # 資料庫整份 MTX (tools/data_slicer.py 會從 MTX_History_Huge.csv 轉入)
         # 🚀 擴大網格：讓最佳化器去尋找最佳空軍參數！
         param_grid = {
             'fast_window': [15],      # 測極短的快線
@@ -51,8 +51,23 @@ def visualize(log_path):
             print("⚠️ 歷史資料與 Log 時間對不上，無法繪圖")
             return
 
+        # 3.5 權益曲線 (回測時 Executor 逐根盯市存下來的，跟 Log 放在同一個資料夾)
+        equity_path = os.path.join(os.path.dirname(log_path), "equity_curve.csv")
+        equity = None
+        if os.path.exists(equity_path):
+            equity = pd.read_csv(equity_path, index_col="datetime", parse_dates=True)["equity"]
+
         # 4. 開始繪圖
-        plt.figure(figsize=(15, 8))
+        if equity is not None and not equity.empty:
+            fig, (ax_price, ax_eq) = plt.subplots(2, 1, figsize=(15, 10), sharex=True, gridspec_kw={'height_ratios': [3, 1]})
+            ax_eq.plot(equity.index, equity.values, color='steelblue', linewidth=1, label='Equity (MTM)')
+            ax_eq.fill_between(equity.index, equity.values, equity.cummax().clip(lower=0).values, color='red', alpha=0.2, label='Drawdown')
+            ax_eq.set_ylabel("PnL")
+            ax_eq.legend(loc='upper left')
+            ax_eq.grid(True, alpha=0.3)
+            plt.sca(ax_price)
+        else:
+            plt.figure(figsize=(15, 8))
         
         # 畫價格線 (用收盤價代替 K 線，比較快)
         plt.plot(df_view.index, df_view['close'], label='Price', color='gray', alpha=0.5, linewidth=1)